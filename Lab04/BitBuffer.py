@@ -0,0 +1,317 @@
+from typing import Iterable, Iterator, List, Union
+
+# Tablica odwracania kolejności bitów w bajcie (bajty.translate)
+BIT_REVERSE_TABLE = bytes(int(format(i, '08b')[::-1], 2) for i in range(256))
+
+# Konwersje bajtów 0/1 <-> znaków '0'/'1' (bajty.translate)
+BIT_TO_ASCII = bytes(ord('0') + (i & 1) for i in range(256))
+ASCII_TO_BIT = bytes(1 if i == ord('1') else 0 for i in range(256))
+
+# Starsza i młodsza połówka bajtu (test pokerowy dla m=4)
+HIGH_NIBBLE_TABLE = bytes(i >> 4 for i in range(256))
+LOW_NIBBLE_TABLE = bytes(i & 0x0F for i in range(256))
+
+# Liczba bitów dopisanych przez append, po której są pakowane do bufora
+PENDING_FLUSH_BITS = 8192
+
+
+class BitBuffer:
+    """
+    Spakowany ciąg bitów: 8 bitów na bajt zamiast jednego obiektu int (8 bajtów wskaźnika) na bit.
+    
+    Bity przechowywane są w bytearray w kolejności od najstarszego bitu pierwszego bajtu
+    (jak LFSR.step_many(as_bytes=True)), końcówka ostatniego bajtu jest wyzerowana.
+    Obsługuje len, indeksowanie, wycinki, iterację (po int 0/1) i porównanie z listą bitów,
+    więc może zastąpić List[int] w generatorach, funkcjach pomocniczych i testach.
+    """
+    
+    def __init__(self, data: Union[bytes, bytearray] = b'', length: int = None):
+        """
+        Inicjalizacja bufora ze spakowanych bajtów.
+        
+        Args:
+            data: bajty (pierwszy bit to najstarszy bit pierwszego bajtu)
+            length: liczba bitów (domyślnie 8 * len(data))
+        """
+        if length is None:
+            length = 8 * len(data)
+        if length < 0 or length > 8 * len(data):
+            raise ValueError(f"Długość {length} poza zakresem [0, {8 * len(data)}]")
+        
+        self._data = bytearray(data[:(length + 7) // 8])
+        self._length = length
+        self._pending = bytearray()     # Bity dopisane przez append, jeszcze niespakowane
+        if length % 8:
+            self._data[-1] &= (0xFF << (8 - length % 8)) & 0xFF
+    
+    # ----------------------------------------------------------------------------
+    # Tworzenie i konwersje
+    # ----------------------------------------------------------------------------
+    
+    @classmethod
+    def from_bits(cls, bits: Iterable[int]) -> 'BitBuffer':
+        """
+        Tworzy bufor z listy (lub innej sekwencji) bitów 0/1.
+        
+        Args:
+            bits: bity
+        
+        Returns:
+            Nowy BitBuffer
+        """
+        if isinstance(bits, BitBuffer):
+            return bits.copy()
+        buffer = cls()
+        buffer.extend(bits)
+        return buffer
+    
+    @classmethod
+    def from_int(cls, value: int, length: int) -> 'BitBuffer':
+        """
+        Tworzy bufor z liczby, w której bit i to i-ty bit ciągu (format LFSR.step_many).
+        
+        Args:
+            value: liczba
+            length: liczba bitów
+        
+        Returns:
+            Nowy BitBuffer
+        """
+        data = (value & ((1 << length) - 1)).to_bytes((length + 7) // 8, 'little').translate(BIT_REVERSE_TABLE)
+        return cls(data, length)
+    
+    @classmethod
+    def ensure(cls, bits: Union['BitBuffer', Iterable[int]]) -> 'BitBuffer':
+        """Zwraca bits bez kopiowania, jeśli to już BitBuffer, w przeciwnym razie pakuje je."""
+        if isinstance(bits, BitBuffer):
+            return bits
+        return cls.from_bits(bits)
+    
+    @classmethod
+    def wrap(cls, data: bytearray, length: int) -> 'BitBuffer':
+        """
+        Tworzy bufor używający podanego bytearray bez kopiowania (bajty przechodzą na własność bufora).
+        
+        Args:
+            data: spakowane bity, dokładnie (length + 7) // 8 bajtów z wyzerowaną końcówką
+            length: liczba bitów
+        
+        Returns:
+            Nowy BitBuffer
+        """
+        if len(data) != (length + 7) // 8:
+            raise ValueError(f"Bufor {len(data)} B nie odpowiada długości {length} bitów")
+        buffer = cls()
+        buffer._data = data
+        buffer._length = length
+        return buffer
+    
+    def to_bytes(self) -> bytes:
+        """Zwraca spakowane bajty (końcówka ostatniego bajtu dopełniona zerami)."""
+        self._flush()
+        return bytes(self._data)
+    
+    def to_int(self) -> int:
+        """Zwraca liczbę, w której bit i to i-ty bit ciągu (format LFSR.step_many)."""
+        self._flush()
+        return int.from_bytes(self._data.translate(BIT_REVERSE_TABLE), 'little')
+    
+    def to_list(self) -> List[int]:
+        """Zwraca ciąg jako listę bitów 0/1."""
+        return list(self._unpacked())
+    
+    def to_string(self) -> str:
+        """Zwraca ciąg jako napis z '0' i '1'."""
+        return self._unpacked().translate(BIT_TO_ASCII).decode('ascii')
+    
+    def to_hex(self) -> str:
+        """Zwraca ciąg w zapisie szesnastkowym (dopełniony zerami do wielokrotności 4 bitów)."""
+        self._flush()
+        return self._data.hex()[:(self._length + 3) // 4]
+    
+    def copy(self) -> 'BitBuffer':
+        """Zwraca kopię bufora."""
+        self._flush()
+        return BitBuffer(self._data, self._length)
+    
+    # ----------------------------------------------------------------------------
+    # Dopisywanie bitów
+    # ----------------------------------------------------------------------------
+    
+    def append(self, bit: int):
+        """Dopisuje jeden bit (pakowany razem z kolejnymi co PENDING_FLUSH_BITS bitów)."""
+        self._pending.append(bit)
+        if len(self._pending) >= PENDING_FLUSH_BITS:
+            self._flush()
+    
+    def extend(self, bits: Iterable[int]):
+        """Dopisuje ciąg bitów (listę, bajty 0/1 lub inny BitBuffer)."""
+        if isinstance(bits, BitBuffer):
+            bits._flush()
+            self._flush()
+            self._append_packed(int.from_bytes(bits._data, 'big') >> (8 * len(bits._data) - bits._length),
+                                bits._length)
+        else:
+            self._pending.extend(bits)
+            self._flush()
+    
+    def _flush(self):
+        """Pakuje bity dopisane przez append do bufora bajtów."""
+        if self._pending:
+            pending = self._pending
+            self._pending = bytearray()
+            self._append_packed(int(pending.translate(BIT_TO_ASCII), 2), len(pending))
+    
+    def _append_packed(self, value: int, num_bits: int):
+        """Dopisuje num_bits bitów liczby value (pierwszy bit to najstarszy z num_bits)."""
+        if num_bits == 0:
+            return
+        used = self._length % 8
+        if used:
+            # Łączymy z niepełnym ostatnim bajtem
+            value |= (self._data.pop() >> (8 - used)) << num_bits
+            num_bits += used
+            self._length -= used
+        padding = -num_bits % 8
+        self._data += (value << padding).to_bytes((num_bits + padding) // 8, 'big')
+        self._length += num_bits
+    
+    # ----------------------------------------------------------------------------
+    # Dostęp do bitów
+    # ----------------------------------------------------------------------------
+    
+    def _unpacked(self) -> bytes:
+        """Zwraca bity jako bajty o wartościach 0/1 (jeden bajt na bit)."""
+        self._flush()
+        if not self._length:
+            return b''
+        text = format(int.from_bytes(self._data, 'big'), f'0{8 * len(self._data)}b')[:self._length]
+        return text.encode('ascii').translate(ASCII_TO_BIT)
+    
+    def __len__(self) -> int:
+        return self._length + len(self._pending)
+    
+    def __iter__(self) -> Iterator[int]:
+        return iter(self._unpacked())
+    
+    def __getitem__(self, index: Union[int, slice]) -> Union[int, 'BitBuffer']:
+        self._flush()
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self._length)
+            if step != 1:
+                return BitBuffer.from_bits(self._unpacked()[index])
+            if stop <= start:
+                return BitBuffer()
+            if start % 8 == 0:
+                return BitBuffer(self._data[start // 8:(stop + 7) // 8], stop - start)
+            first, last = start // 8, (stop + 7) // 8
+            value = int.from_bytes(self._data[first:last], 'big') >> (8 * last - stop)
+            result = BitBuffer()
+            result._append_packed(value & ((1 << (stop - start)) - 1), stop - start)
+            return result
+        
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError("Indeks bitu poza zakresem")
+        return (self._data[index >> 3] >> (7 - (index & 7))) & 1
+    
+    def __eq__(self, other) -> bool:
+        if isinstance(other, BitBuffer):
+            self._flush()
+            other._flush()
+            return self._length == other._length and self._data == other._data
+        if isinstance(other, list):
+            return self.to_list() == other
+        return NotImplemented
+    
+    def __repr__(self):
+        preview = self[:64].to_string()
+        return f"BitBuffer(length={len(self)}, bits={preview}{'...' if len(self) > 64 else ''})"
+    
+    def __str__(self):
+        return self.to_string()
+    
+    # ----------------------------------------------------------------------------
+    # Operacje na całym ciągu (testy statystyczne)
+    # ----------------------------------------------------------------------------
+    
+    def count(self, value: int = 1) -> int:
+        """
+        Zlicza bity o danej wartości (popcount całego bufora naraz).
+        
+        Args:
+            value: 1 (jedynki) lub 0 (zera)
+        
+        Returns:
+            Liczba bitów równych value
+        """
+        self._flush()
+        ones = int.from_bytes(self._data, 'big').bit_count()
+        return ones if value else self._length - ones
+    
+    def segment_counts(self, m: int) -> List[int]:
+        """
+        Zlicza wystąpienia każdej wartości m-bitowych rozłącznych segmentów (niepełny segment pomijany).
+        
+        Args:
+            m: długość segmentu w bitach
+        
+        Returns:
+            Lista 2^m liczników, indeks to wartość segmentu (pierwszy bit najstarszy)
+        """
+        self._flush()
+        k = self._length // m
+        counts = [0] * (1 << m)
+        
+        if m == 8:
+            data = bytes(self._data[:k])
+            for value in range(256):
+                counts[value] = data.count(value)
+        elif m == 4:
+            # Starsze i młodsze połówki pełnych bajtów + ewentualna starsza połówka następnego
+            full_bytes = k // 2
+            high = self._data[:full_bytes].translate(HIGH_NIBBLE_TABLE)
+            low = self._data[:full_bytes].translate(LOW_NIBBLE_TABLE)
+            for value in range(16):
+                counts[value] = high.count(value) + low.count(value)
+            if k % 2:
+                counts[self._data[full_bytes] >> 4] += 1
+        else:
+            text = self[:k * m].to_string()
+            for i in range(0, k * m, m):
+                counts[int(text[i:i + m], 2)] += 1
+        return counts
+    
+    def block_counts(self, block_size: int) -> List[int]:
+        """
+        Zwraca liczbę jedynek w każdym pełnym bloku block_size bitów.
+        
+        Args:
+            block_size: rozmiar bloku w bitach
+        
+        Returns:
+            Lista liczników jedynek, po jednym na blok
+        """
+        self._flush()
+        num_blocks = self._length // block_size
+        if block_size % 8 == 0:
+            size = block_size // 8
+            data = self._data
+            return [int.from_bytes(data[i * size:(i + 1) * size], 'big').bit_count() for i in range(num_blocks)]
+        return [self[i * block_size:(i + 1) * block_size].count() for i in range(num_blocks)]
+    
+    def run_lengths(self) -> List[int]:
+        """Zwraca długości kolejnych podciągów (runs) identycznych bitów."""
+        return [len(gap) + 1 for gap in self._transitions().split(b'1')] if len(self) else []
+    
+    def max_run_length(self) -> int:
+        """Zwraca długość najdłuższego podciągu identycznych bitów."""
+        return max(map(len, self._transitions().split(b'1'))) + 1 if len(self) else 0
+    
+    def _transitions(self) -> bytes:
+        """Napis length - 1 znaków '0'/'1', gdzie znak i to '1', jeśli bit i różni się od bitu i + 1."""
+        self._flush()
+        value = int.from_bytes(self._data, 'big') >> (8 * len(self._data) - self._length)
+        changes = (value ^ (value >> 1)) & ((1 << (self._length - 1)) - 1)
+        return format(changes, f'0{self._length - 1}b').encode('ascii') if self._length > 1 else b''
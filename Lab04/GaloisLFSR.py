@@ -0,0 +1,278 @@
+import sys
+from array import array
+from functools import lru_cache
+from typing import List, Optional, Tuple, Union
+
+from BitBuffer import BitBuffer, BIT_REVERSE_TABLE
+from LFSR import LFSR
+
+# Najmniejszy tap, od którego step_many korzysta z rund LFSR.step_many zamiast tablic
+# (runda daje min(taps) bitów, więcej niż jedno odczytanie tablicy 8/16-bitowej)
+FIBONACCI_ROUND_BITS = 32
+
+
+@lru_cache(maxsize=32)
+def transition_tables(length: int, taps: Tuple[int, ...], table_bits: int = 8) -> Tuple[List[int], List[int]]:
+    """
+    Tablice przejść rejestru Galois dla skoku o table_bits kroków.
+    
+    Po table_bits krokach: stan' = (stan >> table_bits) ^ state_table[b], a bity wyjściowe
+    to output_table[b], gdzie b = najmłodsze table_bits bitów stanu (bit j = j-ty bit wyjściowy).
+    Obie tablice są liniowe względem b, więc liczone są z table_bits wektorów bazowych.
+    Wynik jest zapamiętywany dla (length, taps, table_bits).
+    
+    Args:
+        length: długość rejestru w bitach
+        taps: pozycje tapów (1-indeksowane)
+        table_bits: liczba kroków na jedno odczytanie tablicy (8 lub 16)
+    
+    Returns:
+        Krotka (state_table, output_table), każda po 2^table_bits elementów
+    """
+    polynomial = 0
+    for tap in taps:
+        polynomial ^= 1 << (tap - 1)     # Powtórzony tap znosi się jak w LFSR.step
+    
+    # Wektory bazowe: symulacja table_bits kroków od stanu z jednym ustawionym bitem
+    basis_states = []
+    basis_outputs = []
+    for i in range(table_bits):
+        state = 1 << i
+        outputs = 0
+        for j in range(table_bits):
+            bit = state & 1
+            outputs |= bit << j
+            state = (state >> 1) ^ (polynomial if bit else 0)
+        basis_states.append(state)
+        basis_outputs.append(outputs)
+    
+    size = 1 << table_bits
+    state_table = [0] * size
+    output_table = [0] * size
+    for b in range(1, size):
+        low = (b & -b).bit_length() - 1     # Najmłodszy ustawiony bit
+        rest = b & (b - 1)
+        state_table[b] = state_table[rest] ^ basis_states[low]
+        output_table[b] = output_table[rest] ^ basis_outputs[low]
+    
+    return state_table, output_table
+
+
+class GaloisLFSR:
+    """
+    Rejestr w konfiguracji Galois dający ten sam ciąg wyjściowy co LFSR(length, taps, seed).
+    
+    Ciąg Fibonacciego x_{t+L} = XOR x_{t+L-tap} jest generowany przez rejestr Galois
+    z wielomianem sum(2^(tap-1)) i odpowiednio przekształconym stanem początkowym.
+    Rejestr przesuwa się o 8 lub 16 kroków na jedno odczytanie tablicy przejść;
+    step() zwraca kolejne bity z bufora takiego fragmentu.
+    
+    Tablice wygrywają, gdy najmniejszy tap jest mały (LFSR.step_many daje wtedy mało bitów
+    na rundę). Gdy min(taps) >= FIBONACCI_ROUND_BITS, step_many generuje długie fragmenty
+    rundami LFSR.step_many, które są wtedy szybsze od tablic.
+    
+    Parametry:
+        length: długość rejestru w bitach
+        taps: lista pozycji tapów (indeksowanie od 1), None dla automatycznej inicjalizacji
+        seed: stan początkowy rejestru Fibonacciego, None dla automatycznej inicjalizacji
+        table_bits: 8 (domyślnie, tablice 256-elementowe) lub 16 (tablice 65536-elementowe -
+                    budowa trwa kilkadziesiąt ms, opłaca się dopiero od milionów bitów)
+    """
+    
+    def __init__(self, length: int, taps: Optional[List[int]] = None, seed: Optional[int] = None,
+                 table_bits: int = 8):
+        """
+        Inicjalizacja rejestru Galois.
+        
+        Args:
+            length: długość rejestru w bitach
+            taps: pozycje tapów (1-indeksowane), jak w LFSR
+            seed: stan początkowy rejestru Fibonacciego (musi być != 0)
+            table_bits: liczba bitów na odczytanie tablicy (8 lub 16)
+        """
+        if table_bits not in (8, 16):
+            raise ValueError("Rozmiar tablicy musi wynosić 8 lub 16 bitów")
+        
+        # Walidacja i automatyczna inicjalizacja jak w LFSR
+        reference = LFSR(length, taps, seed)
+        self.length = reference.length
+        self.taps = reference.taps
+        self.table_bits = table_bits
+        self.state_table, self.output_table = transition_tables(self.length, tuple(self.taps), table_bits)
+        
+        # Rejestr Fibonacciego do długich fragmentów, jeśli jego rundy są szybsze od tablic
+        self.fibonacci = reference if min(self.taps) >= FIBONACCI_ROUND_BITS else None
+        
+        self.initial_state = self.fibonacci_to_galois(reference.state)
+        self.reset()
+    
+    @classmethod
+    def from_lfsr(cls, lfsr: LFSR, table_bits: int = 8):
+        """
+        Tworzy rejestr Galois kontynuujący ciąg LFSR od jego bieżącego stanu.
+        
+        Args:
+            lfsr: rejestr Fibonacciego
+            table_bits: liczba bitów na odczytanie tablicy (8 lub 16)
+        
+        Returns:
+            Nowa instancja GaloisLFSR
+        """
+        return cls(lfsr.length, lfsr.taps, lfsr.state, table_bits)
+    
+    def fibonacci_to_galois(self, state: int) -> int:
+        """
+        Przekształca stan rejestru Fibonacciego w stan Galois o tym samym ciągu wyjściowym.
+        
+        Bit t stanu Galois to x_t XOR (XOR po tapach x_{t-tap}), gdzie x_t to bit t
+        stanu Fibonacciego (t-ty bit wyjściowy).
+        
+        Args:
+            state: stan rejestru Fibonacciego
+        
+        Returns:
+            Stan rejestru Galois
+        """
+        mask = (1 << self.length) - 1
+        galois_state = state
+        for tap in self.taps:
+            galois_state ^= (state << tap) & mask
+        return galois_state
+    
+    def step(self) -> int:
+        """
+        Zwraca kolejny bit wyjściowy (z bufora, uzupełnianego jednym odczytaniem tablicy).
+        
+        Returns:
+            Bit wyjściowy (0 lub 1)
+        """
+        if self.buffer_bits == 0:
+            low = self.state & self.table_mask
+            self.buffer = self.output_table[low]
+            self.buffer_bits = self.table_bits
+            self.state = (self.state >> self.table_bits) ^ self.state_table[low]
+        
+        output_bit = self.buffer & 1
+        self.buffer >>= 1
+        self.buffer_bits -= 1
+        return output_bit
+    
+    def step_many(self, num_bits: int, as_bytes: bool = False) -> Union[int, bytes]:
+        """
+        Generuje num_bits bitów naraz (ten sam format wyniku co LFSR.step_many).
+        
+        Args:
+            num_bits: liczba bitów do wygenerowania
+            as_bytes: True - bajty (pierwszy bit to najstarszy bit pierwszego bajtu), False - liczba
+        
+        Returns:
+            Liczba, w której bit i to i-ty bit wyjściowy, albo bajty
+        """
+        if self.fibonacci is None or num_bits < self.buffer_bits + self.length:
+            result = self._step_tables(num_bits)
+        else:
+            # Bity z bufora, potem rundy rejestru Fibonacciego od równoważnego stanu
+            head_bits = self.buffer_bits
+            head = self._step_tables(head_bits)
+            self.fibonacci.state = self.fibonacci_state()
+            body = self.fibonacci.step_many(num_bits - head_bits)
+            self.state = self.fibonacci_to_galois(self.fibonacci.state)
+            result = head | (body << head_bits)
+        
+        if as_bytes:
+            return result.to_bytes((num_bits + 7) // 8, 'little').translate(BIT_REVERSE_TABLE)
+        return result
+    
+    def _step_tables(self, num_bits: int) -> int:
+        """Generuje num_bits bitów tablicami przejść (wynik jak step_many bez as_bytes)."""
+        # Najpierw bity pozostałe w buforze po step()
+        head_bits = min(num_bits, self.buffer_bits)
+        head = self.buffer & ((1 << head_bits) - 1)
+        self.buffer >>= head_bits
+        self.buffer_bits -= head_bits
+        remaining = num_bits - head_bits
+        
+        # Pełne fragmenty: jeden odczyt tablicy na 8 lub 16 bitów
+        state_table = self.state_table
+        output_table = self.output_table
+        table_bits = self.table_bits
+        table_mask = self.table_mask
+        state = self.state
+        
+        chunks = remaining // table_bits
+        output = array('B' if table_bits == 8 else 'H')
+        append = output.append
+        for _ in range(chunks):
+            low = state & table_mask
+            append(output_table[low])
+            state = (state >> table_bits) ^ state_table[low]
+        if sys.byteorder == 'big':
+            output.byteswap()
+        
+        # Ostatni niepełny fragment trafia częściowo do bufora
+        tail_bits = remaining - chunks * table_bits
+        tail = 0
+        if tail_bits:
+            low = state & table_mask
+            chunk = output_table[low]
+            state = (state >> table_bits) ^ state_table[low]
+            tail = chunk & ((1 << tail_bits) - 1)
+            self.buffer = chunk >> tail_bits
+            self.buffer_bits = table_bits - tail_bits
+        self.state = state
+        
+        body = int.from_bytes(output, 'little')
+        return head | (body << head_bits) | (tail << (head_bits + chunks * table_bits))
+    
+    def generate_keystream(self, num_bits: int, packed: bool = False) -> Union[List[int], BitBuffer]:
+        """
+        Generuje strumień kluczy o określonej długości.
+        
+        Args:
+            num_bits: liczba bitów do wygenerowania
+            packed: True - spakowany BitBuffer, False - lista bitów
+        
+        Returns:
+            Lista bitów (0 i 1) albo BitBuffer
+        """
+        if packed:
+            return BitBuffer(self.step_many(num_bits, as_bytes=True), num_bits)
+        bits = self.step_many(num_bits)
+        return [(bits >> i) & 1 for i in range(num_bits)]
+    
+    def jump(self, n: int):
+        """
+        Przesuwa rejestr o n kroków (wielomianowo, jak LFSR.jump), łącznie z bitami w buforze.
+        
+        Args:
+            n: liczba kroków (n >= 0)
+        """
+        state = self.fibonacci_state()
+        if state:       # Stan zerowy (możliwy bez tapa na pozycji length) już się nie zmienia
+            lfsr = LFSR(self.length, self.taps, state)
+            lfsr.jump(n)
+            state = lfsr.state
+        self.state = self.fibonacci_to_galois(state)
+        self.buffer = 0
+        self.buffer_bits = 0
+    
+    def fibonacci_state(self) -> int:
+        """Zwraca stan równoważnego rejestru LFSR (następne length bitów wyjściowych), bez przesuwania."""
+        saved = (self.state, self.buffer, self.buffer_bits)
+        state = self._step_tables(self.length)
+        self.state, self.buffer, self.buffer_bits = saved
+        return state
+    
+    def reset(self):
+        """Resetuje rejestr do stanu początkowego."""
+        self.state = self.initial_state
+        self.table_mask = (1 << self.table_bits) - 1
+        self.buffer = 0         # Bity wyjściowe już policzone, a jeszcze nie zwrócone przez step()
+        self.buffer_bits = 0
+    
+    def get_state_binary(self) -> str:
+        """Zwraca stan równoważnego rejestru LFSR jako ciąg binarny."""
+        return format(self.fibonacci_state(), f'0{self.length}b')
+    
+    def __repr__(self):
+        return f"GaloisLFSR(length={self.length}, taps={self.taps}, state={self.get_state_binary()})"
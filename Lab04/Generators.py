@@ -1,7 +1,17 @@
 from LFSR import LFSR
-from typing import List
+from GaloisLFSR import GaloisLFSR
+from BitBuffer import BitBuffer
+from typing import List, Union
 
-def geffe_generator(lfsr1: LFSR, lfsr2: LFSR, lfsr3: LFSR, num_bits: int) -> List[int]:
+# Generatory korzystają tylko z step(), więc przyjmują oba rodzaje rejestrów:
+# GaloisLFSR daje ten sam ciąg co LFSR o tych samych parametrach, ale szybciej
+Register = Union[LFSR, GaloisLFSR]
+
+# Strumień kluczy: lista bitów albo spakowany BitBuffer (packed=True)
+Keystream = Union[List[int], BitBuffer]
+
+def geffe_generator(lfsr1: Register, lfsr2: Register, lfsr3: Register, num_bits: int,
+                    packed: bool = False) -> Keystream:
     """
     Generator Geffe'go - kombinuje 3 LFSR.
     
@@ -13,11 +23,12 @@ def geffe_generator(lfsr1: LFSR, lfsr2: LFSR, lfsr3: LFSR, num_bits: int) -> Lis
         lfsr2: drugi LFSR
         lfsr3: trzeci LFSR
         num_bits: liczba bitów do wygenerowania
+        packed: True - wynik jako BitBuffer (8 bitów na bajt), False - lista bitów
         
     Returns:
-        Lista bitów strumienia kluczy
+        Lista bitów strumienia kluczy (BitBuffer dla packed=True)
     """
-    keystream = []
+    keystream = BitBuffer() if packed else []
     
     for _ in range(num_bits):
         bit1 = lfsr1.step()
@@ -31,7 +42,8 @@ def geffe_generator(lfsr1: LFSR, lfsr2: LFSR, lfsr3: LFSR, num_bits: int) -> Lis
     return keystream
 
 
-def stop_and_go_generator(lfsr_control: LFSR, lfsr_r2: LFSR, lfsr_r3: LFSR, num_bits: int) -> List[int]:
+def stop_and_go_generator(lfsr_control: Register, lfsr_r2: Register, lfsr_r3: Register, num_bits: int,
+                          packed: bool = False) -> Keystream:
     """
     Generator Stop-and-Go - używa rejestru kontrolnego do sterowania dwoma rejestrami danych.
     
@@ -45,11 +57,12 @@ def stop_and_go_generator(lfsr_control: LFSR, lfsr_r2: LFSR, lfsr_r3: LFSR, num_
         lfsr_r2: rejestr danych R2
         lfsr_r3: rejestr danych R3
         num_bits: liczba bitów do wygenerowania
+        packed: True - wynik jako BitBuffer (8 bitów na bajt), False - lista bitów
         
     Returns:
-        Lista bitów strumienia kluczy
+        Lista bitów strumienia kluczy (BitBuffer dla packed=True)
     """
-    keystream = []
+    keystream = BitBuffer() if packed else []
     
     # Pobieramy początkowe wartości R2 i R3
     bit_r2 = lfsr_r2.step()
@@ -72,7 +85,7 @@ def stop_and_go_generator(lfsr_control: LFSR, lfsr_r2: LFSR, lfsr_r3: LFSR, num_
     return keystream
 
 
-def shrinking_generator(lfsr_a: LFSR, lfsr_s: LFSR, num_bits: int) -> List[int]:
+def shrinking_generator(lfsr_a: Register, lfsr_s: Register, num_bits: int, packed: bool = False) -> Keystream:
     """
     Shrinking Generator - używa rejestru selekcji do filtrowania wyjścia rejestru A.
     
@@ -85,11 +98,12 @@ def shrinking_generator(lfsr_a: LFSR, lfsr_s: LFSR, num_bits: int) -> List[int]:
         lfsr_a: rejestr danych A
         lfsr_s: rejestr selekcji S
         num_bits: liczba bitów do wygenerowania
+        packed: True - wynik jako BitBuffer (8 bitów na bajt), False - lista bitów
         
     Returns:
-        Lista bitów strumienia kluczy
+        Lista bitów strumienia kluczy (BitBuffer dla packed=True)
     """
-    keystream = []
+    keystream = BitBuffer() if packed else []
     
     while len(keystream) < num_bits:
         bit_a = lfsr_a.step()
@@ -1,7 +1,52 @@
-from typing import List, Optional
+from typing import List, Optional, Union
 import secrets
 import random
 
+from BitBuffer import BitBuffer, BIT_REVERSE_TABLE
+
+# Rozmiar fragmentu (w bitach) przenoszonego z akumulatora do bufora w step_many
+STEP_MANY_FLUSH_BITS = 4096
+
+
+def gf2_reduce(value: int, modulus: int) -> int:
+    """
+    Reszta z dzielenia wielomianów nad GF(2) (bit i = współczynnik przy x^i).
+    
+    Args:
+        value: dzielna
+        modulus: dzielnik (niezerowy)
+    
+    Returns:
+        value mod modulus (stopień mniejszy niż stopień modulus)
+    """
+    degree = modulus.bit_length() - 1
+    while value.bit_length() > degree:
+        value ^= modulus << (value.bit_length() - 1 - degree)
+    return value
+
+
+def gf2_x_power_mod(n: int, modulus: int) -> int:
+    """
+    Oblicza x^n mod modulus nad GF(2) metodą podnoszenia do kwadratu i mnożenia przez x.
+    
+    Kwadrat wielomianu nad GF(2) to rozsunięcie jego bitów (a(x)^2 = a(x^2)),
+    więc każdy krok to jedno rozsunięcie i jedna redukcja - razem O(L^2 log n) operacji bitowych.
+    
+    Args:
+        n: wykładnik (n >= 0)
+        modulus: wielomian modułu
+    
+    Returns:
+        x^n mod modulus
+    """
+    result = gf2_reduce(1, modulus)
+    for bit in format(n, 'b') if n else '':
+        # Kwadrat: bity a_i przechodzą na pozycje 2i
+        result = gf2_reduce(int('0'.join(format(result, 'b')), 2), modulus)
+        if bit == '1':
+            result = gf2_reduce(result << 1, modulus)
+    return result
+
 class LFSR:
     """
     Liniowy rejestr przesuwający z konfigurowalnymi pozycjami tapów.
@@ -176,6 +221,21 @@ class LFSR:
         for tap in self.taps:
             if tap < 1 or tap > length:
                 raise ValueError(f"Pozycja tapa {tap} poza zakresem [1, {length}]")
+        
+        # Maska tapów: bit sprzężenia to parzystość (state & tap_mask)
+        self.tap_mask = 0
+        for tap in self.taps:
+            self.tap_mask ^= 1 << (self.length - tap)
+        # Przesunięcia tapów i liczba bitów na rundę w step_many: sprzężenie kroku j zależy
+        # od bitów j + length - tap, które są jeszcze w rejestrze dla j < min(taps)
+        self.tap_shifts = [self.length - tap for tap in self.taps]
+        self.bits_per_round = min(self.taps)
+        
+        # Wielomian charakterystyczny ciągu wyjściowego x_{t+L} = XOR x_{t+L-tap}:
+        # P(x) = x^L + suma x^(L-tap) (bit i = współczynnik przy x^i)
+        self.characteristic_polynomial = 1 << self.length
+        for tap in self.taps:
+            self.characteristic_polynomial ^= 1 << (self.length - tap)
     
     def step(self) -> int:
         """
@@ -184,12 +244,9 @@ class LFSR:
         Returns:
             Bit wyjściowy (0 lub 1)
         """
-        # Obliczamy bit sprzężenia zwrotnego (XOR bitów na pozycjach tapów)
-        feedback = 0
-        for tap in self.taps:
-            # Pozycje tapów są 1-indeksowane, więc tap=1 to najbardziej znaczący bit
-            bit_position = self.length - tap
-            feedback ^= (self.state >> bit_position) & 1
+        # Bit sprzężenia zwrotnego = XOR bitów na pozycjach tapów = parzystość (state & maska)
+        # Pozycje tapów są 1-indeksowane, więc tap=1 to najbardziej znaczący bit
+        feedback = (self.state & self.tap_mask).bit_count() & 1
         
         # Bit wyjściowy to najmniej znaczący bit
         output_bit = self.state & 1
@@ -199,18 +256,108 @@ class LFSR:
         
         return output_bit
     
-    def generate_keystream(self, num_bits: int) -> List[int]:
+    def generate_keystream(self, num_bits: int, packed: bool = False) -> Union[List[int], BitBuffer]:
         """
         Generuje strumień kluczy o określonej długości.
         
         Args:
             num_bits: liczba bitów do wygenerowania
+            packed: True - spakowany BitBuffer (przez step_many), False - lista bitów
             
         Returns:
-            Lista bitów (0 i 1)
+            Lista bitów (0 i 1) albo BitBuffer
         """
+        if packed:
+            return BitBuffer(self.step_many(num_bits, as_bytes=True), num_bits)
         return [self.step() for _ in range(num_bits)]
     
+    def step_many(self, num_bits: int, as_bytes: bool = False) -> Union[int, bytes]:
+        """
+        Wykonuje num_bits kroków naraz i zwraca bity wyjściowe w jednej liczbie lub bajtach.
+        
+        W jednej rundzie przesunięcia powstaje min(taps) bitów: wyjście to najmłodsze
+        bity stanu, a bity sprzężenia dla całej rundy to XOR stanu przesuniętego o każdy tap.
+        
+        Args:
+            num_bits: liczba bitów do wygenerowania
+            as_bytes: True - bajty (pierwszy bit to najstarszy bit pierwszego bajtu,
+                      końcówka dopełniona zerami), False - liczba całkowita
+        
+        Returns:
+            Liczba, w której bit i to i-ty bit wyjściowy, albo bajty
+        """
+        length = self.length
+        shifts = self.tap_shifts
+        round_bits = self.bits_per_round
+        round_mask = (1 << round_bits) - 1
+        insert_shift = length - round_bits
+        flush_bytes = STEP_MANY_FLUSH_BITS // 8
+        flush_mask = (1 << STEP_MANY_FLUSH_BITS) - 1
+        
+        state = self.state
+        output = bytearray()
+        word = 0            # Akumulator bitów jeszcze nie przeniesionych do output
+        word_bits = 0
+        
+        # Pełne rundy
+        for _ in range(num_bits // round_bits):
+            feedback = 0
+            for shift in shifts:
+                feedback ^= state >> shift
+            word |= (state & round_mask) << word_bits
+            state = (state >> round_bits) | ((feedback & round_mask) << insert_shift)
+            word_bits += round_bits
+            if word_bits >= STEP_MANY_FLUSH_BITS:
+                output += (word & flush_mask).to_bytes(flush_bytes, 'little')
+                word >>= STEP_MANY_FLUSH_BITS
+                word_bits -= STEP_MANY_FLUSH_BITS
+        
+        # Niepełna ostatnia runda
+        remaining = num_bits % round_bits
+        if remaining:
+            feedback = 0
+            for shift in shifts:
+                feedback ^= state >> shift
+            word |= (state & ((1 << remaining) - 1)) << word_bits
+            state = (state >> remaining) | ((feedback & ((1 << remaining) - 1)) << (length - remaining))
+            word_bits += remaining
+        
+        self.state = state
+        output += word.to_bytes((word_bits + 7) // 8, 'little')
+        
+        if as_bytes:
+            # Bajty little-endian z bitem 0 na pozycji LSB -> kolejność bitów od najstarszego
+            return bytes(output).translate(BIT_REVERSE_TABLE)
+        return int.from_bytes(output, 'little')
+    
+    def jump(self, n: int):
+        """
+        Przesuwa rejestr o n kroków bez ich wykonywania (stan jak po n wywołaniach step()).
+        
+        Jeśli x^n = r(x) mod P(x), to x_{t+n} = XOR r_i x_{t+i} dla każdego t, więc nowy stan
+        (bity x_n ... x_{n+L-1}) wynika z r i 2L-1 najbliższych bitów wyjściowych.
+        Koszt O(L^2 log n) zamiast O(n).
+        
+        Args:
+            n: liczba kroków (n >= 0)
+        """
+        if n < 0:
+            raise ValueError("Liczba kroków nie może być ujemna")
+        if n < 2 * self.length:
+            self.step_many(n)
+            return
+        
+        # Najbliższe 2L-1 bitów wyjściowych (bit i = x_i), bez przesuwania rejestru
+        state = self.state
+        window = self.step_many(2 * self.length - 1)
+        self.state = state
+        
+        remainder = gf2_x_power_mod(n, self.characteristic_polynomial)
+        new_state = 0
+        for j in range(self.length):
+            new_state |= ((remainder & (window >> j)).bit_count() & 1) << j
+        self.state = new_state
+    
     def reset(self):
         """Resetuje rejestr do stanu początkowego."""
         self.state = self.initial_state
@@ -0,0 +1,215 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from BitBuffer import BitBuffer
+from GaloisLFSR import GaloisLFSR
+from Generators import Register
+from LFSR import LFSR
+
+# Minimalny rozmiar segmentu (bity) - mniejsze żądania generowane są w bieżącym procesie
+MIN_SEGMENT_BITS = 1 << 20
+
+# Liczba segmentów na proces (równoważenie obciążenia przy nierównych czasach procesów)
+SEGMENTS_PER_WORKER = 4
+
+# Opis rejestru przekazywany do procesu: (length, taps, state)
+RegisterSpec = Tuple[int, List[int], int]
+
+# Liczba bitów rejestrów łączonych naraz w wektoryzowanym generatorze Geffe'go (wielokrotność 64)
+GEFFE_CHUNK_BITS = 1 << 20
+
+
+def geffe_fill(out: np.ndarray, lfsr1: Register, lfsr2: Register, lfsr3: Register, num_bits: int,
+               chunk_bits: int = GEFFE_CHUNK_BITS) -> np.ndarray:
+    """
+    Wektoryzowany generator Geffe'go zapisujący wynik do przygotowanego bufora.
+    
+    Rejestry generują fragmenty po chunk_bits bitów przez step_many(as_bytes=True),
+    a funkcja Geffe'go to trzy operacje bitowe NumPy na słowach uint64 (uint8 dla
+    niepełnego ostatniego fragmentu), z wynikami pośrednimi w buforach przydzielonych raz.
+    
+    Args:
+        out: tablica uint8 o co najmniej (num_bits + 7) // 8 elementach
+        lfsr1: pierwszy LFSR (selektor)
+        lfsr2: drugi LFSR
+        lfsr3: trzeci LFSR
+        num_bits: liczba bitów do wygenerowania
+        chunk_bits: rozmiar fragmentu w bitach (wielokrotność 64)
+    
+    Returns:
+        out[:(num_bits + 7) // 8] - bity jak w geffe_generator(..., packed=True)
+    """
+    if chunk_bits <= 0 or chunk_bits % 64:
+        raise ValueError("Rozmiar fragmentu musi być dodatnią wielokrotnością 64 bitów")
+    num_bytes = (num_bits + 7) // 8
+    if out.dtype != np.uint8 or len(out) < num_bytes:
+        raise ValueError(f"Bufor wyjściowy musi być tablicą uint8 o co najmniej {num_bytes} elementach")
+    
+    selected = np.empty(chunk_bits // 64, dtype=np.uint64)
+    other = np.empty(chunk_bits // 64, dtype=np.uint64)
+    
+    for start in range(0, num_bits, chunk_bits):
+        size = min(chunk_bits, num_bits - start)
+        size_bytes = (size + 7) // 8
+        dtype = np.uint64 if size_bytes % 8 == 0 else np.uint8
+        bits1 = np.frombuffer(lfsr1.step_many(size, as_bytes=True), dtype=dtype)
+        bits2 = np.frombuffer(lfsr2.step_many(size, as_bytes=True), dtype=dtype)
+        bits3 = np.frombuffer(lfsr3.step_many(size, as_bytes=True), dtype=dtype)
+        target = out[start // 8:start // 8 + size_bytes].view(dtype)
+        first = selected.view(dtype)[:len(bits1)]
+        second = other.view(dtype)[:len(bits1)]
+        
+        # output = (L1 AND L2) XOR ((NOT L1) AND L3); końcówka dopełnienia zostaje zerowa
+        np.bitwise_and(bits1, bits2, out=first)
+        np.invert(bits1, out=second)
+        np.bitwise_and(second, bits3, out=second)
+        np.bitwise_xor(first, second, out=target)
+    
+    return out[:num_bytes]
+
+
+def geffe_generator_vectorized(lfsr1: Register, lfsr2: Register, lfsr3: Register, num_bits: int,
+                               chunk_bits: int = GEFFE_CHUNK_BITS) -> BitBuffer:
+    """
+    Wektoryzowany generator Geffe'go - wynik identyczny z geffe_generator(..., packed=True).
+    
+    Args:
+        lfsr1: pierwszy LFSR (selektor)
+        lfsr2: drugi LFSR
+        lfsr3: trzeci LFSR
+        num_bits: liczba bitów do wygenerowania
+        chunk_bits: rozmiar fragmentu w bitach (wielokrotność 64)
+    
+    Returns:
+        Strumień kluczy jako BitBuffer
+    """
+    data = bytearray((num_bits + 7) // 8)
+    geffe_fill(np.frombuffer(data, dtype=np.uint8), lfsr1, lfsr2, lfsr3, num_bits, chunk_bits)
+    return BitBuffer.wrap(data, num_bits)
+
+
+def split_segments(num_bits: int, workers: int) -> List[Tuple[int, int]]:
+    """
+    Dzieli zakres [0, num_bits) na segmenty wyrównane do pełnych bajtów.
+    
+    Args:
+        num_bits: liczba bitów do wygenerowania
+        workers: liczba procesów
+    
+    Returns:
+        Lista par (pierwszy bit, liczba bitów)
+    """
+    count = max(1, min(workers * SEGMENTS_PER_WORKER, num_bits // MIN_SEGMENT_BITS))
+    size = max(1, -(-num_bits // count))
+    size += -size % 8       # Segmenty zaczynają się na granicy bajtu
+    return [(start, min(size, num_bits - start)) for start in range(0, num_bits, size)]
+
+
+def _fill_segment(out: np.ndarray, specs: List[RegisterSpec], combiner: str, start: int, num_bits: int):
+    """
+    Generuje segment strumienia od pozycji start i zapisuje go do bufora out.
+    
+    Args:
+        out: tablica uint8 na (num_bits + 7) // 8 bajtów segmentu
+        specs: opisy rejestrów
+        combiner: 'lfsr' (jeden rejestr) lub 'geffe' (trzy rejestry)
+        start: pozycja pierwszego bitu segmentu
+        num_bits: długość segmentu
+    """
+    registers = []
+    for length, taps, state in specs:
+        lfsr = LFSR(length, taps, state)
+        lfsr.jump(start)
+        registers.append(lfsr)
+    
+    if combiner == 'geffe':
+        geffe_fill(out, *registers, num_bits)
+    else:
+        out[:(num_bits + 7) // 8] = np.frombuffer(registers[0].step_many(num_bits, as_bytes=True), dtype=np.uint8)
+
+
+def _write_segment(shared_name: str, specs: List[RegisterSpec], combiner: str, start: int, num_bits: int):
+    """Proces roboczy: generuje segment bezpośrednio do wspólnej pamięci od bajtu start // 8."""
+    shared = shared_memory.SharedMemory(name=shared_name)
+    try:
+        out = np.ndarray(((num_bits + 7) // 8,), dtype=np.uint8, buffer=shared.buf, offset=start // 8)
+        _fill_segment(out, specs, combiner, start, num_bits)
+        del out         # Widok musi zniknąć przed zamknięciem pamięci współdzielonej
+    finally:
+        shared.close()
+
+
+def _parallel_keystream(registers: List[Register], combiner: str, num_bits: int,
+                        workers: Optional[int] = None) -> BitBuffer:
+    """
+    Generuje strumień w segmentach w osobnych procesach i przesuwa rejestry o num_bits kroków.
+    
+    Każdy proces ustawia kopie rejestrów na początek swojego segmentu przez jump(),
+    a wynik zapisuje bezpośrednio na swoje miejsce we wspólnym buforze.
+    """
+    workers = workers or os.cpu_count() or 1
+    # Procesy dostają stan równoważnego rejestru Fibonacciego (GaloisLFSR ma inny stan wewnętrzny)
+    specs = [(lfsr.length, lfsr.taps, lfsr.fibonacci_state() if isinstance(lfsr, GaloisLFSR) else lfsr.state)
+             for lfsr in registers]
+    segments = split_segments(num_bits, workers)
+    
+    if workers == 1 or len(segments) <= 1:
+        data = bytearray((num_bits + 7) // 8)
+        _fill_segment(np.frombuffer(data, dtype=np.uint8), specs, combiner, 0, num_bits)
+        result = BitBuffer.wrap(data, num_bits)
+    else:
+        shared = shared_memory.SharedMemory(create=True, size=(num_bits + 7) // 8)
+        try:
+            with ProcessPoolExecutor(max_workers=min(workers, len(segments))) as executor:
+                futures = [executor.submit(_write_segment, shared.name, specs, combiner, start, size)
+                           for start, size in segments]
+                for future in futures:
+                    future.result()
+            view = shared.buf[:(num_bits + 7) // 8]
+            result = BitBuffer(view, num_bits)
+            view.release()
+        finally:
+            shared.close()
+            shared.unlink()
+    
+    # Rejestry kończą w tym samym stanie co po wersji sekwencyjnej
+    for lfsr in registers:
+        lfsr.jump(num_bits)
+    return result
+
+
+def parallel_lfsr_keystream(lfsr: Register, num_bits: int, workers: Optional[int] = None) -> BitBuffer:
+    """
+    Równoległy odpowiednik lfsr.generate_keystream(num_bits, packed=True).
+    
+    Args:
+        lfsr: rejestr (przesuwany o num_bits kroków)
+        num_bits: liczba bitów do wygenerowania
+        workers: liczba procesów (domyślnie liczba rdzeni)
+    
+    Returns:
+        Strumień kluczy jako BitBuffer
+    """
+    return _parallel_keystream([lfsr], 'lfsr', num_bits, workers)
+
+
+def parallel_geffe_generator(lfsr1: Register, lfsr2: Register, lfsr3: Register, num_bits: int,
+                             workers: Optional[int] = None) -> BitBuffer:
+    """
+    Równoległy generator Geffe'go - wynik identyczny z geffe_generator(..., packed=True).
+    
+    Args:
+        lfsr1: pierwszy LFSR (selektor)
+        lfsr2: drugi LFSR
+        lfsr3: trzeci LFSR
+        num_bits: liczba bitów do wygenerowania
+        workers: liczba procesów (domyślnie liczba rdzeni)
+    
+    Returns:
+        Strumień kluczy jako BitBuffer
+    """
+    return _parallel_keystream([lfsr1, lfsr2, lfsr3], 'geffe', num_bits, workers)
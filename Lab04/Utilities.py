@@ -1,11 +1,13 @@
-from typing import List
+from typing import List, Union
 
-def display_binary_blocks(bits: List[int], label: str, block_size: int = 8):
+from BitBuffer import BitBuffer
+
+def display_binary_blocks(bits: Union[List[int], BitBuffer], label: str, block_size: int = 8):
     """
     Wyświetla strumień bitów w blokach o określonym rozmiarze.
     
     Args:
-        bits: lista bitów do wyświetlenia
+        bits: lista bitów (lub BitBuffer) do wyświetlenia
         label: etykieta opisu
         block_size: rozmiar bloku (domyślnie 8 bitów)
     """
@@ -29,16 +31,19 @@ def display_binary_blocks(bits: List[int], label: str, block_size: int = 8):
         print(f"  {' '.join(line_blocks)}")
 
 
-def bits_to_hex(bits: List[int]) -> str:
+def bits_to_hex(bits: Union[List[int], BitBuffer]) -> str:
     """
     Konwertuje listę bitów na ciąg heksadecymalny.
     
     Args:
-        bits: lista bitów
+        bits: lista bitów (lub BitBuffer)
         
     Returns:
         Ciąg heksadecymalny
     """
+    if isinstance(bits, BitBuffer):
+        return bits.to_hex()
+    
     # Dopełniamy do wielokrotności 4 bitów
     padded_bits = bits + [0] * ((4 - len(bits) % 4) % 4)
     
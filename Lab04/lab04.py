@@ -9,8 +9,12 @@ Implementacja liniowych rejestrów przesuwających i generatorów strumieni kluc
 4. Shrinking Generator
 """
 
+import os
 import time
+import tracemalloc
 from LFSR import LFSR
+from GaloisLFSR import FIBONACCI_ROUND_BITS, GaloisLFSR
+from BitBuffer import BitBuffer
 from Utilities import display_binary_blocks, bits_to_hex, parse_taps, parse_seed
 from Generators import geffe_generator, stop_and_go_generator, shrinking_generator
 
@@ -140,6 +144,292 @@ def zad2():
     print(f"Czas generowania: {elapsed*1000:.4f} ms")
 
 
+def benchmark_step_many(lengths=(16, 32, 64, 128), list_bits: int = 200000, packed_bits: int = 10**7):
+    """
+    Porównanie przepustowości (bity/s) generate_keystream i step_many.
+    
+    Args:
+        lengths: długości rejestrów (taps z bazy wielomianów maksymalnej długości)
+        list_bits: liczba bitów generowanych przez generate_keystream
+        packed_bits: liczba bitów generowanych przez step_many
+    """
+    print("\n" + "=" * 80)
+    print("BENCHMARK - generate_keystream (lista bitów) vs step_many (bity spakowane)")
+    print("=" * 80)
+    print(f"\n{'Długość':>8} {'Bity/runda':>11} {'generate_keystream':>20} {'step_many':>16} {'Przyspieszenie':>15}")
+    print("-" * 74)
+    
+    for length in lengths:
+        lfsr = LFSR(length=length, taps=None, seed=1)
+        
+        start_time = time.perf_counter()
+        keystream = lfsr.generate_keystream(list_bits)
+        list_rate = list_bits / (time.perf_counter() - start_time)
+        
+        lfsr.reset()
+        start_time = time.perf_counter()
+        packed = lfsr.step_many(packed_bits)
+        packed_rate = packed_bits / (time.perf_counter() - start_time)
+        
+        # Sprawdzenie zgodności na początku strumienia
+        assert all(((packed >> i) & 1) == bit for i, bit in enumerate(keystream[:10000]))
+        
+        print(f"{length:>8} {lfsr.bits_per_round:>11} {list_rate:>15,.0f} b/s {packed_rate:>12,.0f} b/s "
+              f"{packed_rate / list_rate:>14.1f}x")
+    
+    print(f"\n(generate_keystream: {list_bits:,} bitów, step_many: {packed_bits:,} bitów)")
+
+
+def benchmark_galois(lengths=(16, 64, 128), generator_bits: int = 100000, packed_bits: int = 10**7):
+    """
+    Porównanie rejestrów Fibonacciego (LFSR) i Galois z tablicami przejść (GaloisLFSR)
+    w generatorach i w step_many; sprawdza też zgodność wygenerowanych ciągów.
+    
+    Args:
+        lengths: długości rejestrów (taps z bazy wielomianów maksymalnej długości)
+        generator_bits: liczba bitów generowanych przez każdy generator
+        packed_bits: liczba bitów generowanych przez step_many
+    """
+    print("\n" + "=" * 80)
+    print("BENCHMARK - LFSR (Fibonacci) vs GaloisLFSR (tablice 256 i 65536 elementów)")
+    print("=" * 80)
+    
+    def registers(register_class, count, **kwargs):
+        return [register_class(length, None, 0x5A5A5A5A5A5A5A5A5A5A5A5A5A5A5A5A + i, **kwargs)
+                for i, length in enumerate(lengths[:count])]
+    
+    generators = [
+        ("Geffe", lambda rs: geffe_generator(rs[0], rs[1], rs[2], generator_bits), 3),
+        ("Stop-and-Go", lambda rs: stop_and_go_generator(rs[0], rs[1], rs[2], generator_bits), 3),
+        ("Shrinking", lambda rs: shrinking_generator(rs[0], rs[1], generator_bits), 2),
+    ]
+    
+    print(f"\nGeneratory (rejestry o długościach {list(lengths)}, {generator_bits:,} bitów):")
+    print(f"{'Generator':>12} {'LFSR':>12} {'Galois 8b':>12} {'Galois 16b':>12} {'Przyspieszenie':>15}")
+    print("-" * 67)
+    for name, generate, count in generators:
+        times = []
+        outputs = []
+        for register_class, kwargs in ((LFSR, {}), (GaloisLFSR, {'table_bits': 8}), (GaloisLFSR, {'table_bits': 16})):
+            rs = registers(register_class, count, **kwargs)
+            start_time = time.perf_counter()
+            outputs.append(generate(rs))
+            times.append(time.perf_counter() - start_time)
+        assert outputs[0] == outputs[1] == outputs[2]
+        print(f"{name:>12} {times[0]*1000:>9.1f} ms {times[1]*1000:>9.1f} ms {times[2]*1000:>9.1f} ms "
+              f"{times[0] / min(times[1:]):>14.2f}x")
+    
+    print(f"\nstep_many ({packed_bits:,} bitów):")
+    print(f"{'Długość':>8} {'LFSR':>16} {'Galois 8b':>16} {'Galois 16b':>16}")
+    print("-" * 59)
+    for length in lengths:
+        rates = []
+        outputs = []
+        for register_class, kwargs in ((LFSR, {}), (GaloisLFSR, {'table_bits': 8}), (GaloisLFSR, {'table_bits': 16})):
+            register = register_class(length, None, 1, **kwargs)
+            start_time = time.perf_counter()
+            outputs.append(register.step_many(packed_bits))
+            rates.append(packed_bits / (time.perf_counter() - start_time))
+        assert outputs[0] == outputs[1] == outputs[2]
+        print(f"{length:>8} {rates[0]:>12,.0f} b/s {rates[1]:>12,.0f} b/s {rates[2]:>12,.0f} b/s")
+    
+    print("\n(LFSR.step_many przesuwa min(taps) bitów na rundę - dla rzadkich wielomianów")
+    print(" długich rejestrów to więcej niż 8 lub 16 bitów na odczyt tablicy, więc GaloisLFSR.step_many")
+    print(f" przechodzi wtedy na rundy LFSR, gdy min(taps) >= {FIBONACCI_ROUND_BITS})")
+
+
+def benchmark_bit_buffer(num_bits: int = 10**6):
+    """
+    Porównanie strumienia kluczy jako listy bitów i jako BitBuffer: pamięć,
+    czas generowania oraz czas operacji używanych przez testy statystyczne.
+    
+    Args:
+        num_bits: długość strumienia kluczy
+    """
+    print("\n" + "=" * 80)
+    print("BENCHMARK - lista bitów (List[int]) vs spakowany BitBuffer")
+    print("=" * 80)
+    
+    def measure(function):
+        """Zwraca (wynik, czas w s, zajęta pamięć w bajtach)."""
+        tracemalloc.start()
+        start_time = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start_time
+        memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        return result, elapsed, memory
+    
+    lfsr = LFSR(length=64, taps=None, seed=1)
+    bits, list_time, list_memory = measure(lambda: lfsr.generate_keystream(num_bits))
+    lfsr.reset()
+    packed, packed_time, packed_memory = measure(lambda: lfsr.generate_keystream(num_bits, packed=True))
+    assert packed == bits
+    
+    print(f"\nStrumień {num_bits:,} bitów z LFSR(64) (czasy z włączonym tracemalloc):")
+    print(f"{'':>22} {'Pamięć':>14} {'Generowanie':>14}")
+    print(f"{'List[int]':>22} {list_memory:>12,} B {list_time*1000:>11.1f} ms")
+    print(f"{'BitBuffer':>22} {packed_memory:>12,} B {packed_time*1000:>11.1f} ms")
+    print(f"{'Zmniejszenie pamięci':>22} {list_memory / packed_memory:>13.1f}x")
+    
+    def list_runs(values):
+        runs = []
+        current_length = 1
+        for i in range(1, len(values)):
+            if values[i] == values[i - 1]:
+                current_length += 1
+            else:
+                runs.append(current_length)
+                current_length = 1
+        runs.append(current_length)
+        return runs
+    
+    def list_segments(values, m=4):
+        counts = [0] * (1 << m)
+        for i in range(len(values) // m):
+            counts[sum(bit << (m - 1 - j) for j, bit in enumerate(values[i*m:(i+1)*m]))] += 1
+        return counts
+    
+    operations = [
+        ("Liczba jedynek", lambda: sum(bits), lambda: packed.count()),
+        ("Segmenty 4-bitowe", lambda: list_segments(bits), lambda: packed.segment_counts(4)),
+        ("Długości podciągów", lambda: list_runs(bits), lambda: packed.run_lengths()),
+        ("Bloki 128 bitów", lambda: [sum(bits[i:i + 128]) for i in range(0, num_bits - 127, 128)],
+         lambda: packed.block_counts(128)),
+    ]
+    
+    print(f"\n{'Operacja':>22} {'List[int]':>14} {'BitBuffer':>14} {'Przyspieszenie':>15}")
+    print("-" * 68)
+    for name, list_operation, packed_operation in operations:
+        start_time = time.perf_counter()
+        expected = list_operation()
+        list_time = time.perf_counter() - start_time
+        start_time = time.perf_counter()
+        result = packed_operation()
+        packed_time = time.perf_counter() - start_time
+        assert result == expected
+        print(f"{name:>22} {list_time*1000:>11.1f} ms {packed_time*1000:>11.1f} ms {list_time / packed_time:>14.1f}x")
+
+
+def benchmark_jump(lengths=(32, 64, 128), max_stepped: int = 10**7):
+    """
+    Porównanie czasu LFSR.jump(n) i przesuwania rejestru o n kroków (step_many),
+    ze sprawdzeniem zgodności stanów; dla dużych n tylko jump.
+    
+    Args:
+        lengths: długości rejestrów (taps z bazy wielomianów maksymalnej długości)
+        max_stepped: największe n przesuwane krok po kroku
+    """
+    print("\n" + "=" * 80)
+    print("BENCHMARK - LFSR.jump(n) (x^n mod P(x)) vs step_many(n)")
+    print("=" * 80)
+    print(f"\n{'Długość':>8} {'n':>26} {'step_many':>14} {'jump':>12} {'Przyspieszenie':>15}")
+    print("-" * 79)
+    
+    for length in lengths:
+        for exponent in (3, 5, 7, 12, 18):
+            n = 10 ** exponent
+            jumped = LFSR(length=length, taps=None, seed=1)
+            start_time = time.perf_counter()
+            jumped.jump(n)
+            jump_time = time.perf_counter() - start_time
+            
+            if n <= max_stepped:
+                stepped = LFSR(length=length, taps=None, seed=1)
+                start_time = time.perf_counter()
+                stepped.step_many(n)
+                step_time = time.perf_counter() - start_time
+                assert stepped.state == jumped.state
+                print(f"{length:>8} {n:>26,} {step_time*1000:>11.3f} ms {jump_time*1000:>9.3f} ms "
+                      f"{step_time / jump_time:>14.1f}x")
+            else:
+                print(f"{length:>8} {n:>26,} {'-':>14} {jump_time*1000:>9.3f} ms {'-':>15}")
+    
+    # Rejestr o wielomianie prymitywnym wraca do stanu początkowego po 2^L - 1 krokach
+    lfsr = LFSR(length=lengths[-1], taps=None, seed=1)
+    lfsr.jump(2 ** lfsr.length - 1)
+    print(f"\nLFSR({lfsr.length}).jump(2^{lfsr.length} - 1) == stan początkowy: {lfsr.state == lfsr.initial_state}")
+
+
+def benchmark_parallel_geffe(num_bits: int = 10**8, check_bits: int = 200000):
+    """
+    Skalowanie równoległego generatora Geffe'go z liczbą procesów
+    oraz sprawdzenie zgodności z wersją sekwencyjną.
+    
+    Args:
+        num_bits: liczba bitów generowanych w każdym pomiarze
+        check_bits: liczba bitów porównywanych z geffe_generator
+    """
+    from ParallelGenerators import parallel_geffe_generator     # Wymaga NumPy - import tylko na potrzeby benchmarku
+    
+    print("\n" + "=" * 80)
+    print("BENCHMARK - równoległy generator Geffe'go (segmenty, jump, pamięć współdzielona)")
+    print("=" * 80)
+    
+    def registers():
+        return [LFSR(length, None, seed) for length, seed in ((64, 0x1234), (96, 0x5678), (128, 0x9ABC))]
+    
+    sequential = geffe_generator(*registers(), check_bits, packed=True)
+    parallel = parallel_geffe_generator(*registers(), check_bits, workers=2)
+    print(f"\nZgodność z geffe_generator ({check_bits:,} bitów): {parallel == sequential}")
+    
+    cores = os.cpu_count() or 1
+    worker_counts = sorted({1, 2, 4, cores} & set(range(1, cores + 1))) if cores > 1 else [1, 2]
+    print(f"\n{num_bits:,} bitów ({num_bits // 8 // 2**20} MB), rdzenie: {cores}")
+    print(f"{'Procesy':>8} {'Czas':>12} {'Przepustowość':>18} {'Przyspieszenie':>15}")
+    print("-" * 56)
+    
+    base_time = None
+    reference = None
+    for workers in worker_counts:
+        start_time = time.perf_counter()
+        keystream = parallel_geffe_generator(*registers(), num_bits, workers=workers)
+        elapsed = time.perf_counter() - start_time
+        if reference is None:
+            base_time, reference = elapsed, keystream.to_bytes()
+        assert keystream.to_bytes() == reference
+        print(f"{workers:>8} {elapsed:>10.2f} s {num_bits / elapsed / 8 / 2**20:>13.1f} MB/s {base_time / elapsed:>14.2f}x")
+
+
+def benchmark_vectorized_geffe(sizes=(10**5, 10**6), large_bits: int = 10**8):
+    """
+    Porównanie generatora Geffe'go bit po bicie (geffe_generator) i wersji
+    wektoryzowanej (geffe_generator_vectorized) ze sprawdzeniem zgodności wyników.
+    
+    Args:
+        sizes: liczby bitów porównywane z geffe_generator
+        large_bits: liczba bitów generowana tylko wersją wektoryzowaną
+    """
+    from ParallelGenerators import geffe_generator_vectorized  # Wymaga NumPy - import tylko na potrzeby benchmarku
+    
+    print("\n" + "=" * 80)
+    print("BENCHMARK - generator Geffe'go: pętla po bitach vs NumPy (fragmenty, bufory przydzielone raz)")
+    print("=" * 80)
+    
+    def registers():
+        return [LFSR(length, None, seed) for length, seed in ((64, 0x1234), (96, 0x5678), (128, 0x9ABC))]
+    
+    print(f"\n{'Bity':>14} {'geffe_generator':>17} {'wektoryzowany':>15} {'Przyspieszenie':>15}")
+    print("-" * 64)
+    for num_bits in sizes:
+        start_time = time.perf_counter()
+        expected = geffe_generator(*registers(), num_bits, packed=True)
+        loop_time = time.perf_counter() - start_time
+        
+        start_time = time.perf_counter()
+        keystream = geffe_generator_vectorized(*registers(), num_bits)
+        vectorized_time = time.perf_counter() - start_time
+        assert keystream == expected
+        print(f"{num_bits:>14,} {loop_time*1000:>14.1f} ms {vectorized_time*1000:>12.1f} ms "
+              f"{loop_time / vectorized_time:>14.1f}x")
+    
+    start_time = time.perf_counter()
+    geffe_generator_vectorized(*registers(), large_bits)
+    elapsed = time.perf_counter() - start_time
+    print(f"{large_bits:>14,} {'-':>17} {elapsed*1000:>12.1f} ms {'-':>15}")
+    print(f"\n({large_bits / elapsed / 8 / 2**20:.1f} MB/s; czas to głównie step_many trzech rejestrów)")
+
+
 def interactive_lfsr():
     """Interaktywny tryb konfiguracji pojedynczego LFSR."""
     print("\n" + "=" * 80)
@@ -402,6 +692,40 @@ def interactive_shrinking():
         print(f"Nieoczekiwany błąd: {e}")
 
 
+def benchmark_menu():
+    """Podmenu benchmarków wydajności."""
+    while True:
+        print("\n" + "=" * 80)
+        print("BENCHMARKI WYDAJNOŚCI")
+        print("=" * 80)
+        print("1. generate_keystream vs step_many")
+        print("2. LFSR (Fibonacci) vs GaloisLFSR (tablice przejść)")
+        print("3. Lista bitów vs BitBuffer (pamięć i operacje)")
+        print("4. jump(n) vs przesuwanie krok po kroku")
+        print("5. Równoległy generator Geffe'go (procesy)")
+        print("6. Wektoryzowany generator Geffe'go (NumPy)")
+        print("0. Powrót do menu głównego")
+        
+        choice = input("\nWybierz benchmark: ").strip()
+        
+        if choice == '1':
+            benchmark_step_many()
+        elif choice == '2':
+            benchmark_galois()
+        elif choice == '3':
+            benchmark_bit_buffer()
+        elif choice == '4':
+            benchmark_jump()
+        elif choice == '5':
+            benchmark_parallel_geffe()
+        elif choice == '6':
+            benchmark_vectorized_geffe()
+        elif choice == '0':
+            break
+        else:
+            print("\nNieprawidłowy wybór. Spróbuj ponownie.")
+
+
 def main():
     """Główna funkcja programu z menu interaktywnym."""
     print("=" * 80)
@@ -419,6 +743,7 @@ def main():
         print("5. Tryb interaktywny - Generator Geffe'go")
         print("6. Tryb interaktywny - Generator Stop-and-Go")
         print("7. Tryb interaktywny - Shrinking Generator")
+        print("8. Benchmarki wydajności")
         print("0. Wyjście")
         
         try:
@@ -436,6 +761,8 @@ def main():
                 interactive_stop_and_go()
             elif choice == '7':
                 interactive_shrinking()
+            elif choice == '8':
+                benchmark_menu()
             elif choice == '0':
                 print("\nDo widzenia!")
                 break
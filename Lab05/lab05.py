@@ -19,8 +19,12 @@ import os
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'Lab04'))
 
 from LFSR import LFSR
+from BitBuffer import BitBuffer
 from Generators import geffe_generator, stop_and_go_generator, shrinking_generator
-from typing import List, Dict, Tuple
+from typing import List, Dict, Tuple, Union
+
+# Ciąg bitów przyjmowany przez testy: lista bitów lub spakowany BitBuffer z Lab04
+Bits = Union[List[int], BitBuffer]
 import time
 from scipy.special import gammaincc
 
@@ -28,15 +32,16 @@ from scipy.special import gammaincc
 # TESTY FIPS 140-2
 # ============================================================================
 
-def monobit_test(bits: List[int]) -> Tuple[bool, Dict]:
+def monobit_test(bits: Bits) -> Tuple[bool, Dict]:
     """
     Test monobitowy (nie jest w FIPS 140-2 dla 20000 bitów, ale pomocny).
     Sprawdza czy liczba jedynek jest bliska liczbie zer.
     
     Dla 20000 bitów: 9725 < ones < 10275
     """
+    bits = BitBuffer.ensure(bits)
     n = len(bits)
-    ones = sum(bits)
+    ones = bits.count()
     zeros = n - ones
     
     # Zakres akceptacji dla 20000 bitów zgodnie z FIPS 140-2
@@ -50,7 +55,7 @@ def monobit_test(bits: List[int]) -> Tuple[bool, Dict]:
     }
 
 
-def poker_test(bits: List[int], m: int = 4) -> Tuple[bool, Dict]:
+def poker_test(bits: Bits, m: int = 4) -> Tuple[bool, Dict]:
     """
     Test pokerowy FIPS 140-2.
     
@@ -63,25 +68,19 @@ def poker_test(bits: List[int], m: int = 4) -> Tuple[bool, Dict]:
     - Próg akceptacji: 2.16 < X < 46.17
     
     Args:
-        bits: lista 20000 bitów
+        bits: 20000 bitów (lista lub BitBuffer)
         m: długość segmentu (domyślnie 4)
     
     Returns:
         (passed, stats_dict)
     """
+    bits = BitBuffer.ensure(bits)
     n = len(bits)
     k = n // m  # liczba segmentów
     num_sequences = 2 ** m  # liczba możliwych wartości m-bitowych
     
-    # Zlicz wystąpienia każdego segmentu
-    counts = [0] * num_sequences
-    
-    for i in range(k):
-        # Pobierz m-bitowy segment
-        segment = bits[i*m:(i+1)*m]
-        # Konwertuj na liczbę
-        value = sum(bit << (m - 1 - j) for j, bit in enumerate(segment))
-        counts[value] += 1
+    # Zlicz wystąpienia każdego segmentu (pierwszy bit segmentu najstarszy)
+    counts = bits.segment_counts(m)
     
     # Oblicz statystykę X (chi-kwadrat)
     X = (num_sequences / k) * sum(count ** 2 for count in counts) - k
@@ -102,7 +101,7 @@ def poker_test(bits: List[int], m: int = 4) -> Tuple[bool, Dict]:
     }
 
 
-def runs_test(bits: List[int]) -> Tuple[bool, Dict]:
+def runs_test(bits: Bits) -> Tuple[bool, Dict]:
     """
     Test podciągów (Runs test) FIPS 140-2.
     
@@ -118,28 +117,13 @@ def runs_test(bits: List[int]) -> Tuple[bool, Dict]:
     - Długość 6+: 103 - 209
     
     Args:
-        bits: lista 20000 bitów
+        bits: 20000 bitów (lista lub BitBuffer)
     
     Returns:
         (passed, stats_dict)
     """
-    n = len(bits)
-    
     # Zlicz podciągi
-    runs = []
-    current_bit = bits[0]
-    current_length = 1
-    
-    for i in range(1, n):
-        if bits[i] == current_bit:
-            current_length += 1
-        else:
-            runs.append(current_length)
-            current_bit = bits[i]
-            current_length = 1
-    
-    # Dodaj ostatni podciąg
-    runs.append(current_length)
+    runs = BitBuffer.ensure(bits).run_lengths()
     
     # Zlicz podciągi według długości
     run_counts = {1: 0, 2: 0, 3: 0, 4: 0, 5: 0, 6: 0}
@@ -182,7 +166,7 @@ def runs_test(bits: List[int]) -> Tuple[bool, Dict]:
     }
 
 
-def long_runs_test(bits: List[int]) -> Tuple[bool, Dict]:
+def long_runs_test(bits: Bits) -> Tuple[bool, Dict]:
     """
     Test długich podciągów (Long runs test) FIPS 140-2.
     
@@ -192,21 +176,12 @@ def long_runs_test(bits: List[int]) -> Tuple[bool, Dict]:
     Test przechodzi (PASS) jeśli NIE ma podciągu długości >= 26.
     
     Args:
-        bits: lista 20000 bitów
+        bits: 20000 bitów (lista lub BitBuffer)
     
     Returns:
         (passed, stats_dict)
     """
-    n = len(bits)
-    max_run_length = 0
-    current_length = 1
-    
-    for i in range(1, n):
-        if bits[i] == bits[i-1]:
-            current_length += 1
-            max_run_length = max(max_run_length, current_length)
-        else:
-            current_length = 1
+    max_run_length = BitBuffer.ensure(bits).max_run_length()
     
     # Test przechodzi jeśli najdłuższy podciąg < 26
     passed = max_run_length < 26
@@ -218,7 +193,7 @@ def long_runs_test(bits: List[int]) -> Tuple[bool, Dict]:
     }
 
 
-def frequency_test_within_block(bits: List[int], M: int = 128) -> Tuple[bool, Dict]:
+def frequency_test_within_block(bits: Bits, M: int = 128) -> Tuple[bool, Dict]:
     """
     Frequency Test within a Block - NIST SP 800-22.
     
@@ -226,12 +201,13 @@ def frequency_test_within_block(bits: List[int], M: int = 128) -> Tuple[bool, Di
     czy proporcja jedynek w każdym bloku jest bliska 1/2.
     
     Args:
-        bits: lista bitów
+        bits: lista bitów lub BitBuffer
         M: rozmiar bloku (domyślnie 128)
     
     Returns:
         (passed, stats_dict)
     """
+    bits = BitBuffer.ensure(bits)
     n = len(bits)
     N = n // M  # liczba bloków
     
@@ -244,9 +220,7 @@ def frequency_test_within_block(bits: List[int], M: int = 128) -> Tuple[bool, Di
     # Oblicz proporcję jedynek w każdym bloku
     chi_squared = 0.0
     
-    for i in range(N):
-        block = bits[i*M:(i+1)*M]
-        ones = sum(block)
+    for ones in bits.block_counts(M):
         pi = ones / M
         
         # Suma dla chi-kwadrat
@@ -275,7 +249,7 @@ def frequency_test_within_block(bits: List[int], M: int = 128) -> Tuple[bool, Di
 # GENERATORY - FUNKCJE POMOCNICZE
 # ============================================================================
 
-def generate_geffe(lfsr_length: int, num_bits: int = 20000) -> List[int]:
+def generate_geffe(lfsr_length: int, num_bits: int = 20000) -> BitBuffer:
     """
     Generuje ciąg bitów używając generatora Geffe'go.
     
@@ -284,16 +258,16 @@ def generate_geffe(lfsr_length: int, num_bits: int = 20000) -> List[int]:
         num_bits: liczba bitów do wygenerowania
     
     Returns:
-        lista bitów
+        spakowany ciąg bitów (BitBuffer)
     """
     lfsr1 = LFSR.create_random(lfsr_length, secure=False)
     lfsr2 = LFSR.create_random(lfsr_length, secure=False)
     lfsr3 = LFSR.create_random(lfsr_length, secure=False)
     
-    return geffe_generator(lfsr1, lfsr2, lfsr3, num_bits)
+    return geffe_generator(lfsr1, lfsr2, lfsr3, num_bits, packed=True)
 
 
-def generate_stop_and_go(lfsr_length: int, num_bits: int = 20000) -> List[int]:
+def generate_stop_and_go(lfsr_length: int, num_bits: int = 20000) -> BitBuffer:
     """
     Generuje ciąg bitów używając generatora Stop-and-Go.
     
@@ -302,16 +276,16 @@ def generate_stop_and_go(lfsr_length: int, num_bits: int = 20000) -> List[int]:
         num_bits: liczba bitów do wygenerowania
     
     Returns:
-        lista bitów
+        spakowany ciąg bitów (BitBuffer)
     """
     lfsr_ctrl = LFSR.create_random(lfsr_length, secure=False)
     lfsr_r2 = LFSR.create_random(lfsr_length, secure=False)
     lfsr_r3 = LFSR.create_random(lfsr_length, secure=False)
     
-    return stop_and_go_generator(lfsr_ctrl, lfsr_r2, lfsr_r3, num_bits)
+    return stop_and_go_generator(lfsr_ctrl, lfsr_r2, lfsr_r3, num_bits, packed=True)
 
 
-def generate_shrinking(lfsr_length: int, num_bits: int = 20000) -> List[int]:
+def generate_shrinking(lfsr_length: int, num_bits: int = 20000) -> BitBuffer:
     """
     Generuje ciąg bitów używając Shrinking Generator.
     
@@ -320,12 +294,12 @@ def generate_shrinking(lfsr_length: int, num_bits: int = 20000) -> List[int]:
         num_bits: liczba bitów do wygenerowania
     
     Returns:
-        lista bitów
+        spakowany ciąg bitów (BitBuffer)
     """
     lfsr_a = LFSR.create_random(lfsr_length, secure=False)
     lfsr_s = LFSR.create_random(lfsr_length, secure=False)
     
-    return shrinking_generator(lfsr_a, lfsr_s, num_bits)
+    return shrinking_generator(lfsr_a, lfsr_s, num_bits, packed=True)
 
 
 # ============================================================================
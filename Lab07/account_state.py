@@ -0,0 +1,405 @@
+"""
+Lab 07 - Account Balance State
+Kryptologia - Patryk Rakowski 2025
+
+Account-balance table updated block by block. Every block writes an undo
+record to a write-ahead journal before touching the table, so applying and
+undoing a block costs time proportional to the accounts it changes. Each
+account also keeps a nonce: a signed transfer must carry the sender's next
+nonce, so an included transaction can never be replayed.
+"""
+
+import json
+import os
+import re
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, Dict, List, Optional, Tuple
+
+from signed_transactions import SignedTransaction
+
+
+# Transaction format: "TX_<id>: SENDER -> RECEIVER [AMOUNT units] nonce=N"
+TRANSFER_PATTERN = re.compile(r'(\S+) -> (\S+) \[(\d+) units\](?: nonce=(\d+))?')
+
+
+# ================================================================================
+# TRANSACTION PARSING
+# ================================================================================
+
+@dataclass
+class Transfer:
+    """
+    Value transfer between two accounts.
+    """
+    sender: str                 # Account paying the amount
+    receiver: str               # Account receiving the amount
+    amount: int                 # Number of units
+    nonce: Optional[int] = None # Sequence number of the sender's transfer (None = missing)
+
+
+def parse_transaction(transaction: str) -> Optional[Transfer]:
+    """
+    Parse a signed transaction string into a transfer.
+    
+    Plain (unsigned) transactions authorise nothing, so they never move funds;
+    the sender of a signed one is checked against its key by SignatureVerifier.
+    
+    Args:
+        transaction: Transaction string
+    
+    Returns:
+        Transfer, or None if the string is not a signed transfer
+    """
+    signed = SignedTransaction.decode(transaction)
+    if signed is None:
+        return None
+    
+    match = TRANSFER_PATTERN.search(signed.payload)
+    if match is None:
+        return None
+    
+    sender, receiver, amount, nonce = match.groups()
+    return Transfer(sender=sender, receiver=receiver, amount=int(amount),
+                    nonce=int(nonce) if nonce is not None else None)
+
+
+# ================================================================================
+# ACCOUNT STATE
+# ================================================================================
+
+class AccountState:
+    """
+    Account balances with incremental apply/undo per block.
+    
+    The journal holds one record per applied block with the previous
+    balances and nonces of the accounts it changed, so undoing a block
+    (e.g. on a fork switch) restores only those accounts.
+    """
+    
+    def __init__(self, default_balance: int = 0, journal_path: Optional[str] = None,
+                 max_undo_depth: int = 100, sync_journal: bool = True):
+        """
+        Initialize account state.
+        
+        Args:
+            default_balance: Balance of an account that has not been seen before
+            journal_path: File for the write-ahead journal (None = memory only)
+            max_undo_depth: Number of most recent blocks that can be undone
+            sync_journal: Fsync every journal record; False when another log (e.g. the
+                broker's BlockWAL) makes the blocks durable and is replayed on recovery
+        """
+        self.default_balance = default_balance
+        self.journal_path = journal_path
+        self.max_undo_depth = max_undo_depth
+        self.sync_journal = sync_journal
+        self.journal_file = None    # Kept open between records
+        
+        self.balances: Dict[str, int] = {}
+        self.nonces: Dict[str, int] = {}  # {account: next expected nonce}
+        self.height = 0  # Number of the next block to apply
+        self.undo_log: Deque[Tuple[int, Dict[str, Optional[int]], Dict[str, Optional[int]]]] = \
+            deque(maxlen=max_undo_depth)  # [(block_number, previous balances, previous nonces)]
+    
+    def get_balance(self, account: str) -> int:
+        """Return balance of an account."""
+        return self.balances.get(account, self.default_balance)
+    
+    def get_nonce(self, account: str) -> int:
+        """Return the nonce the next transfer from an account must carry."""
+        return self.nonces.get(account, 0)
+    
+    def compute_changes(self, transactions: List[str]) -> Tuple[Optional[Tuple[Dict[str, int], Dict[str, int]]],
+                                                                 Optional[str]]:
+        """
+        Compute new balances and nonces of all accounts touched by the transactions.
+        
+        Transactions are applied in order on an overlay of changed accounts,
+        so the cost depends only on the transactions themselves. Every
+        transfer must carry its sender's next nonce, which rejects a
+        transaction repeated within the block or already included earlier.
+        
+        Args:
+            transactions: Transactions of one block
+        
+        Returns:
+            Tuple of (({account: new balance}, {account: new nonce}), None) or (None, rejection reason)
+        """
+        changes: Dict[str, int] = {}
+        nonces: Dict[str, int] = {}
+        
+        for tx in transactions:
+            transfer = parse_transaction(tx)
+            if transfer is None:
+                continue
+            reason = self._transfer(changes, nonces, transfer)
+            if reason is not None:
+                return None, reason
+        
+        return (changes, nonces), None
+    
+    def _transfer(self, changes: Dict[str, int], nonces: Dict[str, int], transfer: Transfer) -> Optional[str]:
+        """Apply a transfer to the overlays of changed balances and nonces; return the reason if it is invalid."""
+        expected = nonces.get(transfer.sender, self.get_nonce(transfer.sender))
+        if transfer.nonce != expected:
+            return f"Bad nonce: {transfer.sender} expects {expected}, got {transfer.nonce}"
+        
+        sender_balance = changes.get(transfer.sender, self.get_balance(transfer.sender))
+        if transfer.amount > sender_balance:
+            return f"Insufficient funds: {transfer.sender} has {sender_balance}, needs {transfer.amount}"
+        
+        nonces[transfer.sender] = expected + 1
+        changes[transfer.sender] = sender_balance - transfer.amount
+        changes[transfer.receiver] = changes.get(transfer.receiver, self.get_balance(transfer.receiver)) + transfer.amount
+        return None
+    
+    def validate_block(self, transactions: List[str]) -> Tuple[bool, Optional[str]]:
+        """
+        Check that a block spends only available funds with the senders' next nonces.
+        
+        Args:
+            transactions: Transactions of the block
+        
+        Returns:
+            Tuple of (is_valid, rejection reason)
+        """
+        changes, reason = self.compute_changes(transactions)
+        return changes is not None, reason
+    
+    def filter_spendable(self, transactions: List[str]) -> Tuple[List[str], List[str]]:
+        """
+        Split transactions into a spendable sequence and double-spends.
+        
+        A transfer is rejected when it overspends or does not carry its
+        sender's next nonce (a replay, or a gap after a rejected transfer).
+        
+        Args:
+            transactions: Candidate transactions in priority order
+        
+        Returns:
+            Tuple of (spendable transactions, rejected transactions)
+        """
+        changes: Dict[str, int] = {}
+        nonces: Dict[str, int] = {}
+        spendable = []
+        rejected = []
+        
+        for tx in transactions:
+            transfer = parse_transaction(tx)
+            if transfer is not None and self._transfer(changes, nonces, transfer) is not None:
+                rejected.append(tx)
+            else:
+                spendable.append(tx)
+        
+        return spendable, rejected
+    
+    def apply_block(self, block_number: int, transactions: List[str]) -> bool:
+        """
+        Apply a block's transactions to the balance table.
+        
+        Args:
+            block_number: Number of the block
+            transactions: Transactions of the block
+        
+        Returns:
+            True if the block was applied, False if it overspends an account or reuses a nonce
+        """
+        result, _ = self.compute_changes(transactions)
+        if result is None:
+            return False
+        
+        changes, nonces = result
+        previous = {account: self.balances.get(account) for account in changes}
+        previous_nonces = {account: self.nonces.get(account) for account in nonces}
+        
+        # Write-ahead: the journal record is persisted before the table changes
+        self._write_journal({'op': 'apply', 'block': block_number, 'undo': previous, 'new': changes,
+                             'undo_nonces': previous_nonces, 'nonces': nonces})
+        
+        self.balances.update(changes)
+        self.nonces.update(nonces)
+        self.height = block_number + 1
+        
+        self.undo_log.append((block_number, previous, previous_nonces))
+        
+        return True
+    
+    def undo_block(self) -> int:
+        """
+        Undo the most recently applied block.
+        
+        Returns:
+            Number of the undone block
+        """
+        if not self.undo_log:
+            raise ValueError("No block to undo")
+        
+        block_number, previous, previous_nonces = self.undo_log.pop()
+        self._write_journal({'op': 'undo', 'block': block_number})
+        
+        self._restore(previous, previous_nonces)
+        self.height = block_number
+        return block_number
+    
+    def _restore(self, previous: Dict[str, Optional[int]], previous_nonces: Dict[str, Optional[int]]):
+        """Put back balances and nonces saved by an undo record (None = account not present)."""
+        for table, saved in ((self.balances, previous), (self.nonces, previous_nonces)):
+            for account, value in saved.items():
+                if value is None:
+                    table.pop(account, None)
+                else:
+                    table[account] = value
+    
+    def _write_journal(self, record: Dict):
+        """Append a record to the journal file and flush it (to disk if sync_journal is set)."""
+        if self.journal_path is None:
+            return
+        
+        if self.journal_file is None:
+            self.journal_file = open(self.journal_path, 'a', encoding='utf-8')
+        self.journal_file.write(json.dumps(record) + '\n')
+        self.journal_file.flush()
+        if self.sync_journal:
+            os.fsync(self.journal_file.fileno())
+    
+    def snapshot(self, path: str):
+        """
+        Write balances and nonces to disk and truncate the journal.
+        
+        Args:
+            path: Snapshot file path
+        """
+        data = self.begin_snapshot()
+        if data is not None:
+            self.write_snapshot(path, data)
+    
+    def begin_snapshot(self) -> Optional[Dict]:
+        """
+        Capture the balances and nonces for a snapshot and start a new journal.
+        
+        The journal written so far is kept (as <journal>.prev) until
+        write_snapshot makes the captured state durable, so the snapshot
+        can be written later, e.g. once the block is committed to a WAL,
+        while new blocks are journaled meanwhile.
+        
+        Returns:
+            Snapshot data for write_snapshot, or None while the previous snapshot is still pending
+        """
+        if self.journal_path is not None:
+            previous_path = self.journal_path + '.prev'
+            if os.path.exists(previous_path):
+                return None
+            self.close()
+            if os.path.exists(self.journal_path):
+                os.replace(self.journal_path, previous_path)
+        return {'height': self.height, 'balances': dict(self.balances), 'nonces': dict(self.nonces)}
+    
+    def write_snapshot(self, path: str, data: Dict):
+        """
+        Write snapshot data from begin_snapshot and drop the journal it covers.
+        
+        Args:
+            path: Snapshot file path
+            data: Result of begin_snapshot
+        """
+        # Write to a temporary file and rename, so a crash never leaves a partial snapshot
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        
+        if self.journal_path is not None and os.path.exists(self.journal_path + '.prev'):
+            os.remove(self.journal_path + '.prev')
+    
+    def close(self):
+        """Close the journal file (reopened by the next record)."""
+        if self.journal_file is not None:
+            self.journal_file.close()
+            self.journal_file = None
+    
+    @classmethod
+    def load(cls, snapshot_path: Optional[str], journal_path: Optional[str] = None,
+             default_balance: int = 0, max_undo_depth: int = 100,
+             sync_journal: bool = True) -> 'AccountState':
+        """
+        Restore state from a snapshot and replay the journal written after it.
+        
+        A torn record at the end of the journal is cut off, so new records
+        start on a fresh line. The journal of a snapshot that was begun but
+        not written (<journal>.prev) is replayed first.
+        
+        Args:
+            snapshot_path: Snapshot file path (None or missing file = empty state)
+            journal_path: Journal file path
+            default_balance: Balance of an account that has not been seen before
+            max_undo_depth: Number of most recent blocks that can be undone
+            sync_journal: Fsync every journal record (see __init__)
+        
+        Returns:
+            Restored AccountState
+        """
+        state = cls(default_balance=default_balance, journal_path=None, max_undo_depth=max_undo_depth,
+                    sync_journal=sync_journal)
+        
+        if snapshot_path is not None and os.path.exists(snapshot_path):
+            with open(snapshot_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            state.balances = data['balances']
+            state.nonces = data.get('nonces', {})
+            state.height = data['height']
+        
+        if journal_path is not None:
+            previous_path = journal_path + '.prev'
+            for path in (previous_path, journal_path):
+                if os.path.exists(path):
+                    state._replay_journal(path)
+            
+            # An interrupted snapshot left two journals: join them, so the next snapshot can rotate again
+            if os.path.exists(previous_path):
+                tmp_path = journal_path + '.tmp'
+                with open(tmp_path, 'wb') as out:
+                    for path in (previous_path, journal_path):
+                        if os.path.exists(path):
+                            with open(path, 'rb') as f:
+                                out.write(f.read())
+                    out.flush()
+                    os.fsync(out.fileno())
+                os.replace(tmp_path, journal_path)
+                os.remove(previous_path)
+        
+        state.journal_path = journal_path
+        return state
+    
+    def _replay_journal(self, path: str):
+        """Apply the records of a journal file, cutting off a torn record at its end."""
+        valid_size = 0  # End of the last complete record
+        with open(path, 'rb') as f:
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break  # Torn write at the end of the journal
+                if not line.strip():
+                    valid_size += len(line)
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                valid_size += len(line)
+                
+                if record['op'] == 'apply':
+                    # Records already covered by the snapshot are skipped
+                    if record['block'] < self.height:
+                        continue
+                    self.balances.update(record['new'])
+                    self.nonces.update(record.get('nonces', {}))
+                    self.height = record['block'] + 1
+                    self.undo_log.append((record['block'], record['undo'], record.get('undo_nonces', {})))
+                elif record['op'] == 'undo' and self.undo_log and self.undo_log[-1][0] == record['block']:
+                    block_number, previous, previous_nonces = self.undo_log.pop()
+                    self._restore(previous, previous_nonces)
+                    self.height = block_number
+        
+        with open(path, 'r+b') as f:
+            f.truncate(valid_size)
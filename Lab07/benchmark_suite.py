@@ -0,0 +1,330 @@
+"""
+Lab 07 - Micro-benchmark Suite
+Kryptologia - Patryk Rakowski 2025
+
+Repeatable timings of the mining and Merkle hot paths: block header hash,
+difficulty check, Merkle tree build (1 to 1M leaves), block verification
+and message encode/decode. Every case is warmed up, then timed in several
+samples (each sample loops enough calls to last a few milliseconds) and
+reported as percentiles of the per-call time.
+
+Runs are appended to a JSON history file; compare mode runs the suite and
+fails (exit code 1) if any case got clearly slower by more than a threshold
+than its median over the last passing runs. Failing runs are recorded with
+their regressions and never serve as a baseline, so slowdowns cannot ratchet in.
+"""
+
+import json
+import os
+import pickle
+import platform
+import statistics
+import sys
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from blockchain_mining import Block, BlockMiner, MerkleTree
+from transport import SUBMISSION_HEADER, encode_message, encode_submission
+
+
+DEFAULT_HISTORY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_history.json')
+MERKLE_LEAF_COUNTS = (1, 10, 100, 1000, 10000, 100000, 1000000)
+BASELINE_RUNS = 5   # Passing runs whose per-case median forms the baseline
+
+
+# ================================================================================
+# MEASUREMENT
+# ================================================================================
+
+def _percentile(ordered: List[float], q: float) -> float:
+    """Return q-th percentile (0-100) of sorted values."""
+    return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+
+
+def measure(function: Callable[[], object], warmup: int = 3, repetitions: int = 15,
+            min_sample_time: float = 0.02, max_total_time: float = 10.0) -> Dict[str, float]:
+    """
+    Time a function.
+    
+    Args:
+        function: Function without arguments (one benchmarked operation)
+        warmup: Samples run and discarded first (caches, allocator, lazy imports)
+        repetitions: Timed samples (fewer if max_total_time is reached, at least 3)
+        min_sample_time: Calls per sample are doubled until a sample lasts this long
+        max_total_time: Time budget for the timed samples of one case
+    
+    Returns:
+        Per-call statistics in seconds: min, p50, p90, p99, mean, stdev; plus samples and calls per sample
+    """
+    # Calibrate calls per sample so timer resolution does not matter
+    number = 1
+    while True:
+        start_time = time.perf_counter()
+        for _ in range(number):
+            function()
+        elapsed = time.perf_counter() - start_time
+        if elapsed >= min_sample_time:
+            break
+        number *= 2
+    
+    def sample() -> float:
+        start_time = time.perf_counter()
+        for _ in range(number):
+            function()
+        return (time.perf_counter() - start_time) / number
+    
+    for _ in range(warmup):
+        sample()
+    
+    samples = []
+    budget_end = time.perf_counter() + max_total_time
+    while len(samples) < repetitions and (len(samples) < 3 or time.perf_counter() < budget_end):
+        samples.append(sample())
+    
+    ordered = sorted(samples)
+    return {
+        'min': ordered[0],
+        'p50': _percentile(ordered, 50),
+        'p90': _percentile(ordered, 90),
+        'p99': _percentile(ordered, 99),
+        'mean': statistics.fmean(ordered),
+        'stdev': statistics.stdev(ordered) if len(ordered) > 1 else 0.0,
+        'samples': len(ordered),
+        'calls_per_sample': number,
+    }
+
+
+# ================================================================================
+# BENCHMARK CASES
+# ================================================================================
+
+def build_cases(max_leaves: int = 1000000) -> Dict[str, Callable[[], object]]:
+    """
+    Create benchmark cases.
+    
+    Args:
+        max_leaves: Largest Merkle tree measured
+    
+    Returns:
+        Dictionary {case name: function}
+    """
+    miner = BlockMiner(difficulty=8)
+    merkle_root = MerkleTree.compute_hash("benchmark")
+    previous_hash = b'\x00' * 32
+    timestamp = int(time.time())
+    block_hash = miner.compute_block_hash(merkle_root, previous_hash, timestamp, 1, 0)
+    
+    # A valid block for verify_block
+    nonce = 0
+    while not miner.hash_has_leading_zero_bits(block_hash, miner.difficulty):
+        nonce += 1
+        block_hash = miner.compute_block_hash(merkle_root, previous_hash, timestamp, 1, nonce)
+    block = Block(merkle_root, previous_hash, timestamp, 1, nonce, block_hash)
+    
+    transactions = [f"TX_{i:016d}: SENDER{i % 10} -> RECEIVER{i % 7} [{i % 1000 + 1} units]"
+                    for i in range(max_leaves)]
+    task_message = {'type': 'NEW_TASK', 'transactions': transactions[:100], 'previous_hash': previous_hash,
+                    'block_number': 1, 'difficulty': 20, 'hash_algorithm': 'sha256', 'epoch': 1}
+    mined_message = {'type': 'BLOCK_MINED', 'block': block, 'transactions': transactions[:100],
+                     'attempts': 1000, 'elapsed': 0.1}
+    encoded_task = encode_message(task_message)
+    encoded_mined = encode_submission(mined_message, epoch=1)
+    
+    cases = {
+        'compute_block_hash': lambda: miner.compute_block_hash(merkle_root, previous_hash, timestamp, 1, 12345),
+        'difficulty_check_20': lambda: miner.hash_has_leading_zero_bits(block_hash, 20),
+        'verify_block': lambda: miner.verify_block(block),
+    }
+    for count in MERKLE_LEAF_COUNTS:
+        if count > max_leaves:
+            break
+        leaves = transactions[:count]
+        cases[f'build_merkle_tree_{count}'] = lambda leaves=leaves: MerkleTree.build_merkle_tree(leaves)
+    cases.update({
+        'encode_new_task_100tx': lambda: encode_message(task_message),
+        'decode_new_task_100tx': lambda: pickle.loads(memoryview(encoded_task)[4:]),
+        'encode_block_mined_100tx': lambda: encode_submission(mined_message, epoch=1),
+        'decode_block_mined_100tx': lambda: pickle.loads(memoryview(encoded_mined)[4 + SUBMISSION_HEADER.size:]),
+    })
+    return cases
+
+
+def run_suite(max_leaves: int = 1000000, repetitions: int = 15) -> Dict[str, Dict[str, float]]:
+    """
+    Run all benchmark cases and print a table.
+    
+    Args:
+        max_leaves: Largest Merkle tree measured
+        repetitions: Timed samples per case
+    
+    Returns:
+        Dictionary {case name: statistics}
+    """
+    print(f"\n{'='*80}")
+    print("LAB 07 MICRO-BENCHMARK SUITE")
+    print(f"{'='*80}")
+    print(f"\n{'Case':<30} {'p50 (us)':>12} {'p90 (us)':>12} {'p99 (us)':>12} {'stdev %':>8}")
+    print(f"{'-'*78}")
+    
+    results = {}
+    for name, function in build_cases(max_leaves).items():
+        stats = measure(function, repetitions=repetitions)
+        results[name] = stats
+        print(f"{name:<30} {stats['p50'] * 1e6:>12.3f} {stats['p90'] * 1e6:>12.3f} {stats['p99'] * 1e6:>12.3f} "
+              f"{100 * stats['stdev'] / stats['mean']:>7.1f}%")
+    print(f"{'='*80}")
+    
+    return results
+
+
+# ================================================================================
+# HISTORY AND REGRESSION CHECK
+# ================================================================================
+
+def load_history(path: str) -> List[Dict]:
+    """Return recorded runs (oldest first)."""
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_run(path: str, results: Dict[str, Dict[str, float]],
+             regressions: Optional[List[str]] = None) -> Dict:
+    """
+    Append a run to the history file.
+    
+    Args:
+        path: History file path
+        results: Output of run_suite
+        regressions: Cases that failed the comparison (the run is then skipped as a baseline)
+    
+    Returns:
+        Recorded run
+    """
+    run = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'machine': f"{platform.system()} {platform.machine()}",
+        'results': results,
+    }
+    if regressions:
+        run['regressions'] = regressions
+    history = load_history(path)
+    history.append(run)
+    
+    # Write to a temporary file and rename, so a crash never leaves a partial history
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(history, f, indent=1)
+    os.replace(tmp_path, path)
+    return run
+
+
+def build_baseline(history: List[Dict], runs: int = BASELINE_RUNS) -> Dict[str, Dict[str, float]]:
+    """
+    Build per-case baseline statistics from the last passing runs.
+    
+    For every case the run with the median p50 among the last `runs`
+    passing runs is used, so a single fast or slow run does not move it.
+    
+    Args:
+        history: Recorded runs (oldest first)
+        runs: Number of passing runs to take into account
+    
+    Returns:
+        Dictionary {case: statistics}, empty if there is no passing run
+    """
+    passing = [run for run in history if not run.get('regressions')][-runs:]
+    
+    samples: Dict[str, List[Dict[str, float]]] = {}
+    for run in passing:
+        for name, stats in run['results'].items():
+            samples.setdefault(name, []).append(stats)
+    
+    baseline = {}
+    for name, case_stats in samples.items():
+        case_stats.sort(key=lambda stats: stats['p50'])
+        baseline[name] = case_stats[(len(case_stats) - 1) // 2]
+    return baseline
+
+
+def compare_runs(baseline: Dict[str, Dict[str, float]], current: Dict[str, Dict[str, float]],
+                 threshold: float) -> List[str]:
+    """
+    Compare median times of two runs. A case regresses if its median is slower
+    by more than threshold and even its fastest sample is slower than the
+    baseline's p90 (so overlapping, noisy distributions do not fail the gate).
+    
+    Args:
+        baseline: Reference statistics (see build_baseline)
+        current: Results of the new run
+        threshold: Allowed slowdown in percent
+    
+    Returns:
+        Names of cases slower than baseline by more than threshold
+    """
+    print(f"\n{'Case':<30} {'Baseline (us)':>14} {'Current (us)':>14} {'Change':>9}")
+    print(f"{'-'*70}")
+    
+    regressions = []
+    for name, stats in current.items():
+        if name not in baseline:
+            continue
+        before = baseline[name]['p50']
+        change = 100 * (stats['p50'] - before) / before
+        marker = ''
+        if change > threshold and stats['min'] > baseline[name]['p90']:
+            regressions.append(name)
+            marker = '  REGRESSION'
+        print(f"{name:<30} {before * 1e6:>14.3f} {stats['p50'] * 1e6:>14.3f} {change:>+8.1f}%{marker}")
+    print(f"{'='*80}")
+    
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Command line entry point.
+    
+    Returns:
+        Exit code (1 if compare mode found a regression)
+    """
+    # Usage: python benchmark_suite.py [run|compare] [threshold_percent] [history_path] [max_leaves]
+    argv = sys.argv[1:] if argv is None else argv
+    mode = argv[0] if len(argv) > 0 else 'run'
+    threshold = float(argv[1]) if len(argv) > 1 else 10.0
+    history_path = argv[2] if len(argv) > 2 else DEFAULT_HISTORY_PATH
+    max_leaves = int(argv[3]) if len(argv) > 3 else 1000000
+    
+    if mode not in ('run', 'compare'):
+        print(f"Unknown mode '{mode}' (use run or compare)")
+        return 2
+    
+    history = load_history(history_path)
+    results = run_suite(max_leaves)
+    
+    regressions = []
+    if mode == 'compare':
+        baseline = build_baseline(history)
+        if not baseline:
+            print("No previous passing run to compare with")
+        else:
+            print(f"\nComparing with median of the last {BASELINE_RUNS} passing runs (threshold: {threshold:.1f}%)")
+            regressions = compare_runs(baseline, results, threshold)
+    
+    # A failing run is kept for inspection, but marked so it never becomes the baseline
+    save_run(history_path, results, regressions)
+    print(f"Run saved to {history_path} ({len(history) + 1} runs)")
+    
+    if regressions:
+        print(f"FAILED: {len(regressions)} case(s) regressed: {', '.join(regressions)}")
+        return 1
+    if mode == 'compare':
+        print("OK: no regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,216 @@
+"""
+Lab 07 - Block Templates
+Kryptologia - Patryk Rakowski 2025
+
+Mining template of one block: transactions, Merkle root and the constant
+part of the header (merkle_root | previous_hash | timestamp | block_number),
+so only the 8-byte nonce changes per hash. For SHA-256 backends the prefix
+is absorbed once into a hashlib object (midstate) that is copied per nonce.
+
+Miners build the template of the next block speculatively when a block is
+accepted: the Merkle root of the next transactions (cached mempool sent with
+NEW_TASK) is computed in advance, so after BLOCK_ACCEPTED only the header
+prefix depends on the new block and hashing resumes at once. The broker's
+NEW_TASK replaces the template only if its transactions differ.
+"""
+
+import hashlib
+import sys
+import time
+from typing import Callable, Dict, List, Optional
+
+from blockchain_mining import Block, BlockMiner, MerkleTree, get_hash_backend
+
+
+class BlockTemplate:
+    """
+    Header template of a block being mined.
+    """
+    
+    def __init__(self, transactions: List[str], previous_hash: bytes, block_number: int, difficulty: int,
+                 hash_algorithm: str = 'sha256', epoch: int = 0, merkle_root: Optional[bytes] = None,
+                 timestamp: Optional[int] = None, speculative: bool = False):
+        """
+        Build the template.
+        
+        Args:
+            transactions: Transactions of the block
+            previous_hash: Hash of the chain tip
+            block_number: Number of the block
+            difficulty: Required leading zero bits
+            hash_algorithm: Hash backend name (default SHA256)
+            epoch: Task epoch sent in the BLOCK_MINED header
+            merkle_root: Precomputed Merkle root of transactions (computed if None)
+            timestamp: Header timestamp (now if None)
+            speculative: Built by the miner before the broker's NEW_TASK
+        """
+        self.transactions = transactions
+        self.previous_hash = previous_hash
+        self.block_number = block_number
+        self.difficulty = difficulty
+        self.hash_algorithm = hash_algorithm
+        self.epoch = epoch
+        self.speculative = speculative
+        self.merkle_root = merkle_root if merkle_root is not None else \
+            MerkleTree.build_merkle_tree(transactions, hash_algorithm)
+        self.timestamp = timestamp if timestamp is not None else int(time.time())
+        self.prefix = (self.merkle_root + previous_hash + self.timestamp.to_bytes(8, byteorder='big') +
+                       block_number.to_bytes(8, byteorder='big'))
+    
+    @classmethod
+    def from_task(cls, task: Dict) -> 'BlockTemplate':
+        """Build the template of a NEW_TASK message."""
+        return cls(task['transactions'], task['previous_hash'], task['block_number'], task['difficulty'],
+                   task.get('hash_algorithm', 'sha256'), task.get('epoch', 0))
+    
+    @classmethod
+    def speculate(cls, template: 'BlockTemplate', block: Block, transactions: List[str],
+                  merkle_root: Optional[bytes] = None) -> 'BlockTemplate':
+        """
+        Build the likely next template after a block was accepted on top of a template.
+        
+        Args:
+            template: Template the accepted block extends (same block number and tip)
+            block: Accepted block
+            transactions: Expected transactions of the next block
+            merkle_root: Their precomputed Merkle root
+        
+        Returns:
+            Speculative template with the broker's next epoch
+        """
+        return cls(transactions, block.block_hash, block.block_number + 1, template.difficulty,
+                   template.hash_algorithm, (template.epoch + 1) & 0xFFFFFFFF, merkle_root, speculative=True)
+    
+    def extended_by(self, block: Block) -> bool:
+        """Check that a block is a solution of this template's height and tip (mined by anyone)."""
+        return block.block_number == self.block_number and block.previous_hash == self.previous_hash
+    
+    def matches(self, task: Dict) -> bool:
+        """Check whether a NEW_TASK asks for the same block (no Merkle root is recomputed)."""
+        return (task['block_number'] == self.block_number and task['previous_hash'] == self.previous_hash
+                and task['difficulty'] == self.difficulty
+                and task.get('hash_algorithm', 'sha256') == self.hash_algorithm
+                and task['transactions'] == self.transactions)
+    
+    def nonce_hasher(self) -> Callable[[bytes], bytes]:
+        """
+        Return a function hashing the header with a given 8-byte nonce.
+        
+        SHA-256 and double SHA-256 continue from the midstate of the prefix,
+        other backends hash prefix + nonce.
+        """
+        if self.hash_algorithm == 'sha256':
+            midstate = hashlib.sha256(self.prefix)
+            
+            def hash_nonce(nonce_bytes: bytes) -> bytes:
+                state = midstate.copy()
+                state.update(nonce_bytes)
+                return state.digest()
+        elif self.hash_algorithm == 'sha256d':
+            midstate = hashlib.sha256(self.prefix)
+            sha256 = hashlib.sha256
+            
+            def hash_nonce(nonce_bytes: bytes) -> bytes:
+                state = midstate.copy()
+                state.update(nonce_bytes)
+                return sha256(state.digest()).digest()
+        else:
+            hash_function = get_hash_backend(self.hash_algorithm)
+            prefix = self.prefix
+            
+            def hash_nonce(nonce_bytes: bytes) -> bytes:
+                return hash_function(prefix + nonce_bytes)
+        return hash_nonce
+    
+    def build_block(self, nonce: int, block_hash: bytes) -> Block:
+        """Create the block of a found nonce."""
+        return Block(merkle_root=self.merkle_root, previous_hash=self.previous_hash, timestamp=self.timestamp,
+                     block_number=self.block_number, nonce=nonce, block_hash=block_hash)
+
+
+# ================================================================================
+# BENCHMARK
+# ================================================================================
+
+def benchmark_template_switch(transaction_counts=(10, 100, 1000), num_hashes: int = 200000):
+    """
+    Compare the work between BLOCK_ACCEPTED and the first hash of the next block,
+    and the hash loop with and without a precomputed header prefix.
+    
+    Args:
+        transaction_counts: Transactions per block
+        num_hashes: Nonces hashed per hash loop measurement
+    
+    Returns:
+        Dictionary {transactions: (rebuild s, speculative s)} and hash rates
+    """
+    miner = BlockMiner(difficulty=20)
+    
+    print(f"\n{'='*80}")
+    print("SPECULATIVE BLOCK TEMPLATE BENCHMARK")
+    print(f"{'='*80}")
+    
+    # Hash loop: header concatenated per nonce (old miner loop) vs template midstate
+    template = BlockTemplate([f"TX_{i}" for i in range(100)], b'\x00' * 32, 1, 20)
+    merkle_root, previous_hash, timestamp = template.merkle_root, template.previous_hash, template.timestamp
+    hash_function = get_hash_backend('sha256')
+    start_time = time.perf_counter()
+    for nonce in range(num_hashes):
+        hash_function(merkle_root + previous_hash + timestamp.to_bytes(8, byteorder='big') +
+                      (1).to_bytes(8, byteorder='big') + nonce.to_bytes(8, byteorder='big'))
+    concat_rate = num_hashes / (time.perf_counter() - start_time)
+    
+    hash_nonce = template.nonce_hasher()
+    start_time = time.perf_counter()
+    for nonce in range(num_hashes):
+        hash_nonce(nonce.to_bytes(8, byteorder='big'))
+    midstate_rate = num_hashes / (time.perf_counter() - start_time)
+    assert hash_nonce((7).to_bytes(8, 'big')) == miner.compute_block_hash(merkle_root, previous_hash, timestamp, 1, 7)
+    
+    print(f"\nHash loop: header concatenation {concat_rate:,.0f} H/s, midstate {midstate_rate:,.0f} H/s "
+          f"({midstate_rate / concat_rate:.2f}x)")
+    
+    # Switch: rebuild from NEW_TASK vs speculative template with a precomputed Merkle root
+    results = {}
+    print(f"\n{'Transactions':>12} {'Rebuild from task (ms)':>23} {'Speculative (ms)':>17} {'Speedup':>9}")
+    print(f"{'-'*64}")
+    for count in transaction_counts:
+        transactions = [f"TX_{i:016d}: SENDER{i % 10} -> RECEIVER{i % 7} [{i % 1000 + 1} units]" for i in range(count)]
+        current = BlockTemplate(transactions, b'\x00' * 32, 1, 20)
+        block = current.build_block(0, b'\x11' * 32)
+        task = {'type': 'NEW_TASK', 'transactions': transactions, 'previous_hash': block.block_hash,
+                'block_number': 2, 'difficulty': 20, 'hash_algorithm': 'sha256', 'epoch': 2}
+        next_root = MerkleTree.build_merkle_tree(transactions)     # Prepared while the previous block was mined
+        
+        repetitions = max(10, 20000 // count)
+        start_time = time.perf_counter()
+        for _ in range(repetitions):
+            BlockTemplate.from_task(task).nonce_hasher()(b'\x00' * 8)
+        rebuild_time = (time.perf_counter() - start_time) / repetitions
+        
+        start_time = time.perf_counter()
+        for _ in range(repetitions):
+            speculative = BlockTemplate.speculate(current, block, transactions, next_root)
+            speculative.nonce_hasher()(b'\x00' * 8)
+            speculative.matches(task)
+        speculative_time = (time.perf_counter() - start_time) / repetitions
+        # Timestamps of the two templates may differ by a second, so the header fields are compared instead
+        rebuilt = BlockTemplate.from_task(task)
+        assert speculative.matches(task)
+        assert (speculative.merkle_root, speculative.previous_hash, speculative.block_number) == \
+            (rebuilt.merkle_root, rebuilt.previous_hash, rebuilt.block_number)
+        
+        results[count] = (rebuild_time, speculative_time)
+        print(f"{count:>12} {rebuild_time * 1000:>23.3f} {speculative_time * 1000:>17.3f} "
+              f"{rebuild_time / speculative_time:>8.1f}x")
+    print("(the old miner also slept 100 ms before starting a new task)")
+    print(f"{'='*80}")
+    
+    results['hash_rates'] = (concat_rate, midstate_rate)
+    return results
+
+
+if __name__ == "__main__":
+    # Usage: python block_template.py [num_hashes]
+    num_hashes = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    benchmark_template_switch(num_hashes=num_hashes)
@@ -0,0 +1,275 @@
+"""
+Lab 07 - Block Write-Ahead Log
+Kryptologia - Patryk Rakowski 2025
+
+Append-only log of accepted blocks with group commit. Records are written
+to the file as they arrive, but fsync runs once per batch: when N records
+are waiting or the oldest one has waited for the batch window. Callers are
+acknowledged (callback or wait) only after the fsync covering their record,
+so one disk flush makes a whole batch durable. A failed fsync stops the
+log: its records are never acknowledged and further appends raise.
+
+Record: length (4 B) | CRC-32 (4 B) | pickled payload
+"""
+
+import logging
+import os
+import pickle
+import statistics
+import struct
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+
+HEADER_FORMAT = '>II'
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+
+logger = logging.getLogger('block_wal')
+
+
+class BlockWAL:
+    """
+    Write-ahead log with a background group-commit thread.
+    """
+    
+    def __init__(self, path: str, max_batch_records: int = 64, max_batch_delay: float = 0.005):
+        """
+        Open (or create) a log file; a torn record at its end is cut off.
+        
+        Args:
+            path: Log file path
+            max_batch_records: Number of waiting records that triggers an fsync
+            max_batch_delay: Longest time (s) a record waits for more records (0 = fsync every record)
+        """
+        self.path = path
+        self.max_batch_records = max_batch_records
+        self.max_batch_delay = max_batch_delay
+        
+        valid_size = sum(HEADER_SIZE + length for length, _ in self._scan(path))
+        self.file = open(path, 'ab')
+        self.file.truncate(valid_size)
+        
+        self.condition = threading.Condition()
+        self.pending: List[Tuple[int, Optional[Callable[[], None]]]] = []  # [(sequence, callback)]
+        self.batch_started = None   # Monotonic time the oldest pending record was written
+        self.next_sequence = 0
+        self.committed_sequence = -1
+        self.running = True
+        self.error: Optional[OSError] = None   # Set when an fsync failed; nothing is committed after it
+        
+        # Statistics
+        self.commit_count = 0       # Number of fsyncs
+        self.record_count = 0
+        
+        self.thread = threading.Thread(target=self._commit_loop, daemon=True)
+        self.thread.start()
+    
+    @staticmethod
+    def _scan(path: str) -> Iterator[Tuple[int, bytes]]:
+        """Yield (length, payload) of every complete record, stopping at a torn or corrupt one."""
+        if not os.path.exists(path):
+            return
+        with open(path, 'rb') as f:
+            data = f.read()
+        offset = 0
+        while offset + HEADER_SIZE <= len(data):
+            length, checksum = struct.unpack_from(HEADER_FORMAT, data, offset)
+            payload = data[offset + HEADER_SIZE:offset + HEADER_SIZE + length]
+            if len(payload) < length or zlib.crc32(payload) != checksum:
+                break
+            yield length, payload
+            offset += HEADER_SIZE + length
+    
+    @classmethod
+    def replay(cls, path: str) -> Iterator[Dict]:
+        """
+        Read committed records in order.
+        
+        Args:
+            path: Log file path
+        
+        Returns:
+            Iterator of record dictionaries
+        """
+        for _, payload in cls._scan(path):
+            yield pickle.loads(payload)
+    
+    def append(self, record: Dict, callback: Optional[Callable[[], None]] = None) -> int:
+        """
+        Write a record; it becomes durable with the next group commit.
+        
+        Args:
+            record: Picklable record
+            callback: Called on the commit thread after the record is on disk
+        
+        Returns:
+            Sequence number of the record (see wait)
+        
+        Raises:
+            OSError: If an earlier commit failed
+        """
+        payload = pickle.dumps(record, protocol=pickle.HIGHEST_PROTOCOL)
+        with self.condition:
+            if self.error is not None:
+                raise OSError(f"Block WAL is unusable after a failed commit: {self.error}") from self.error
+            self.file.write(struct.pack(HEADER_FORMAT, len(payload), zlib.crc32(payload)) + payload)
+            sequence = self.next_sequence
+            self.next_sequence += 1
+            self.pending.append((sequence, callback))
+            if self.batch_started is None:
+                self.batch_started = time.monotonic()
+            self.condition.notify_all()
+        return sequence
+    
+    def wait(self, sequence: int, timeout: Optional[float] = None) -> bool:
+        """Block until a record is committed. Returns False on timeout or a failed commit."""
+        with self.condition:
+            self.condition.wait_for(lambda: self.committed_sequence >= sequence or self.error is not None, timeout)
+            return self.committed_sequence >= sequence
+    
+    def _batch_ready(self) -> bool:
+        """Check whether the pending records should be committed now."""
+        if not self.pending:
+            return False
+        if len(self.pending) >= self.max_batch_records or not self.running:
+            return True
+        return time.monotonic() - self.batch_started >= self.max_batch_delay
+    
+    def _commit_loop(self):
+        """Fsync batches of pending records and acknowledge them."""
+        while True:
+            with self.condition:
+                while not self._batch_ready():
+                    if not self.running:
+                        return
+                    timeout = None
+                    if self.pending:
+                        timeout = max(0.0, self.batch_started + self.max_batch_delay - time.monotonic())
+                    self.condition.wait(timeout)
+                
+                batch = self.pending[:self.max_batch_records]
+                self.pending = self.pending[self.max_batch_records:]
+                self.batch_started = time.monotonic() if self.pending else None
+                try:
+                    self.file.flush()
+                    fd = self.file.fileno()
+                except OSError as e:
+                    self._fail(e)
+                    return
+            
+            # Records appended during the fsync go into the next batch
+            try:
+                os.fsync(fd)
+            except OSError as e:
+                # After a failed fsync the page cache may have dropped the data: the batch
+                # (and anything after it) is never acknowledged
+                self._fail(e)
+                return
+            
+            with self.condition:
+                self.committed_sequence = batch[-1][0]
+                self.commit_count += 1
+                self.record_count += len(batch)
+                self.condition.notify_all()
+            
+            for _, callback in batch:
+                if callback is not None:
+                    try:
+                        callback()
+                    except Exception:
+                        logger.exception("Block WAL commit callback failed")
+    
+    def _fail(self, error: OSError):
+        """Stop committing after a write or fsync error and wake up waiters."""
+        with self.condition:
+            logger.error("Block WAL commit failed, %d record(s) not durable: %s",
+                         self.next_sequence - self.committed_sequence - 1, error)
+            self.error = error
+            self.running = False
+            self.condition.notify_all()
+    
+    def close(self):
+        """Commit pending records and close the file."""
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        self.thread.join()
+        self.file.close()
+
+
+# ================================================================================
+# BENCHMARK
+# ================================================================================
+
+def benchmark_group_commit(windows=(0.0, 0.001, 0.005, 0.02), num_blocks: int = 2000,
+                           max_batch_records: int = 64, num_transactions: int = 10):
+    """
+    Measure durable blocks per second and commit latency at several batch windows.
+    
+    Blocks are appended back to back (as a broker accepting them would) and
+    counted once acknowledged; window 0 fsyncs every block.
+    
+    Args:
+        windows: Batch windows in seconds
+        num_blocks: Block records appended per window
+        max_batch_records: Records that trigger an fsync regardless of the window
+        num_transactions: Transactions stored in each record
+    
+    Returns:
+        Dictionary {window: (blocks/s, fsyncs, median commit latency s)}
+    """
+    from blockchain_mining import Block
+    
+    transactions = [f"TX_{i:016d}: SENDER{i % 10} -> RECEIVER{i % 7} [{i} units]" for i in range(num_transactions)]
+    
+    print(f"\n{'='*80}")
+    print("BLOCK WAL GROUP COMMIT BENCHMARK")
+    print(f"{'='*80}")
+    print(f"Blocks: {num_blocks:,}, batch limit: {max_batch_records} records, "
+          f"{num_transactions} transactions per block")
+    
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for window in windows:
+            path = os.path.join(directory, f'wal_{window}.log')
+            wal = BlockWAL(path, max_batch_records=1 if window == 0 else max_batch_records,
+                           max_batch_delay=window)
+            appended = [0.0] * num_blocks
+            latencies = []
+            
+            def acknowledged(index):
+                latencies.append(time.monotonic() - appended[index])
+            
+            start_time = time.perf_counter()
+            for number in range(num_blocks):
+                block = Block(merkle_root=os.urandom(32), previous_hash=os.urandom(32), timestamp=int(time.time()),
+                              block_number=number, nonce=number, block_hash=os.urandom(32))
+                appended[number] = time.monotonic()
+                wal.append({'block': block, 'transactions': transactions},
+                           callback=lambda index=number: acknowledged(index))
+            wal.wait(num_blocks - 1)
+            elapsed = time.perf_counter() - start_time
+            commits = wal.commit_count
+            wal.close()
+            
+            assert sum(1 for _ in BlockWAL.replay(path)) == num_blocks
+            results[window] = (num_blocks / elapsed, commits, statistics.median(latencies))
+    
+    print(f"\n{'Window (ms)':>12} {'Blocks/s':>12} {'fsyncs':>8} {'Blocks/fsync':>13} {'Commit p50 (ms)':>16}")
+    print(f"{'-'*65}")
+    for window, (rate, commits, latency) in results.items():
+        print(f"{window * 1000:>12.1f} {rate:>12,.0f} {commits:>8} {num_blocks / commits:>13.1f} {latency * 1000:>16.3f}")
+    print(f"{'='*80}")
+    
+    return results
+
+
+if __name__ == "__main__":
+    # Usage: python block_wal.py [num_blocks] [max_batch_records]
+    num_blocks = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    max_batch_records = int(sys.argv[2]) if len(sys.argv) > 2 else 64
+    benchmark_group_commit(num_blocks=num_blocks, max_batch_records=max_batch_records)
@@ -8,7 +8,71 @@ Implementation of blockchain block mining with Merkle tree and proof-of-work.
 import hashlib
 import time
 from dataclasses import dataclass
-from typing import List, Union
+from typing import Callable, Dict, List, Tuple, Union
+
+
+# ================================================================================
+# HASH BACKENDS
+# ================================================================================
+
+def _sha256(data: bytes) -> bytes:
+    """SHA-256 (default)."""
+    return hashlib.sha256(data).digest()
+
+
+def _double_sha256(data: bytes) -> bytes:
+    """SHA-256 applied twice, as in Bitcoin headers."""
+    return hashlib.sha256(hashlib.sha256(data).digest()).digest()
+
+
+def _sha3_256(data: bytes) -> bytes:
+    """SHA3-256 (Keccak)."""
+    return hashlib.sha3_256(data).digest()
+
+
+def _blake2b_256(data: bytes) -> bytes:
+    """BLAKE2b with a 32-byte digest size."""
+    return hashlib.blake2b(data, digest_size=32).digest()
+
+
+def _blake2s(data: bytes) -> bytes:
+    """BLAKE2s (32-byte digest)."""
+    return hashlib.blake2s(data).digest()
+
+
+# All backends produce 32-byte digests, so block and Merkle hashes keep their size
+HASH_BACKENDS: Dict[str, Callable[[bytes], bytes]] = {
+    'sha256': _sha256,
+    'sha256d': _double_sha256,
+    'sha3_256': _sha3_256,
+    'blake2b_256': _blake2b_256,
+    'blake2s': _blake2s,
+}
+
+
+def get_hash_backend(name: str) -> Callable[[bytes], bytes]:
+    """
+    Return hash function registered under a name.
+    
+    Args:
+        name: Backend name (key of HASH_BACKENDS)
+    
+    Returns:
+        Function mapping bytes to a 32-byte digest
+    """
+    try:
+        return HASH_BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown hash backend '{name}' (available: {', '.join(HASH_BACKENDS)})") from None
+
+
+@dataclass
+class ChainParameters:
+    """
+    Consensus parameters shared by the broker and all miners of a chain.
+    """
+    difficulty: int                     # Number of leading zero bits required
+    hash_algorithm: str = 'sha256'      # Backend for block header and Merkle hashes
 
 
 # ================================================================================
@@ -21,36 +85,40 @@ class MerkleTree:
     """
     
     @staticmethod
-    def compute_hash(data: Union[str, bytes]) -> bytes:
+    def compute_hash(data: Union[str, bytes], hash_algorithm: str = 'sha256') -> bytes:
         """
-        Compute SHA256 hash of data.
+        Compute hash of data.
         
         Args:
             data: String or bytes to hash
+            hash_algorithm: Hash backend name (default SHA256)
             
         Returns:
-            SHA256 hash as bytes
+            Hash as bytes
         """
         if isinstance(data, str):
             data = data.encode('utf-8')
-        return hashlib.sha256(data).digest()
+        return get_hash_backend(hash_algorithm)(data)
     
     @staticmethod
-    def build_merkle_tree(transactions: List[Union[str, bytes]]) -> bytes:
+    def build_merkle_tree(transactions: List[Union[str, bytes]], hash_algorithm: str = 'sha256') -> bytes:
         """
         Build Merkle tree from transaction hashes and return root hash.
         
         Args:
             transactions: List of transaction hashes (strings or bytes)
+            hash_algorithm: Hash backend name (default SHA256)
             
         Returns:
             Merkle root hash as bytes
         """
+        hash_function = get_hash_backend(hash_algorithm)
+        
         if not transactions:
-            return hashlib.sha256(b"").digest()
+            return hash_function(b"")
         
         # Convert all transactions to hashes if they aren't already
-        current_level = [MerkleTree.compute_hash(tx) for tx in transactions]
+        current_level = [MerkleTree.compute_hash(tx, hash_algorithm) for tx in transactions]
         
         # Build tree level by level
         while len(current_level) > 1:
@@ -68,12 +136,73 @@ class MerkleTree:
                 
                 # Hash the concatenation of left and right
                 combined = left + right
-                parent_hash = hashlib.sha256(combined).digest()
+                parent_hash = hash_function(combined)
                 next_level.append(parent_hash)
             
             current_level = next_level
         
         return current_level[0]
+    
+    @staticmethod
+    def get_merkle_path(transactions: List[Union[str, bytes]], leaf_index: int,
+                        hash_algorithm: str = 'sha256') -> List[Tuple[bytes, bool]]:
+        """
+        Compute authentication path from a leaf to the Merkle root.
+        
+        Args:
+            transactions: List of transactions of the block
+            leaf_index: Index of the transaction in the list
+            hash_algorithm: Hash backend name (default SHA256)
+        
+        Returns:
+            List of (sibling hash, sibling is on the right) pairs, leaf to root
+        """
+        hash_function = get_hash_backend(hash_algorithm)
+        current_level = [MerkleTree.compute_hash(tx, hash_algorithm) for tx in transactions]
+        index = leaf_index
+        path = []
+        
+        while len(current_level) > 1:
+            # Sibling of the last odd element is the element itself
+            sibling_index = index ^ 1
+            if sibling_index >= len(current_level):
+                sibling_index = index
+            path.append((current_level[sibling_index], index % 2 == 0))
+            
+            next_level = []
+            for i in range(0, len(current_level), 2):
+                left = current_level[i]
+                right = current_level[i + 1] if i + 1 < len(current_level) else current_level[i]
+                next_level.append(hash_function(left + right))
+            
+            current_level = next_level
+            index //= 2
+        
+        return path
+    
+    @staticmethod
+    def verify_merkle_path(leaf_hash: bytes, path: List[Tuple[bytes, bool]], merkle_root: bytes,
+                           hash_algorithm: str = 'sha256') -> bool:
+        """
+        Verify that a leaf hash belongs to a Merkle tree with given root.
+        
+        Args:
+            leaf_hash: Hash of the transaction (compute_hash)
+            path: Authentication path from get_merkle_path
+            merkle_root: Expected Merkle root
+            hash_algorithm: Hash backend name (default SHA256)
+        
+        Returns:
+            True if the path leads from the leaf to the root
+        """
+        hash_function = get_hash_backend(hash_algorithm)
+        current = leaf_hash
+        for sibling, sibling_is_right in path:
+            if sibling_is_right:
+                current = hash_function(current + sibling)
+            else:
+                current = hash_function(sibling + current)
+        return current == merkle_root
 
 
 # ================================================================================
@@ -102,14 +231,17 @@ class BlockMiner:
     Component for mining blockchain blocks with proof-of-work.
     """
     
-    def __init__(self, difficulty: int = 10):
+    def __init__(self, difficulty: int = 10, hash_algorithm: str = 'sha256'):
         """
         Initialize block miner.
         
         Args:
             difficulty: Number of leading zero bits required (j parameter)
+            hash_algorithm: Hash backend for block header and Merkle tree
         """
         self.difficulty = difficulty
+        self.hash_algorithm = hash_algorithm
+        self.hash_function = get_hash_backend(hash_algorithm)
     
     @staticmethod
     def hash_has_leading_zero_bits(hash_bytes: bytes, num_bits: int) -> bool:
@@ -149,7 +281,7 @@ class BlockMiner:
             nonce: Nonce value
             
         Returns:
-            SHA256 hash of all components
+            Hash of all components (chain hash backend)
         """
         # Concatenate all block data
         block_data = (
@@ -160,7 +292,7 @@ class BlockMiner:
             nonce.to_bytes(8, byteorder='big')
         )
         
-        return hashlib.sha256(block_data).digest()
+        return self.hash_function(block_data)
     
     def mine_block(self, transactions: List[Union[str, bytes]], 
                    previous_hash: Union[str, bytes],
@@ -181,6 +313,7 @@ class BlockMiner:
         print(f"{'='*80}")
         print(f"Difficulty: {self.difficulty} leading zero bits")
         print(f"Transactions: {len(transactions)}")
+        print(f"Hash algorithm: {self.hash_algorithm}")
         
         # Convert previous_hash to bytes if needed
         if isinstance(previous_hash, str):
@@ -188,7 +321,7 @@ class BlockMiner:
         
         # Compute Merkle root
         print("\nComputing Merkle tree root...")
-        merkle_root = MerkleTree.build_merkle_tree(transactions)
+        merkle_root = MerkleTree.build_merkle_tree(transactions, self.hash_algorithm)
         print(f"Merkle root: {merkle_root.hex()}")
         
         # Get current timestamp
@@ -0,0 +1,103 @@
+"""
+Lab 07 - PoW Hash Backend Benchmark
+Kryptologia - Patryk Rakowski 2025
+
+Measures the cost of one mining attempt (block header hash) and the
+Merkle tree build throughput for every registered hash backend, so the
+PoW function of a chain can be chosen from measured numbers.
+"""
+
+import sys
+import time
+
+from blockchain_mining import HASH_BACKENDS, BlockMiner, MerkleTree
+
+
+def benchmark_header_hashing(hash_algorithm: str, num_attempts: int) -> float:
+    """
+    Measure header hash rate of the mining loop.
+    
+    Args:
+        hash_algorithm: Hash backend name
+        num_attempts: Number of nonces to hash
+    
+    Returns:
+        Hash rate in H/s
+    """
+    miner = BlockMiner(difficulty=256, hash_algorithm=hash_algorithm)
+    merkle_root = MerkleTree.compute_hash("benchmark", hash_algorithm)
+    previous_hash = b'\x00' * 32
+    timestamp = int(time.time())
+    
+    start_time = time.perf_counter()
+    for nonce in range(num_attempts):
+        block_hash = miner.compute_block_hash(merkle_root, previous_hash, timestamp, 1, nonce)
+        miner.hash_has_leading_zero_bits(block_hash, 8)
+    elapsed = time.perf_counter() - start_time
+    
+    return num_attempts / elapsed
+
+
+def benchmark_merkle_build(hash_algorithm: str, num_transactions: int, repetitions: int) -> float:
+    """
+    Measure Merkle tree build throughput.
+    
+    Args:
+        hash_algorithm: Hash backend name
+        num_transactions: Transactions per tree
+        repetitions: Number of trees built
+    
+    Returns:
+        Throughput in transactions/s
+    """
+    transactions = [f"tx{i}: USER{i % 100} -> USER{(i + 1) % 100} [{i % 50 + 1} units]"
+                    for i in range(num_transactions)]
+    
+    start_time = time.perf_counter()
+    for _ in range(repetitions):
+        MerkleTree.build_merkle_tree(transactions, hash_algorithm)
+    elapsed = time.perf_counter() - start_time
+    
+    return num_transactions * repetitions / elapsed
+
+
+def benchmark_hash_backends(num_attempts: int = 200000, num_transactions: int = 10000, repetitions: int = 5):
+    """
+    Compare all hash backends on header hashing and Merkle tree building.
+    
+    Args:
+        num_attempts: Header hashes per backend
+        num_transactions: Transactions per Merkle tree
+        repetitions: Merkle trees built per backend
+    
+    Returns:
+        Dictionary {backend: (header H/s, Merkle tx/s)}
+    """
+    print(f"\n{'='*80}")
+    print("POW HASH BACKEND BENCHMARK")
+    print(f"{'='*80}")
+    print(f"Header attempts: {num_attempts:,}")
+    print(f"Merkle trees:    {repetitions} x {num_transactions:,} transactions")
+    
+    results = {}
+    for name in HASH_BACKENDS:
+        header_rate = benchmark_header_hashing(name, num_attempts)
+        merkle_rate = benchmark_merkle_build(name, num_transactions, repetitions)
+        results[name] = (header_rate, merkle_rate)
+    
+    baseline_rate = results['sha256'][0]
+    print(f"\n{'Backend':<14} {'Header H/s':>14} {'us/attempt':>12} {'vs sha256':>10} {'Merkle tx/s':>14}")
+    print(f"{'-'*68}")
+    for name, (header_rate, merkle_rate) in results.items():
+        print(f"{name:<14} {header_rate:>14,.0f} {1e6 / header_rate:>12.3f} "
+              f"{header_rate / baseline_rate:>9.2f}x {merkle_rate:>14,.0f}")
+    print(f"{'='*80}")
+    
+    return results
+
+
+if __name__ == "__main__":
+    # Usage: python hash_benchmark.py [num_attempts] [num_transactions]
+    num_attempts = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    num_transactions = int(sys.argv[2]) if len(sys.argv) > 2 else 10000
+    benchmark_hash_backends(num_attempts, num_transactions)
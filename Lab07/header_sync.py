@@ -0,0 +1,355 @@
+"""
+Lab 07 - Header-First Chain Sync
+Kryptologia - Patryk Rakowski 2025
+
+Block headers travel as compact 48-byte records (Merkle root, timestamp,
+nonce). The previous hash and block number are implied by the position in
+the chain, so they are rebuilt (and thereby the links checked) while the
+proof-of-work of a whole batch is verified in one loop.
+
+    GETHEADERS {'locator': [known hashes, newest first], 'max_headers': n}
+    HEADERS    {'start': height, 'previous_hash': hash before start,
+                'headers': bytes, 'last_hash': hash of the last header, 'tip': height}
+
+The locator (last 10 hashes, then exponentially sparser, down to block 0)
+lets a rejoining node resume from the newest block it shares with the broker.
+"""
+
+import os
+import struct
+import sys
+import threading
+import time
+from typing import List, Optional, Tuple
+
+from blockchain_mining import Block, ChainParameters, get_hash_backend
+from transport import connect, encode_message, read_message
+
+
+# Compact header: Merkle root (32 B) | timestamp (8 B) | nonce (8 B)
+HEADER_FORMAT = '>32sQQ'
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+MAX_HEADERS_PER_MESSAGE = 20000
+GENESIS_PREVIOUS_HASH = b'\x00' * 32
+
+
+def pack_header(block: Block) -> bytes:
+    """Encode the compact header of a block."""
+    return struct.pack(HEADER_FORMAT, block.merkle_root, block.timestamp, block.nonce)
+
+
+class HeaderChain:
+    """
+    Chain of block headers with a hash -> height map.
+    
+    The broker appends headers of blocks it has already validated; a syncing
+    node extends the chain only with batches that pass verify_headers.
+    """
+    
+    def __init__(self, params: ChainParameters):
+        """
+        Initialize empty header chain.
+        
+        Args:
+            params: Difficulty and hash backend of the chain
+        """
+        self.params = params
+        self.hash_function = get_hash_backend(params.hash_algorithm)
+        self.target = 1 << (256 - params.difficulty)   # hash < target <=> enough leading zero bits
+        self.records = bytearray()                      # Compact headers by height
+        self.hashes: List[bytes] = []                   # Block hashes by height
+        self.heights = {}                               # {block hash: height}
+    
+    @property
+    def height(self) -> int:
+        """Number of headers (number of the next block)."""
+        return len(self.hashes)
+    
+    @property
+    def tip_hash(self) -> bytes:
+        """Hash of the last header (previous hash of the next block)."""
+        return self.hashes[-1] if self.hashes else GENESIS_PREVIOUS_HASH
+    
+    def append_block(self, block: Block):
+        """Append the header of a validated block."""
+        self.records += pack_header(block)
+        self.heights[block.block_hash] = len(self.hashes)
+        self.hashes.append(block.block_hash)
+    
+    def append_verified(self, block: Block) -> bool:
+        """
+        Append the header of a block received from the network (BLOCK_ACCEPTED).
+        
+        Returns:
+            True if the block links to the tip and its proof-of-work is valid
+        """
+        if block.block_number != self.height or block.previous_hash != self.tip_hash:
+            return False
+        data = pack_header(block)
+        hashes, _ = self.verify_headers(self.height, block.previous_hash, data)
+        if not hashes or hashes[0] != block.block_hash:
+            return False
+        self.extend(block.block_number, data, hashes)
+        return True
+    
+    def truncate(self, height: int):
+        """Drop headers from a height on (switch to another branch)."""
+        for block_hash in self.hashes[height:]:
+            del self.heights[block_hash]
+        del self.hashes[height:]
+        del self.records[height * HEADER_SIZE:]
+    
+    def locator(self) -> List[bytes]:
+        """
+        Return hashes describing this chain, newest first: the last 10 blocks,
+        then with doubling steps, always ending at block 0.
+        """
+        locator = []
+        height = self.height - 1
+        step = 1
+        while height > 0:
+            locator.append(self.hashes[height])
+            if len(locator) >= 10:
+                step *= 2
+            height -= step
+        if self.hashes:
+            locator.append(self.hashes[0])
+        return locator
+    
+    def find_fork(self, locator: List[bytes]) -> int:
+        """Return height of the first header the locator's owner is missing."""
+        for block_hash in locator:
+            height = self.heights.get(block_hash)
+            if height is not None:
+                return height + 1
+        return 0
+    
+    def get_headers(self, locator: List[bytes], max_headers: int = MAX_HEADERS_PER_MESSAGE) -> dict:
+        """
+        Build HEADERS message continuing the chain described by a locator.
+        
+        Args:
+            locator: Hashes known to the requester, newest first
+            max_headers: Requested batch size (capped by MAX_HEADERS_PER_MESSAGE)
+        
+        Returns:
+            HEADERS message (empty 'headers' when the requester is up to date)
+        """
+        start = self.find_fork(locator)
+        end = min(self.height, start + min(max_headers, MAX_HEADERS_PER_MESSAGE))
+        return {
+            'type': 'HEADERS',
+            'start': start,
+            'previous_hash': self.hashes[start - 1] if start > 0 else GENESIS_PREVIOUS_HASH,
+            'headers': bytes(self.records[start * HEADER_SIZE:end * HEADER_SIZE]),
+            'last_hash': self.hashes[end - 1] if end > start else None,
+            'tip': self.height
+        }
+    
+    def verify_headers(self, start: int, previous_hash: bytes, data: bytes) -> Tuple[Optional[List[bytes]], Optional[str]]:
+        """
+        Verify links and proof-of-work of a batch of compact headers.
+        
+        Args:
+            start: Height of the first header
+            previous_hash: Hash the first header builds on
+            data: Concatenated compact headers
+        
+        Returns:
+            Tuple of (block hashes, None) or (None, rejection reason)
+        """
+        if start > self.height:
+            return None, f"Batch starts at {start}, chain has only {self.height} headers"
+        expected_previous = self.hashes[start - 1] if start > 0 else GENESIS_PREVIOUS_HASH
+        if previous_hash != expected_previous:
+            return None, f"Batch does not link to block {start - 1}"
+        if len(data) % HEADER_SIZE:
+            return None, "Truncated header"
+        
+        hash_function = self.hash_function
+        target = self.target
+        hashes = []
+        for index, (merkle_root, timestamp, nonce) in enumerate(struct.iter_unpack(HEADER_FORMAT, data)):
+            block_hash = hash_function(merkle_root + previous_hash + timestamp.to_bytes(8, 'big') +
+                                       (start + index).to_bytes(8, 'big') + nonce.to_bytes(8, 'big'))
+            if int.from_bytes(block_hash, 'big') >= target:
+                return None, f"Invalid proof-of-work of block {start + index}"
+            hashes.append(block_hash)
+            previous_hash = block_hash
+        
+        return hashes, None
+    
+    def extend(self, start: int, data: bytes, hashes: List[bytes]):
+        """Add a verified batch (replacing any headers from start on)."""
+        if start < self.height:
+            self.truncate(start)
+        self.records += data
+        for offset, block_hash in enumerate(hashes):
+            self.heights[block_hash] = start + offset
+        self.hashes.extend(hashes)
+
+
+class HeaderSyncClient:
+    """
+    Downloads headers from a broker; the request for the next batch is sent
+    before the current one is verified, so transfer and verification overlap.
+    """
+    
+    def __init__(self, chain: HeaderChain, broker_host: str = 'localhost', broker_port: int = 5000,
+                 transport: str = 'tcp', batch_size: int = 10000, lock: Optional[threading.Lock] = None):
+        """
+        Initialize sync client.
+        
+        Args:
+            chain: Header chain to extend (may already hold headers - sync resumes)
+            broker_host: Broker address
+            broker_port: Broker port
+            transport: 'tcp' or 'unix'
+            batch_size: Headers requested per GETHEADERS
+            lock: Lock guarding the chain if other threads append to it
+        """
+        self.chain = chain
+        self.broker_host = broker_host
+        self.broker_port = broker_port
+        self.transport = transport
+        self.batch_size = batch_size
+        self.lock = lock if lock is not None else threading.Lock()
+        
+        # Statistics of the last sync
+        self.headers_received = 0
+        self.bytes_received = 0
+        self.batches = 0
+    
+    def sync(self) -> Tuple[bool, Optional[str]]:
+        """
+        Catch up with the broker's chain.
+        
+        Returns:
+            Tuple of (success, failure reason)
+        """
+        self.headers_received = self.bytes_received = self.batches = 0
+        sock = connect(self.transport, self.broker_host, self.broker_port)
+        try:
+            with self.lock:
+                locator = self.chain.locator()
+            sock.sendall(encode_message({'type': 'GETHEADERS', 'locator': locator, 'max_headers': self.batch_size}))
+            while True:
+                message = read_message(sock)
+                if message is None:
+                    return False, "Connection closed"
+                data = message['headers']
+                if not data:
+                    return True, None
+                
+                # Pipelining: ask for the next batch as if this one were already valid
+                with self.lock:
+                    locator = [message['last_hash']] + self.chain.locator()
+                sock.sendall(encode_message({'type': 'GETHEADERS', 'locator': locator, 'max_headers': self.batch_size}))
+                
+                with self.lock:
+                    hashes, reason = self.chain.verify_headers(message['start'], message['previous_hash'], data)
+                    if hashes is None:
+                        return False, reason
+                    if hashes[-1] != message['last_hash']:
+                        return False, "Last hash does not match headers"
+                    self.chain.extend(message['start'], data, hashes)
+                
+                self.headers_received += len(hashes)
+                self.bytes_received += len(data)
+                self.batches += 1
+        finally:
+            sock.close()
+
+
+# ================================================================================
+# BENCHMARK
+# ================================================================================
+
+def build_test_chain(num_blocks: int, params: ChainParameters) -> List[Block]:
+    """Mine a chain of headers (low difficulty) for the sync benchmark."""
+    hash_function = get_hash_backend(params.hash_algorithm)
+    target = 1 << (256 - params.difficulty)
+    previous_hash = GENESIS_PREVIOUS_HASH
+    timestamp = int(time.time())
+    blocks = []
+    for number in range(num_blocks):
+        merkle_root = hash_function(number.to_bytes(8, 'big'))
+        prefix = merkle_root + previous_hash + timestamp.to_bytes(8, 'big') + number.to_bytes(8, 'big')
+        nonce = 0
+        while True:
+            block_hash = hash_function(prefix + nonce.to_bytes(8, 'big'))
+            if int.from_bytes(block_hash, 'big') < target:
+                break
+            nonce += 1
+        blocks.append(Block(merkle_root, previous_hash, timestamp, number, nonce, block_hash))
+        previous_hash = block_hash
+    return blocks
+
+
+def benchmark_header_sync(num_blocks: int = 100000, difficulty: int = 4, batch_size: int = 10000,
+                          port: int = 5380, transport: str = 'tcp'):
+    """
+    Sync a fresh node from a broker holding num_blocks headers, then resume a
+    node that already has the first half.
+    
+    Args:
+        num_blocks: Chain length
+        difficulty: Difficulty of the test chain
+        batch_size: Headers per GETHEADERS
+        port: Broker port
+        transport: 'tcp' or 'unix'
+    
+    Returns:
+        Dictionary {scenario: (headers, bytes, batches, seconds)}
+    """
+    import contextlib
+    from zad3_broker import BrokerNode
+    
+    params = ChainParameters(difficulty=difficulty)
+    print(f"\n{'='*80}")
+    print("HEADER-FIRST SYNC BENCHMARK")
+    print(f"{'='*80}")
+    print(f"Building test chain: {num_blocks:,} blocks, difficulty {difficulty}...")
+    blocks = build_test_chain(num_blocks, params)
+    
+    # Broker console output is not part of the measurement
+    results = {}
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        broker = BrokerNode(port=port, difficulty=difficulty, verifier_workers=0, trace_report_interval=0,
+                            transport=transport)
+        for block in blocks:
+            broker.header_chain.append_block(block)
+        threading.Thread(target=broker.start, daemon=True).start()
+        while not broker.running:
+            time.sleep(0.01)
+        
+        try:
+            partial = HeaderChain(params)
+            for block in blocks[:num_blocks // 2]:
+                partial.append_block(block)
+            
+            for scenario, chain in (('fresh', HeaderChain(params)), ('resume from half', partial)):
+                client = HeaderSyncClient(chain, broker_port=port, transport=transport, batch_size=batch_size)
+                start_time = time.perf_counter()
+                ok, reason = client.sync()
+                elapsed = time.perf_counter() - start_time
+                assert ok, reason
+                assert chain.height == num_blocks and chain.tip_hash == blocks[-1].block_hash
+                results[scenario] = (client.headers_received, client.bytes_received, client.batches, elapsed)
+        finally:
+            broker.stop()
+    
+    print(f"\n{'Scenario':<18} {'Headers':>10} {'MB':>8} {'Batches':>8} {'Time (s)':>9} {'Headers/s':>12}")
+    print(f"{'-'*70}")
+    for scenario, (headers, size, batches, elapsed) in results.items():
+        print(f"{scenario:<18} {headers:>10,} {size / 1e6:>8.2f} {batches:>8} {elapsed:>9.3f} {headers / elapsed:>12,.0f}")
+    print(f"{'='*80}")
+    
+    return results
+
+
+if __name__ == "__main__":
+    # Usage: python header_sync.py [num_blocks] [batch_size]
+    num_blocks = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    batch_size = int(sys.argv[2]) if len(sys.argv) > 2 else 10000
+    benchmark_header_sync(num_blocks, batch_size=batch_size)
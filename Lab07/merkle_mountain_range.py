@@ -0,0 +1,284 @@
+"""
+Lab 07 - Merkle Mountain Range
+Kryptologia - Patryk Rakowski 2025
+
+Append-only accumulator over block hashes. Every appended block hash costs
+O(log n) hashes, and any historical block can be proven against the current
+root with O(log n) hashes.
+
+Nodes are stored in post-order, so the node array only ever grows. With a
+file path the nodes are appended to a file of 32-byte records; on restart
+only the peaks are read back from it.
+"""
+
+import os
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+from blockchain_mining import MerkleTree
+
+
+NODE_SIZE = 32
+
+
+@dataclass
+class MMRProof:
+    """
+    Inclusion proof of one leaf in a Merkle Mountain Range.
+    """
+    leaf_index: int                     # Index of the proven leaf (block number)
+    mmr_size: int                       # Number of nodes when the proof was made
+    path: List[Tuple[bytes, bool]]      # (sibling hash, sibling is on the right), leaf to peak; side is informative only
+    peaks: List[bytes]                  # All peak hashes, left to right
+    peak_index: int                     # Peak that the path leads to
+
+
+class MerkleMountainRange:
+    """
+    Merkle Mountain Range over block hashes.
+    """
+    
+    def __init__(self, path: Optional[str] = None, hash_algorithm: str = 'sha256'):
+        """
+        Initialize MMR, restoring peaks from the node file if it exists.
+        
+        Args:
+            path: Node file path (None = keep nodes in memory)
+            hash_algorithm: Hash backend of leaves and parent nodes (the chain's algorithm)
+        """
+        self.path = path
+        self.hash_algorithm = hash_algorithm
+        self.nodes: List[bytes] = []    # Used only without a node file
+        self.size = 0                   # Number of nodes
+        self.leaf_count = 0
+        self.peaks: List[Tuple[int, int, bytes]] = []  # [(height, position, hash)]
+        
+        self.file = None
+        if path is not None:
+            self.file = open(path, 'a+b')
+            self.file.seek(0, os.SEEK_END)
+            # Nodes of an interrupted append (torn node, unmerged peaks) are dropped
+            self.size = self.file.tell() // NODE_SIZE
+            while not self.is_valid_size(self.size):
+                self.size -= 1
+            self.file.truncate(self.size * NODE_SIZE)
+            self._restore_peaks()
+    
+    @staticmethod
+    def peak_positions(size: int) -> List[Tuple[int, int]]:
+        """
+        Compute (height, position) of the peaks of an MMR with given node count.
+        
+        Args:
+            size: Number of nodes
+        
+        Returns:
+            List of (height, position), left to right
+        """
+        peaks = []
+        start = 0
+        remaining = size
+        while remaining > 0:
+            # Largest perfect tree (2^(h+1) - 1 nodes) that fits
+            height = (remaining + 1).bit_length() - 2
+            tree_size = (1 << (height + 1)) - 1
+            peaks.append((height, start + tree_size - 1))
+            start += tree_size
+            remaining -= tree_size
+        return peaks
+    
+    @staticmethod
+    def is_valid_size(size: int) -> bool:
+        """Check that peak heights are strictly decreasing (no unmerged peaks)."""
+        heights = [height for height, _ in MerkleMountainRange.peak_positions(size)]
+        return all(a > b for a, b in zip(heights, heights[1:]))
+    
+    @staticmethod
+    def leaf_position(leaf_index: int) -> int:
+        """Return node position of a leaf."""
+        return 2 * leaf_index - bin(leaf_index).count('1')
+    
+    def _restore_peaks(self):
+        """Read peak hashes from the node file."""
+        positions = self.peak_positions(self.size)
+        self.peaks = [(height, position, self._read_node(position)) for height, position in positions]
+        self.leaf_count = sum(1 << height for height, _ in positions)
+    
+    def _read_node(self, position: int) -> bytes:
+        """Read a node hash."""
+        if self.file is None:
+            return self.nodes[position]
+        self.file.seek(position * NODE_SIZE)
+        return self.file.read(NODE_SIZE)
+    
+    def _write_node(self, node: bytes):
+        """Append a node hash."""
+        if self.file is None:
+            self.nodes.append(node)
+        else:
+            self.file.seek(0, os.SEEK_END)
+            self.file.write(node)
+        self.size += 1
+    
+    def append(self, block_hash: bytes) -> int:
+        """
+        Append a block hash.
+        
+        Args:
+            block_hash: Hash of the accepted block
+        
+        Returns:
+            Leaf index of the block
+        """
+        leaf_index = self.leaf_count
+        leaf = MerkleTree.compute_hash(block_hash, self.hash_algorithm)
+        self.peaks.append((0, self.size, leaf))
+        self._write_node(leaf)
+        
+        # Merge equal-height peaks; at most log2(n) merges
+        while len(self.peaks) >= 2 and self.peaks[-1][0] == self.peaks[-2][0]:
+            height, _, right = self.peaks.pop()
+            _, _, left = self.peaks.pop()
+            parent = MerkleTree.compute_hash(left + right, self.hash_algorithm)
+            self.peaks.append((height + 1, self.size, parent))
+            self._write_node(parent)
+        
+        if self.file is not None:
+            self.file.flush()
+        
+        self.leaf_count += 1
+        return leaf_index
+    
+    def truncate(self, leaf_count: int):
+        """
+        Drop the leaves from leaf_count on (e.g. blocks past the recovered chain tip).
+        
+        Args:
+            leaf_count: Number of leaves to keep
+        """
+        if leaf_count >= self.leaf_count:
+            return
+        
+        # A post-order MMR of n leaves has 2n - popcount(n) nodes, a prefix of the larger one
+        self.size = 2 * leaf_count - bin(leaf_count).count('1')
+        if self.file is None:
+            del self.nodes[self.size:]
+        else:
+            self.file.truncate(self.size * NODE_SIZE)
+            self.file.flush()
+        self._restore_peaks()
+    
+    @staticmethod
+    def bag_peaks(peaks: List[bytes], hash_algorithm: str = 'sha256') -> bytes:
+        """Combine peak hashes into a single root (right to left)."""
+        if not peaks:
+            return MerkleTree.compute_hash(b"", hash_algorithm)
+        root = peaks[-1]
+        for peak in reversed(peaks[:-1]):
+            root = MerkleTree.compute_hash(peak + root, hash_algorithm)
+        return root
+    
+    def get_root(self) -> bytes:
+        """Return the current MMR root."""
+        return self.bag_peaks([peak for _, _, peak in self.peaks], self.hash_algorithm)
+    
+    def get_proof(self, leaf_index: int) -> MMRProof:
+        """
+        Build an inclusion proof for a leaf.
+        
+        Args:
+            leaf_index: Index of the leaf (order of appending)
+        
+        Returns:
+            MMRProof with O(log n) hashes
+        """
+        if not 0 <= leaf_index < self.leaf_count:
+            raise ValueError(f"Leaf index {leaf_index} out of range [0, {self.leaf_count})")
+        
+        position = self.leaf_position(leaf_index)
+        
+        # Find the perfect tree containing the leaf
+        start = 0
+        for peak_index, (height, peak_position, _) in enumerate(self.peaks):
+            if position <= peak_position:
+                break
+            start = peak_position + 1
+        
+        # Descend from the peak to the leaf, collecting siblings
+        path = []
+        node_position = peak_position
+        while height > 0:
+            left_size = (1 << height) - 1
+            left_root = start + left_size - 1
+            right_root = node_position - 1
+            if position <= left_root:
+                path.append((self._read_node(right_root), True))
+                node_position = left_root
+            else:
+                path.append((self._read_node(left_root), False))
+                start = left_root + 1
+                node_position = right_root
+            height -= 1
+        
+        path.reverse()
+        return MMRProof(
+            leaf_index=leaf_index,
+            mmr_size=self.size,
+            path=path,
+            peaks=[peak for _, _, peak in self.peaks],
+            peak_index=peak_index
+        )
+    
+    @staticmethod
+    def verify_proof(block_hash: bytes, proof: MMRProof, root: bytes, hash_algorithm: str = 'sha256') -> bool:
+        """
+        Verify that a block hash is included in an MMR with given root.
+        
+        The peak, path length and left/right order of the siblings are derived
+        from proof.leaf_index and proof.mmr_size, so a proof cannot claim a
+        different leaf position than the one it actually proves.
+        
+        Args:
+            block_hash: Hash of the block
+            proof: Proof from get_proof
+            root: Trusted MMR root
+            hash_algorithm: Hash backend of the MMR (the chain's algorithm)
+        
+        Returns:
+            True if the proof is valid
+        """
+        if proof.mmr_size <= 0 or not MerkleMountainRange.is_valid_size(proof.mmr_size):
+            return False
+        positions = MerkleMountainRange.peak_positions(proof.mmr_size)
+        if len(proof.peaks) != len(positions) or proof.leaf_index < 0:
+            return False
+        
+        # Perfect tree holding the leaf and the leaf's index inside it
+        local_index = proof.leaf_index
+        for peak_index, (height, _) in enumerate(positions):
+            if local_index < 1 << height:
+                break
+            local_index -= 1 << height
+        else:
+            return False
+        if peak_index != proof.peak_index or len(proof.path) != height:
+            return False
+        
+        # Bit i of the local index: 0 = node is a left child at level i (sibling on the right)
+        current = MerkleTree.compute_hash(block_hash, hash_algorithm)
+        for level, (sibling, _) in enumerate(proof.path):
+            if (local_index >> level) & 1:
+                current = MerkleTree.compute_hash(sibling + current, hash_algorithm)
+            else:
+                current = MerkleTree.compute_hash(current + sibling, hash_algorithm)
+        
+        if proof.peaks[peak_index] != current:
+            return False
+        
+        return MerkleMountainRange.bag_peaks(proof.peaks, hash_algorithm) == root
+    
+    def close(self):
+        """Close the node file."""
+        if self.file is not None:
+            self.file.close()
+            self.file = None
@@ -0,0 +1,411 @@
+"""
+Lab 07 - Merkle Signature Scheme
+Kryptologia - Patryk Rakowski 2025
+
+Many-time hash-based signature (MSS / XMSS style) built on the hash of
+MerkleTree: 2^h WOTS+ one-time key pairs (wots_plus.py) are the leaves of a
+Merkle tree whose root is the public key. Leaf secret keys are derived from
+a seed on demand (HMAC-SHA256(seed, leaf | chain), like DeterministicRng in
+Lab08), so the private key is the seed plus the traversal state.
+
+Authentication paths are produced with the BDS traversal (Buchmann, Dahmen,
+Schneider 2008): the signer keeps O(h) nodes (current path, keep nodes,
+treehash instances sharing one stack and a few retained top nodes) and
+computes at most (h - K) / 2 + 1 leaves per signature instead of the 2^h
+leaves needed to rebuild the tree.
+"""
+
+import os
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+from blockchain_mining import MerkleTree
+from wots_plus import N, WOTSPlus
+
+
+SEED_SIZE = 32
+
+
+# ================================================================================
+# BDS AUTHENTICATION PATH TRAVERSAL
+# ================================================================================
+
+@dataclass
+class TreeHashInstance:
+    """
+    Incremental computation of one future authentication node of a given height.
+    
+    Tail nodes live on the stack shared by all instances; stack_usage counts them.
+    """
+    height: int
+    next_index: int = 0                 # Next leaf to compute
+    stack_usage: int = 0                # Tail nodes of this instance on the shared stack
+    completed: bool = True              # Finished (or not started)
+    node: Optional[bytes] = None        # Finished node
+
+
+class BDSTraversal:
+    """
+    Merkle tree traversal producing the authentication path of every leaf in order.
+    """
+    
+    def __init__(self, height: int, leaf_function: Callable[[int], bytes],
+                 node_function: Callable[[bytes, bytes], bytes], k: Optional[int] = None):
+        """
+        Compute the root and the initial state (one pass over all 2^height leaves, O(height) memory).
+        
+        Args:
+            height: Tree height h (2^h leaves)
+            leaf_function: Computes the leaf of an index
+            node_function: Hashes two children into their parent
+            k: Number of top levels whose right nodes are retained (h - k must be even;
+               default 2 for even h, 3 for odd h)
+        """
+        if k is None:
+            k = 2 if height % 2 == 0 else 3
+        if not 2 <= k <= height or (height - k) % 2 != 0:
+            raise ValueError(f"Invalid BDS parameters: height {height}, k {k} (need 2 <= k <= height, height - k even)")
+        self.height = height
+        self.k = k
+        self.leaf_function = leaf_function
+        self.node_function = node_function
+        
+        self.auth: List[Optional[bytes]] = [None] * height
+        self.keep: List[Optional[bytes]] = [None] * height
+        self.treehash = [TreeHashInstance(h) for h in range(height - k)]
+        self.stack: List[Tuple[int, bytes]] = []            # Shared treehash stack [(height, node)]
+        self.retain: Dict[int, List[bytes]] = {h: [] for h in range(height - k, height - 1)}
+        self.next_leaf = 0
+        
+        # Statistics
+        self.leaf_computations = 0
+        
+        self.root = self._initialize()
+    
+    def _leaf(self, index: int) -> bytes:
+        self.leaf_computations += 1
+        return self.leaf_function(index)
+    
+    def _initialize(self) -> bytes:
+        """Treehash over the whole tree, keeping the right nodes the traversal needs."""
+        stack = []
+        for index in range(1 << self.height):
+            node, node_height = self._leaf(index), 0
+            while True:
+                # Node at node_height with position index >> node_height
+                position = index >> node_height
+                if position == 1:
+                    self.auth[node_height] = node
+                elif position == 3 and node_height < self.height - self.k:
+                    self.treehash[node_height].node = node
+                elif position >= 3 and position & 1 and self.height - self.k <= node_height < self.height - 1:
+                    self.retain[node_height].append(node)
+                
+                if not stack or stack[-1][0] != node_height:
+                    break
+                node = self.node_function(stack.pop()[1], node)
+                node_height += 1
+            stack.append((node_height, node))
+        return stack[0][1]
+    
+    def _treehash_update(self, instance: TreeHashInstance):
+        """Compute one leaf of a treehash instance and merge it with its tail nodes."""
+        node, node_height = self._leaf(instance.next_index), 0
+        while instance.stack_usage > 0 and self.stack[-1][0] == node_height:
+            node = self.node_function(self.stack.pop()[1], node)
+            node_height += 1
+            instance.stack_usage -= 1
+        
+        if node_height == instance.height:
+            instance.node = node
+            instance.completed = True
+        else:
+            self.stack.append((node_height, node))
+            instance.stack_usage += 1
+        instance.next_index += 1
+    
+    def _lowest_tail_height(self, instance: TreeHashInstance) -> int:
+        """Height used to schedule instances: lowest tail node, or the target height if none."""
+        if instance.completed:
+            return self.height
+        if instance.stack_usage == 0:
+            return instance.height
+        return min(node_height for node_height, _ in self.stack[-instance.stack_usage:])
+    
+    def advance(self):
+        """Replace the authentication path of leaf next_leaf with the one of the following leaf."""
+        leaf = self.next_leaf
+        if leaf >= (1 << self.height) - 1:
+            raise ValueError("Last leaf reached, no further authentication path")
+        
+        # tau = height of the first left node on the path of this leaf
+        tau = 0
+        while (leaf >> tau) & 1:
+            tau += 1
+        
+        if tau > 0:
+            parent = self.node_function(self.auth[tau - 1], self.keep[tau - 1])
+        if not (leaf >> (tau + 1)) & 1 and tau < self.height - 1:
+            self.keep[tau] = self.auth[tau]
+        
+        if tau == 0:
+            self.auth[0] = self._leaf(leaf)
+        else:
+            self.auth[tau] = parent
+            self.keep[tau - 1] = None
+            for h in range(tau):
+                if h < self.height - self.k:
+                    self.auth[h] = self.treehash[h].node
+                else:
+                    self.auth[h] = self.retain[h][((leaf >> h) - 1) >> 1]
+            
+            # Start computing the nodes needed after the next ones
+            for h in range(min(tau, self.height - self.k)):
+                start = leaf + 1 + 3 * (1 << h)
+                if start < 1 << self.height:
+                    self.treehash[h] = TreeHashInstance(h, next_index=start, completed=False)
+        
+        # (h - k) / 2 treehash updates, lowest tail first
+        for _ in range((self.height - self.k) // 2):
+            lowest = min(self.treehash, key=self._lowest_tail_height)
+            if lowest.completed:
+                break
+            self._treehash_update(lowest)
+        
+        self.next_leaf = leaf + 1
+    
+    def cached_nodes(self) -> int:
+        """Number of nodes held by the traversal state."""
+        return (sum(node is not None for node in self.auth) + sum(node is not None for node in self.keep)
+                + sum(instance.node is not None for instance in self.treehash) + len(self.stack)
+                + sum(len(nodes) for nodes in self.retain.values()))
+
+
+def naive_auth_path(height: int, leaf_function: Callable[[int], bytes],
+                    node_function: Callable[[bytes, bytes], bytes], leaf_index: int) -> List[bytes]:
+    """Authentication path of a leaf computed by rebuilding the whole tree (reference for BDS)."""
+    level = [leaf_function(index) for index in range(1 << height)]
+    path = []
+    index = leaf_index
+    while len(level) > 1:
+        path.append(level[index ^ 1])
+        level = [node_function(level[i], level[i + 1]) for i in range(0, len(level), 2)]
+        index >>= 1
+    return path
+
+
+# ================================================================================
+# SIGNATURE SCHEME
+# ================================================================================
+
+@dataclass
+class MerklePublicKey:
+    """
+    Public key: tree root and the parameters needed to verify.
+    """
+    root: bytes
+    height: int
+    w: int = 16
+    hash_algorithm: str = 'sha256'
+    public_seed: bytes = bytes(N)       # Seed of the WOTS+ bitmasks and function key
+
+
+@dataclass
+class MerkleSignature:
+    """
+    Signature: leaf index, WOTS+ signature and authentication path (leaf to root).
+    """
+    leaf_index: int
+    ots_signature: bytes = b''
+    auth_path: List[bytes] = field(default_factory=list)
+
+
+class MerkleSigner:
+    """
+    Stateful signer: every signature uses the next unused leaf.
+    """
+    
+    def __init__(self, height: int = 10, seed: Optional[bytes] = None, w: int = 16,
+                 hash_algorithm: str = 'sha256', bds_k: Optional[int] = None,
+                 public_seed: Optional[bytes] = None):
+        """
+        Generate a key pair (computes all 2^height leaves once).
+        
+        Args:
+            height: Tree height (2^height signatures)
+            seed: Secret seed (random if None)
+            w: Winternitz parameter (see WOTSPlus)
+            hash_algorithm: Hash backend name (default SHA256)
+            bds_k: Retained top levels of the traversal (see BDSTraversal)
+            public_seed: Seed of the WOTS+ bitmasks (random if None)
+        """
+        self.seed = seed if seed is not None else os.urandom(SEED_SIZE)
+        public_seed = public_seed if public_seed is not None else os.urandom(N)
+        self.ots = WOTSPlus(w, public_seed, hash_algorithm)
+        self.hash_algorithm = hash_algorithm
+        self.traversal = BDSTraversal(height, self._leaf, self._node, bds_k)
+        self.public_key = MerklePublicKey(self.traversal.root, height, w, hash_algorithm, public_seed)
+    
+    def _leaf(self, index: int) -> bytes:
+        # Leaf = hash of the WOTS+ public key (all chain ends)
+        return MerkleTree.compute_hash(self.ots.public_key(self.seed, index), self.hash_algorithm)
+    
+    def _node(self, left: bytes, right: bytes) -> bytes:
+        return MerkleTree.compute_hash(left + right, self.hash_algorithm)
+    
+    @property
+    def remaining_signatures(self) -> int:
+        return (1 << self.public_key.height) - self.traversal.next_leaf
+    
+    def sign(self, message) -> MerkleSignature:
+        """
+        Sign a message with the next leaf and prepare the path of the following one.
+        
+        Args:
+            message: String or bytes
+        
+        Returns:
+            MerkleSignature
+        """
+        leaf_index = self.traversal.next_leaf
+        if leaf_index >= 1 << self.public_key.height:
+            raise ValueError("All one-time keys used")
+        
+        signature = MerkleSignature(leaf_index, self.ots.sign(message, self.seed, leaf_index),
+                                    list(self.traversal.auth))
+        
+        if leaf_index < (1 << self.public_key.height) - 1:
+            self.traversal.advance()
+        else:
+            self.traversal.next_leaf += 1
+        return signature
+    
+    @staticmethod
+    def verify(message, signature: MerkleSignature, public_key: MerklePublicKey,
+               ots: Optional[WOTSPlus] = None) -> bool:
+        """
+        Verify a signature.
+        
+        Args:
+            message: String or bytes
+            signature: Signature from sign()
+            public_key: Public key of the signer
+            ots: WOTS+ parameters of the public key, to reuse their bitmasks (built if None)
+        
+        Returns:
+            True if the signature is valid
+        """
+        if not 0 <= signature.leaf_index < 1 << public_key.height or len(signature.auth_path) != public_key.height:
+            return False
+        if ots is None or (ots.w, ots.public_seed, ots.hash_algorithm) != \
+                (public_key.w, public_key.public_seed, public_key.hash_algorithm):
+            ots = WOTSPlus(public_key.w, public_key.public_seed, public_key.hash_algorithm)
+        ots_public_key = ots.public_key_from_signature(message, signature.ots_signature)
+        if ots_public_key is None:
+            return False
+        node = MerkleTree.compute_hash(ots_public_key, public_key.hash_algorithm)
+        
+        index = signature.leaf_index
+        for sibling in signature.auth_path:
+            if index & 1:
+                node = MerkleTree.compute_hash(sibling + node, public_key.hash_algorithm)
+            else:
+                node = MerkleTree.compute_hash(node + sibling, public_key.hash_algorithm)
+            index >>= 1
+        return node == public_key.root
+
+
+# ================================================================================
+# BENCHMARK
+# ================================================================================
+
+def bds_state_bound(height: int, k: Optional[int] = None) -> int:
+    """Upper bound of nodes stored by BDSTraversal: auth, keep, treehash nodes and stack, retain."""
+    if k is None:
+        k = 2 if height % 2 == 0 else 3
+    return height + height // 2 + (height - k) + max(0, height - k - 2) + ((1 << k) - k - 1)
+
+
+def benchmark_merkle_signature(height: int = 10, w: int = 16, num_signatures: int = 256):
+    """
+    Measure key generation, signing with BDS, naive path computation and verification.
+    
+    Args:
+        height: Tree height
+        w: Winternitz parameter
+        num_signatures: Signatures made (and verified)
+    
+    Returns:
+        Dictionary of measured values
+    """
+    print(f"\n{'='*80}")
+    print("MERKLE SIGNATURE SCHEME BENCHMARK (BDS TRAVERSAL)")
+    print(f"{'='*80}")
+    print(f"Height: {height} ({1 << height:,} signatures), WOTS+ w = {w}")
+    
+    start_time = time.perf_counter()
+    signer = MerkleSigner(height, seed=b'\x42' * SEED_SIZE, w=w, public_seed=b'\x17' * N)
+    keygen_time = time.perf_counter() - start_time
+    leaf_time = keygen_time / (1 << height)
+    print(f"Key generation: {keygen_time:.2f} s ({leaf_time * 1000:.3f} ms per leaf)")
+    
+    num_signatures = min(num_signatures, 1 << height)
+    leaves_per_signature = []
+    sign_times = []
+    signatures = []
+    max_cached = 0
+    for i in range(num_signatures):
+        before = signer.traversal.leaf_computations
+        start_time = time.perf_counter()
+        signatures.append(signer.sign(f"Message {i}"))
+        sign_times.append(time.perf_counter() - start_time)
+        leaves_per_signature.append(signer.traversal.leaf_computations - before)
+        max_cached = max(max_cached, signer.traversal.cached_nodes())
+    
+    start_time = time.perf_counter()
+    valid = all(MerkleSigner.verify(f"Message {i}", signature, signer.public_key, signer.ots)
+                for i, signature in enumerate(signatures))
+    verify_time = (time.perf_counter() - start_time) / num_signatures
+    
+    # Naive signer rebuilds the tree for every path
+    start_time = time.perf_counter()
+    naive_path = naive_auth_path(height, signer._leaf, signer._node, num_signatures - 1)
+    naive_time = time.perf_counter() - start_time
+    
+    signature_size = 4 + signer.ots.signature_size() + N * height
+    print(f"\n{'Operation':<36} {'Time (ms)':>12} {'Leaves computed':>16}")
+    print(f"{'-'*66}")
+    print(f"{'Sign (BDS, mean)':<36} {1000 * sum(sign_times) / num_signatures:>12.3f} "
+          f"{sum(leaves_per_signature) / num_signatures:>16.2f}")
+    print(f"{'Sign (BDS, max)':<36} {1000 * max(sign_times):>12.3f} {max(leaves_per_signature):>16}")
+    print(f"{'Auth path by rebuilding the tree':<36} {1000 * naive_time:>12.3f} {1 << height:>16,}")
+    print(f"{'Verify':<36} {1000 * verify_time:>12.3f} {0:>16}")
+    print(f"\nAll signatures valid: {valid}, last path equals rebuilt tree: {naive_path == signatures[-1].auth_path}")
+    print(f"Signature size: {signature_size:,} B, cached nodes: max {max_cached} (bound {bds_state_bound(height)}), "
+          f"full tree: {(2 << height) - 1:,}")
+    
+    print(f"\n{'Height':>7} {'Signatures':>12} {'BDS nodes':>10} {'Tree nodes':>14} {'Keygen (est.)':>14}")
+    print(f"{'-'*61}")
+    for h in (10, 16, 18, 20):
+        print(f"{h:>7} {1 << h:>12,} {bds_state_bound(h):>10} {(2 << h) - 1:>14,} "
+              f"{leaf_time * (1 << h):>12.0f} s")
+    print(f"{'='*80}")
+    
+    return {
+        'keygen_time': keygen_time,
+        'sign_time': sum(sign_times) / num_signatures,
+        'naive_time': naive_time,
+        'verify_time': verify_time,
+        'max_leaves_per_signature': max(leaves_per_signature),
+        'max_cached_nodes': max_cached,
+    }
+
+
+if __name__ == "__main__":
+    # Usage: python merkle_signature.py [height] [w] [num_signatures]
+    height = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    w = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+    num_signatures = int(sys.argv[3]) if len(sys.argv) > 3 else 256
+    benchmark_merkle_signature(height, w, num_signatures)
@@ -0,0 +1,256 @@
+"""
+Lab 07 - Metrics Registry
+Kryptologia - Patryk Rakowski 2025
+
+Counters, gauges and histograms for the broker and mining nodes, exposed
+over a local HTTP endpoint (GET /metrics) in the Prometheus text format.
+Every metric can carry labels; each label combination is a separate series.
+"""
+
+import bisect
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+
+# Default histogram buckets in seconds (same as the Prometheus client libraries)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...], extra: Optional[Tuple[str, str]] = None) -> str:
+    """Render a label set as {name="value",...}."""
+    items = list(labels) + ([extra] if extra else [])
+    if not items:
+        return ''
+    escaped = [(name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+               for name, value in items]
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+def _format_value(value: float) -> str:
+    """Render a sample value."""
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+# ================================================================================
+# METRIC TYPES
+# ================================================================================
+
+class _Metric:
+    """Common part of all metric types: name, help text and labelled series."""
+    
+    metric_type = 'untyped'
+    
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help_text = help_text
+        self.lock = threading.Lock()
+        self.series: Dict[Tuple[Tuple[str, str], ...], object] = {}
+    
+    @staticmethod
+    def _key(labels: Dict[str, str]) -> Tuple[Tuple[str, str], ...]:
+        """Return hashable key of a label set."""
+        return tuple(sorted(labels.items()))
+    
+    def render(self) -> List[str]:
+        """Return exposition lines of this metric."""
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} {self.metric_type}']
+        with self.lock:
+            # A metric that was never updated is exported as zero, so it can be scraped from the start
+            series = sorted(self.series.items()) or [((), self._empty())]
+            for key, value in series:
+                lines.extend(self._render_series(key, value))
+        return lines
+    
+    def _empty(self):
+        return 0
+    
+    def _render_series(self, key, value) -> List[str]:
+        return [f'{self.name}{_format_labels(key)} {_format_value(value)}']
+
+
+class Counter(_Metric):
+    """
+    Monotonically increasing value (events, bytes, attempts).
+    """
+    
+    metric_type = 'counter'
+    
+    def inc(self, amount: float = 1, **labels):
+        """Increase counter by amount."""
+        key = self._key(labels)
+        with self.lock:
+            self.series[key] = self.series.get(key, 0) + amount
+    
+    def get(self, **labels) -> float:
+        """Return current value."""
+        with self.lock:
+            return self.series.get(self._key(labels), 0)
+
+
+class Gauge(_Metric):
+    """
+    Value that can go up and down (queue depth, hash rate).
+    """
+    
+    metric_type = 'gauge'
+    
+    def set(self, value: float, **labels):
+        """Set gauge to value."""
+        with self.lock:
+            self.series[self._key(labels)] = value
+    
+    def inc(self, amount: float = 1, **labels):
+        """Increase gauge by amount."""
+        key = self._key(labels)
+        with self.lock:
+            self.series[key] = self.series.get(key, 0) + amount
+    
+    def dec(self, amount: float = 1, **labels):
+        """Decrease gauge by amount."""
+        self.inc(-amount, **labels)
+    
+    def get(self, **labels) -> float:
+        """Return current value."""
+        with self.lock:
+            return self.series.get(self._key(labels), 0)
+
+
+class Histogram(_Metric):
+    """
+    Distribution of observed values in cumulative buckets, with sum and count.
+    """
+    
+    metric_type = 'histogram'
+    
+    def __init__(self, name: str, help_text: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text)
+        self.buckets = tuple(sorted(buckets))
+    
+    def observe(self, value: float, **labels):
+        """Record one observation."""
+        key = self._key(labels)
+        with self.lock:
+            state = self.series.get(key)
+            if state is None:
+                state = self.series[key] = self._empty()
+            state[0][bisect.bisect_left(self.buckets, value)] += 1
+            state[1] += value
+            state[2] += 1
+    
+    def get_count(self, **labels) -> int:
+        """Return number of observations."""
+        with self.lock:
+            state = self.series.get(self._key(labels))
+            return state[2] if state else 0
+    
+    def get_sum(self, **labels) -> float:
+        """Return sum of observations."""
+        with self.lock:
+            state = self.series.get(self._key(labels))
+            return state[1] if state else 0.0
+    
+    def _empty(self):
+        # [per-bucket counts (+Inf last), sum, count]
+        return [[0] * (len(self.buckets) + 1), 0.0, 0]
+    
+    def _render_series(self, key, state) -> List[str]:
+        counts, total, count = state
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += bucket_count
+            lines.append(f'{self.name}_bucket{_format_labels(key, ("le", _format_value(bound)))} {cumulative}')
+        lines.append(f'{self.name}_sum{_format_labels(key)} {_format_value(total)}')
+        lines.append(f'{self.name}_count{_format_labels(key)} {count}')
+        return lines
+
+
+# ================================================================================
+# REGISTRY AND HTTP ENDPOINT
+# ================================================================================
+
+class MetricsRegistry:
+    """
+    Named collection of metrics of one process (broker or mining node).
+    """
+    
+    def __init__(self):
+        self.metrics: Dict[str, _Metric] = {}
+        self.lock = threading.Lock()
+    
+    def _register(self, metric_class, name: str, help_text: str, **kwargs):
+        """Return existing metric with a name or register a new one."""
+        with self.lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = metric_class(name, help_text, **kwargs)
+            elif not isinstance(metric, metric_class):
+                raise ValueError(f"Metric '{name}' already registered as {metric.metric_type}")
+            return metric
+    
+    def counter(self, name: str, help_text: str) -> Counter:
+        """Get or create a counter."""
+        return self._register(Counter, name, help_text)
+    
+    def gauge(self, name: str, help_text: str) -> Gauge:
+        """Get or create a gauge."""
+        return self._register(Gauge, name, help_text)
+    
+    def histogram(self, name: str, help_text: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        """Get or create a histogram."""
+        return self._register(Histogram, name, help_text, buckets=buckets)
+    
+    def render(self) -> str:
+        """Render all metrics in the Prometheus text exposition format."""
+        with self.lock:
+            metrics = list(self.metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+class MetricsServer:
+    """
+    HTTP server exposing a registry at /metrics in a background thread.
+    """
+    
+    def __init__(self, registry: MetricsRegistry, host: str = 'localhost', port: int = 9100):
+        """
+        Start serving metrics.
+        
+        Args:
+            registry: Registry to expose
+            host: Listen address (local by default)
+            port: Listen port (0 = any free port)
+        """
+        registry_ref = registry
+        
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = registry_ref.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            
+            def log_message(self, format, *args):
+                pass  # Scrapes are not logged to the console
+        
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+    
+    def close(self):
+        """Stop the HTTP server."""
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,352 @@
+"""
+Lab 07 - Statistical Proof-of-Work Network Simulator
+Kryptologia - Patryk Rakowski 2025
+
+Discrete-event simulation of the Zadanie 11.3 network without real hashing.
+A miner with hash rate H searching for a hash with j leading zero bits finds
+a block after a time drawn from the exponential distribution with rate
+H / 2^j. The process is memoryless, so a new draw is made on every NEW_TASK.
+
+Miner messages are pickled and delivered to a real BrokerNode
+(handle_mined_block, broadcast_to_miners) through simulated sockets.
+The broker is modelled as a single FIFO server whose service time is the
+measured wall-clock time of handling each message.
+"""
+
+import contextlib
+import heapq
+import io
+import pickle
+import random
+import sys
+import time
+from typing import Dict, List, Optional
+
+from blockchain_mining import Block, MerkleTree
+from zad3_broker import BrokerNode
+
+
+# ================================================================================
+# SIMULATED NETWORK
+# ================================================================================
+
+class SimulatedSocket:
+    """
+    Broker-side socket of a simulated miner.
+    
+    BrokerNode.send_message calls sendall(); the framed bytes are collected
+    and delivered to the miner after the link latency.
+    """
+    
+    def __init__(self, simulator: 'PoWNetworkSimulator', node_id: int):
+        self.simulator = simulator
+        self.node_id = node_id
+    
+    def sendall(self, data: bytes):
+        # Strip the 4-byte length prefix added by BrokerNode.send_message
+        self.simulator.outgoing.append((self.node_id, data[4:]))
+    
+    def close(self):
+        pass
+
+
+class SimulatedMiner:
+    """
+    Miner state: hash rate and the task it is currently working on.
+    """
+    
+    def __init__(self, node_id: int, hash_rate: float):
+        self.node_id = node_id
+        self.hash_rate = hash_rate
+        self.task: Optional[Dict] = None
+        self.epoch = 0              # Incremented on every task change, invalidates pending finds
+        self.blocks_found = 0
+        self.blocks_accepted = 0
+
+
+# ================================================================================
+# DISCRETE-EVENT SIMULATOR
+# ================================================================================
+
+class PoWNetworkSimulator:
+    """
+    Discrete-event simulation of miners and a real BrokerNode.
+    """
+    
+    def __init__(self, hash_rates: List[float], difficulty: int = 20,
+                 latency: float = 0.05, latency_jitter: float = 0.02,
+                 broker_time_scale: float = 1.0, seed: Optional[int] = None,
+                 quiet: bool = True, hash_algorithm: str = 'sha256'):
+        """
+        Initialize simulator.
+        
+        Args:
+            hash_rates: Hash rate (H/s) of each simulated miner
+            difficulty: Number of leading zero bits required
+            latency: Base one-way network latency in seconds
+            latency_jitter: Mean of the exponential extra latency per message
+            broker_time_scale: Multiplier applied to measured broker service time
+            seed: Random seed for reproducible runs
+            quiet: Suppress broker console output
+            hash_algorithm: Chain hash backend (used for Merkle roots only)
+        """
+        self.difficulty = difficulty
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.broker_time_scale = broker_time_scale
+        self.quiet = quiet
+        self.rng = random.Random(seed)
+        
+        self.broker = BrokerNode(difficulty=difficulty, verifier_workers=0, verify_pow=False,
+                                 hash_algorithm=hash_algorithm, trace_report_interval=0)
+        self.broker.running = True
+        
+        self.miners = {node_id: SimulatedMiner(node_id, rate)
+                       for node_id, rate in enumerate(hash_rates, start=1)}
+        for node_id in self.miners:
+            self.broker.mining_nodes[node_id] = SimulatedSocket(self, node_id)
+        
+        # Event queue: (time, sequence, kind, payload)
+        self.now = 0.0
+        self.events = []
+        self.sequence = 0
+        self.outgoing = []          # Messages sent by the broker during the current service
+        
+        # Broker FIFO server
+        self.broker_queue = []      # [(arrival time, node_id, data)]
+        self.broker_busy = False
+        
+        # Statistics
+        self.submissions = 0
+        self.stale_submissions = 0
+        self.found_per_height: Dict[int, int] = {}
+        self.accept_times: List[float] = []
+        self.queue_waits: List[float] = []
+        self.service_times: List[float] = []
+        self.max_queue_length = 0
+    
+    def schedule(self, delay: float, kind: str, payload):
+        """Schedule an event after a delay."""
+        self.sequence += 1
+        heapq.heappush(self.events, (self.now + delay, self.sequence, kind, payload))
+    
+    def link_delay(self) -> float:
+        """Sample one-way latency of a message."""
+        return self.latency + (self.rng.expovariate(1.0 / self.latency_jitter) if self.latency_jitter > 0 else 0.0)
+    
+    def broker_call(self, function, *args):
+        """Call broker code, measuring wall time and optionally hiding its output."""
+        start_time = time.perf_counter()
+        if self.quiet:
+            with contextlib.redirect_stdout(io.StringIO()):
+                function(*args)
+        else:
+            function(*args)
+        return (time.perf_counter() - start_time) * self.broker_time_scale
+    
+    def flush_outgoing(self, send_time: float):
+        """Schedule delivery of messages the broker sent during a service."""
+        for node_id, data in self.outgoing:
+            self.sequence += 1
+            heapq.heappush(self.events, (send_time + self.link_delay(), self.sequence, 'miner_receive', (node_id, data)))
+        self.outgoing = []
+    
+    # ----------------------------------------------------------------------------
+    # Event handlers
+    # ----------------------------------------------------------------------------
+    
+    def on_miner_receive(self, node_id: int, data: bytes):
+        """Miner receives NEW_TASK or BLOCK_ACCEPTED from the broker."""
+        miner = self.miners[node_id]
+        message = pickle.loads(data)
+        
+        if message['type'] == 'BLOCK_ACCEPTED':
+            # Stop mining; a pending find for the old task becomes invalid
+            miner.epoch += 1
+            miner.task = None
+            if message['winning_node'] == node_id:
+                miner.blocks_accepted += 1
+        
+        elif message['type'] == 'NEW_TASK':
+            miner.epoch += 1
+            miner.task = message
+            rate = miner.hash_rate / (2 ** message['difficulty'])
+            self.schedule(self.rng.expovariate(rate), 'block_found', (node_id, miner.epoch))
+    
+    def on_block_found(self, node_id: int, epoch: int):
+        """Miner finds a block for its current task."""
+        miner = self.miners[node_id]
+        if epoch != miner.epoch or miner.task is None:
+            return
+        
+        task = miner.task
+        miner.blocks_found += 1
+        self.found_per_height[task['block_number']] = self.found_per_height.get(task['block_number'], 0) + 1
+        
+        block = Block(
+            merkle_root=MerkleTree.build_merkle_tree(task['transactions'], task['hash_algorithm']),
+            previous_hash=task['previous_hash'],
+            timestamp=int(self.now),
+            block_number=task['block_number'],
+            nonce=self.rng.getrandbits(32),
+            block_hash=self.rng.getrandbits(256).to_bytes(32, 'big')
+        )
+        message = {
+            'type': 'BLOCK_MINED',
+            'block': block,
+            'transactions': task['transactions'],
+            'attempts': 0,
+            'elapsed': 0
+        }
+        self.schedule(self.link_delay(), 'broker_receive', (node_id, pickle.dumps(message)))
+        
+        # Like MiningNode, stop after a submission and wait for the next task
+        miner.task = None
+    
+    def on_broker_receive(self, node_id: int, data: bytes):
+        """Submission arrives at the broker queue."""
+        self.broker_queue.append((self.now, node_id, data))
+        self.max_queue_length = max(self.max_queue_length, len(self.broker_queue))
+        if not self.broker_busy:
+            self.start_broker_service()
+    
+    def start_broker_service(self):
+        """Serve the next queued submission with the real broker code."""
+        arrival_time, node_id, data = self.broker_queue.pop(0)
+        self.queue_waits.append(self.now - arrival_time)
+        self.broker_busy = True
+        
+        message = pickle.loads(data)
+        height_before = self.broker.current_block_number
+        service_time = self.broker_call(self.broker.handle_mined_block, message, node_id)
+        self.service_times.append(service_time)
+        
+        self.submissions += 1
+        if self.broker.current_block_number == height_before:
+            self.stale_submissions += 1
+        else:
+            self.accept_times.append(self.now + service_time)
+        
+        self.flush_outgoing(self.now + service_time)
+        self.schedule(service_time, 'broker_done', None)
+    
+    def on_broker_done(self):
+        """Broker finishes a service and takes the next queued submission."""
+        self.broker_busy = False
+        if self.broker_queue:
+            self.start_broker_service()
+    
+    # ----------------------------------------------------------------------------
+    # Run
+    # ----------------------------------------------------------------------------
+    
+    def run(self, duration: float) -> Dict:
+        """
+        Simulate the network for a span of simulated time.
+        
+        Args:
+            duration: Simulated seconds
+        
+        Returns:
+            Dictionary with simulation statistics
+        """
+        wall_start = time.time()
+        
+        # Registration: every miner receives the initial task
+        self.broker.current_transactions = self.broker.select_block_transactions()
+        for node_id in self.miners:
+            self.broker.send_message(self.broker.mining_nodes[node_id], {
+                'type': 'NEW_TASK',
+                'transactions': self.broker.current_transactions,
+                'previous_hash': self.broker.previous_hash,
+                'block_number': self.broker.current_block_number,
+                'difficulty': self.difficulty,
+                'hash_algorithm': self.broker.chain_params.hash_algorithm
+            })
+        self.flush_outgoing(self.now)
+        
+        handlers = {
+            'miner_receive': lambda payload: self.on_miner_receive(*payload),
+            'block_found': lambda payload: self.on_block_found(*payload),
+            'broker_receive': lambda payload: self.on_broker_receive(*payload),
+            'broker_done': lambda payload: self.on_broker_done(),
+        }
+        
+        while self.events and self.events[0][0] <= duration:
+            self.now, _, kind, payload = heapq.heappop(self.events)
+            handlers[kind](payload)
+        
+        self.now = duration
+        return self.statistics(time.time() - wall_start)
+    
+    @staticmethod
+    def _percentile(values: List[float], q: float) -> float:
+        """Return q-th percentile (0-100) of values."""
+        if not values:
+            return 0.0
+        ordered = sorted(values)
+        return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+    
+    def statistics(self, wall_time: float) -> Dict:
+        """Collect simulation statistics."""
+        blocks = len(self.accept_times)
+        intervals = [b - a for a, b in zip([0.0] + self.accept_times, self.accept_times)]
+        forked_heights = sum(1 for count in self.found_per_height.values() if count > 1)
+        
+        return {
+            'nodes': len(self.miners),
+            'simulated_time': self.now,
+            'wall_time': wall_time,
+            'speedup': self.now / wall_time if wall_time > 0 else 0.0,
+            'blocks': blocks,
+            'mean_block_interval': sum(intervals) / blocks if blocks else 0.0,
+            'submissions': self.submissions,
+            'stale_submissions': self.stale_submissions,
+            'stale_rate': self.stale_submissions / self.submissions if self.submissions else 0.0,
+            'fork_frequency': forked_heights / blocks if blocks else 0.0,
+            'queue_wait_mean': sum(self.queue_waits) / len(self.queue_waits) if self.queue_waits else 0.0,
+            'queue_wait_p99': self._percentile(self.queue_waits, 99),
+            'service_time_mean': sum(self.service_times) / len(self.service_times) if self.service_times else 0.0,
+            'max_queue_length': self.max_queue_length,
+        }
+    
+    def close(self):
+        """Release broker resources."""
+        self.broker.verifier.close()
+        self.broker.mmr.close()
+
+
+def print_statistics(stats: Dict):
+    """Print simulation statistics."""
+    print(f"\n{'='*80}")
+    print("POW NETWORK SIMULATION RESULTS")
+    print(f"{'='*80}")
+    print(f"  Nodes:                 {stats['nodes']}")
+    print(f"  Simulated time:        {stats['simulated_time']:,.1f}s")
+    print(f"  Wall time:             {stats['wall_time']:.2f}s ({stats['speedup']:,.0f}x real time)")
+    print(f"  Blocks accepted:       {stats['blocks']:,}")
+    print(f"  Mean block interval:   {stats['mean_block_interval']:.3f}s")
+    print(f"  Submissions:           {stats['submissions']:,}")
+    print(f"  Stale rate:            {stats['stale_rate']*100:.2f}%")
+    print(f"  Fork frequency:        {stats['fork_frequency']*100:.2f}% of heights")
+    print(f"  Broker queue wait:     mean {stats['queue_wait_mean']*1000:.3f} ms, p99 {stats['queue_wait_p99']*1000:.3f} ms")
+    print(f"  Broker service time:   mean {stats['service_time_mean']*1000:.3f} ms")
+    print(f"  Max broker queue:      {stats['max_queue_length']}")
+    print(f"{'='*80}")
+
+
+if __name__ == "__main__":
+    # Usage: python pow_simulator.py [num_nodes] [simulated_seconds] [difficulty]
+    num_nodes = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    duration = float(sys.argv[2]) if len(sys.argv) > 2 else 3600.0
+    difficulty = int(sys.argv[3]) if len(sys.argv) > 3 else 24
+    
+    rng = random.Random(1)
+    # Heterogeneous miners around 350 kH/s (single Python process, see ZAD3_README.md)
+    hash_rates = [rng.lognormvariate(0, 0.5) * 350000 for _ in range(num_nodes)]
+    
+    simulator = PoWNetworkSimulator(hash_rates, difficulty=difficulty, seed=1)
+    try:
+        print_statistics(simulator.run(duration))
+    finally:
+        simulator.close()
@@ -0,0 +1,165 @@
+"""
+Lab 07 - Block Propagation Tracing
+Kryptologia - Patryk Rakowski 2025
+
+Per-block timestamps (time.monotonic, comparable between processes on one
+host) for every hop from a miner finding a block to the other miners
+abandoning the old task:
+
+    found -> sent -> broker_received -> validated -> broadcast_start
+          -> broadcast_end
+          -> miner_received -> preempted   (for every other miner)
+
+The broker collects them and reports percentiles of every stage.
+"""
+
+import threading
+from collections import OrderedDict, deque
+from typing import Dict, Optional
+
+
+# Stage name -> (start event, end event)
+BLOCK_STAGES = [
+    ('mine_to_send', 'found', 'sent'),
+    ('network_to_broker', 'sent', 'broker_received'),
+    ('validation', 'broker_received', 'validated'),
+    ('accept_to_broadcast', 'validated', 'broadcast_start'),
+    ('broadcast_send', 'broadcast_start', 'broadcast_end'),
+]
+MINER_STAGES = [
+    ('delivery', 'broadcast_start', 'miner_received'),
+    ('preemption', 'miner_received', 'preempted'),
+    ('end_to_end', 'found', 'preempted'),
+]
+
+
+class PropagationTracer:
+    """
+    Collects propagation timestamps per block and stage durations.
+    """
+    
+    def __init__(self, max_blocks: int = 1000, max_samples: int = 10000, histogram=None):
+        """
+        Initialize tracer.
+        
+        Args:
+            max_blocks: Number of recent blocks whose timestamps are kept
+            max_samples: Number of recent durations kept per stage
+            histogram: Optional metrics Histogram observed with label stage=<name>
+        """
+        self.max_blocks = max_blocks
+        self.traces = OrderedDict()     # {block_number: {'events': {...}, 'winner': node_id}}
+        self.durations: Dict[str, deque] = {name: deque(maxlen=max_samples)
+                                            for name, _, _ in BLOCK_STAGES + MINER_STAGES}
+        self.histogram = histogram
+        self.lock = threading.Lock()
+    
+    def _add_duration(self, stage: str, start: Optional[float], end: Optional[float]):
+        """Store duration of a stage if both events are known."""
+        if start is None or end is None:
+            return
+        duration = max(0.0, end - start)
+        self.durations[stage].append(duration)
+        if self.histogram is not None:
+            self.histogram.observe(duration, stage=stage)
+    
+    def record_block(self, block_number: int, winner: int, events: Dict[str, float]):
+        """
+        Record block-level events of an accepted block (before it is broadcast,
+        so that miner reports never arrive for an unknown block).
+        
+        Args:
+            block_number: Number of the accepted block
+            winner: Node id that found the block
+            events: {event name: monotonic timestamp}
+        """
+        with self.lock:
+            self.traces[block_number] = {'events': dict(events), 'winner': winner}
+            while len(self.traces) > self.max_blocks:
+                self.traces.popitem(last=False)
+            
+            for stage, start, end in BLOCK_STAGES:
+                self._add_duration(stage, events.get(start), events.get(end))
+    
+    def record_event(self, block_number: int, event: str, timestamp: float):
+        """
+        Add a late block-level event (e.g. broadcast_end) to a recorded block.
+        
+        Args:
+            block_number: Number of the accepted block
+            event: Event name
+            timestamp: Monotonic timestamp
+        """
+        with self.lock:
+            trace = self.traces.get(block_number)
+            if trace is None:
+                return
+            events = trace['events']
+            events[event] = timestamp
+            for stage, start, end in BLOCK_STAGES:
+                if end == event:
+                    self._add_duration(stage, events.get(start), timestamp)
+    
+    def record_miner(self, block_number: int, node_id: int, received: float, preempted: Optional[float]):
+        """
+        Record when another miner received the block and stopped the old task.
+        
+        Args:
+            block_number: Number of the accepted block
+            node_id: Reporting miner
+            received: Monotonic time the BLOCK_ACCEPTED message arrived
+            preempted: Monotonic time the mining worker stopped (None if it was idle)
+        """
+        with self.lock:
+            trace = self.traces.get(block_number)
+            if trace is None or trace['winner'] == node_id:
+                return
+            
+            events = dict(trace['events'], miner_received=received,
+                          preempted=preempted if preempted is not None else received)
+            for stage, start, end in MINER_STAGES:
+                self._add_duration(stage, events.get(start), events.get(end))
+    
+    @staticmethod
+    def _percentile(ordered, q: float) -> float:
+        """Return q-th percentile (0-100) of sorted values."""
+        return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+    
+    def report(self) -> Dict[str, Dict[str, float]]:
+        """
+        Compute percentile breakdown per stage.
+        
+        Returns:
+            {stage: {'count', 'p50', 'p90', 'p99', 'max'}} in seconds
+        """
+        with self.lock:
+            snapshot = {stage: sorted(values) for stage, values in self.durations.items()}
+        
+        report = {}
+        for stage, values in snapshot.items():
+            if not values:
+                continue
+            report[stage] = {
+                'count': len(values),
+                'p50': self._percentile(values, 50),
+                'p90': self._percentile(values, 90),
+                'p99': self._percentile(values, 99),
+                'max': values[-1],
+            }
+        return report
+    
+    def print_report(self):
+        """Print percentile breakdown per stage in milliseconds."""
+        report = self.report()
+        print(f"\n{'='*80}")
+        print("BLOCK PROPAGATION TRACE (ms)")
+        print(f"{'='*80}")
+        print(f"{'Stage':<22} {'Count':>7} {'p50':>10} {'p90':>10} {'p99':>10} {'max':>10}")
+        print(f"{'-'*74}")
+        for stage, _, _ in BLOCK_STAGES + MINER_STAGES:
+            if stage not in report:
+                continue
+            row = report[stage]
+            print(f"{stage:<22} {row['count']:>7} {row['p50']*1000:>10.3f} {row['p90']*1000:>10.3f} "
+                  f"{row['p99']*1000:>10.3f} {row['max']*1000:>10.3f}")
+        print(f"{'='*80}\n")
@@ -0,0 +1,228 @@
+"""
+Lab 07 - Relay Broker Fan-out Benchmark
+Kryptologia - Patryk Rakowski 2025
+
+Runs a three-tier tree on localhost (root broker -> relay brokers -> leaf
+miners) next to a flat network (every leaf on the root) and mines blocks
+through it. Per broadcast the root of the tree sends one message to every
+relay, so its cost stays the same as leaves are added, while the flat root
+sends to every leaf.
+"""
+
+import contextlib
+import os
+import sys
+import threading
+import time
+
+from blockchain_mining import BlockMiner
+from transport import connect, encode_message, read_message
+from zad3_broker import BrokerNode
+
+
+class LeafMiner:
+    """
+    Minimal mining node: records when each task arrives; the submitter also
+    mines every task (at low difficulty) and sends the block up.
+    """
+    
+    def __init__(self, node_id: int, port: int, transport: str, network, submitter: bool = False):
+        self.node_id = node_id
+        self.network = network
+        self.submitter = submitter
+        self.socket = connect(transport, 'localhost', port)
+        self.socket.sendall(encode_message({'type': 'REGISTER', 'node_id': node_id}))
+        self.thread = threading.Thread(target=self.listen, daemon=True)
+        self.thread.start()
+    
+    def listen(self):
+        """Record NEW_TASK arrivals until the connection closes."""
+        while True:
+            try:
+                message = read_message(self.socket)
+            except OSError:
+                break
+            if message is None:
+                break
+            if message['type'] != 'NEW_TASK':
+                continue
+            self.network.task_received(message['block_number'])
+            if self.submitter and message['block_number'] < self.network.num_blocks:
+                self.network.started.wait()
+                self.mine_and_submit(message)
+    
+    def mine_and_submit(self, task):
+        """Mine the task and submit the block."""
+        miner = BlockMiner(difficulty=task['difficulty'], hash_algorithm=task['hash_algorithm'])
+        block, attempts, elapsed = miner.mine_block(task['transactions'], task['previous_hash'],
+                                                    task['block_number'])
+        self.network.block_submitted(task['block_number'] + 1)
+        self.socket.sendall(encode_message({'type': 'BLOCK_MINED', 'block': block, 'attempts': attempts,
+                                            'elapsed': elapsed, 'transactions': task['transactions']}))
+    
+    def close(self):
+        self.socket.close()
+
+
+class TreeNetwork:
+    """
+    Root broker, optional relay brokers and leaf miners in one process.
+    """
+    
+    def __init__(self, num_relays: int, num_leaves: int, num_blocks: int, difficulty: int = 8,
+                 base_port: int = 5300, transport: str = 'tcp'):
+        """
+        Start the network.
+        
+        Args:
+            num_relays: Relay brokers under the root (0 = flat network)
+            num_leaves: Leaf miners, spread evenly over the relays
+            num_blocks: Number of blocks the submitting leaf mines
+            difficulty: Mining difficulty in leading zero bits
+            base_port: Root port; relay i listens on base_port + 1 + i
+            transport: 'tcp' or 'unix'
+        """
+        self.num_leaves = num_leaves
+        self.num_blocks = num_blocks
+        self.started = threading.Event()  # Mining starts once every leaf is connected
+        self.arrivals = {}          # {block_number: leaves that received its task}
+        self.submitted = {}         # {block_number: monotonic time the previous block was sent}
+        self.completed = {}         # {block_number: monotonic time the last leaf got its task}
+        self.condition = threading.Condition()
+        
+        self.root = BrokerNode(port=base_port, difficulty=difficulty, verifier_workers=0,
+                               trace_report_interval=0, transport=transport)
+        self.relays = [BrokerNode(port=base_port + 1 + i, verifier_workers=0, trace_report_interval=0,
+                                  transport=transport, upstream_port=base_port, relay_id=10000 + i)
+                       for i in range(num_relays)]
+        
+        self._start_broker(self.root)
+        for relay in self.relays:
+            self._start_broker(relay)
+        self._wait_for(lambda: len(self.root.mining_nodes) == num_relays
+                       and all(relay.upstream_task is not None for relay in self.relays))
+        
+        ports = [relay.port for relay in self.relays] or [self.root.port]
+        self.leaves = [LeafMiner(i + 1, ports[i % len(ports)], transport, self, submitter=(i == num_leaves - 1))
+                       for i in range(num_leaves)]
+        parents = self.relays or [self.root]
+        self._wait_for(lambda: sum(len(parent.mining_nodes) for parent in parents) == num_leaves)
+    
+    @staticmethod
+    def _start_broker(broker: BrokerNode):
+        threading.Thread(target=broker.start, daemon=True).start()
+        TreeNetwork._wait_for(lambda: broker.running)
+    
+    @staticmethod
+    def _wait_for(predicate, timeout: float = 30.0):
+        deadline = time.monotonic() + timeout
+        while not predicate():
+            if time.monotonic() > deadline:
+                raise TimeoutError("Network did not start")
+            time.sleep(0.01)
+    
+    def task_received(self, block_number: int):
+        """Called by a leaf when the task of a block arrives."""
+        with self.condition:
+            self.arrivals[block_number] = self.arrivals.get(block_number, 0) + 1
+            if self.arrivals[block_number] == self.num_leaves:
+                self.completed[block_number] = time.monotonic()
+                self.condition.notify_all()
+    
+    def block_submitted(self, next_block_number: int):
+        """Called by the submitting leaf when it sends a block."""
+        with self.condition:
+            self.submitted[next_block_number] = time.monotonic()
+    
+    def run(self) -> dict:
+        """
+        Mine blocks through the network.
+        
+        Returns:
+            Dictionary with root sends per broadcast, root broadcast time and
+            block-to-every-leaf latency (seconds)
+        """
+        sends_before = self.root.broadcast_sends.get()
+        broadcasts_before = self.root.broadcast_latency.get_count()
+        time_before = self.root.broadcast_latency.get_sum()
+        self.started.set()
+        
+        num_blocks = self.num_blocks
+        with self.condition:
+            if not self.condition.wait_for(lambda: num_blocks in self.completed, timeout=120):
+                raise TimeoutError(f"Only {len(self.completed)} blocks propagated")
+            latencies = sorted(self.completed[n] - self.submitted[n] for n in range(1, num_blocks + 1))
+        
+        # Every block is one BLOCK_ACCEPTED and one NEW_TASK broadcast; the last may still be timing
+        broadcasts = 2 * num_blocks
+        self._wait_for(lambda: self.root.broadcast_latency.get_count() - broadcasts_before >= broadcasts)
+        return {
+            'sends_per_broadcast': (self.root.broadcast_sends.get() - sends_before) / broadcasts,
+            'broadcast_time': (self.root.broadcast_latency.get_sum() - time_before) / broadcasts,
+            'propagation_p50': latencies[len(latencies) // 2],
+        }
+    
+    def close(self):
+        self.started.set()
+        for leaf in self.leaves:
+            leaf.close()
+        for broker in self.relays + [self.root]:
+            broker.stop()
+
+
+def benchmark_relay_fanout(leaf_counts=(4, 16, 64), num_relays: int = 4, num_blocks: int = 20,
+                           difficulty: int = 8, transport: str = 'tcp'):
+    """
+    Compare root broadcast cost of a flat network and a three-tier relay tree.
+    
+    Args:
+        leaf_counts: Numbers of leaf miners to test
+        num_relays: Relay brokers in the tree
+        num_blocks: Blocks mined per run
+        difficulty: Mining difficulty in leading zero bits
+        transport: 'tcp' or 'unix'
+    
+    Returns:
+        Dictionary {(topology, leaves): result of TreeNetwork.run}
+    """
+    print(f"\n{'='*80}")
+    print("RELAY BROKER FAN-OUT BENCHMARK")
+    print(f"{'='*80}")
+    print(f"Tree: root -> {num_relays} relays -> leaves, {num_blocks} blocks per run, "
+          f"difficulty {difficulty}, {transport}")
+    
+    results = {}
+    port = 5300
+    for num_leaves in leaf_counts:
+        for topology, relays in (('flat', 0), ('tree', num_relays)):
+            # Broker console output is not part of the measurement
+            with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                network = TreeNetwork(relays, num_leaves, num_blocks, difficulty, base_port=port, transport=transport)
+                try:
+                    results[(topology, num_leaves)] = network.run()
+                finally:
+                    network.close()
+            port += num_relays + 1
+    
+    print(f"\n{'Topology':<10} {'Leaves':>7} {'Root sends/bcast':>17} {'Root bcast (us)':>16} {'Block->leaves p50 (ms)':>23}")
+    print(f"{'-'*77}")
+    for (topology, num_leaves), row in results.items():
+        print(f"{topology:<10} {num_leaves:>7} {row['sends_per_broadcast']:>17.1f} "
+              f"{row['broadcast_time'] * 1e6:>16.1f} {row['propagation_p50'] * 1000:>23.3f}")
+    print(f"{'='*80}")
+    
+    return results
+
+
+if __name__ == "__main__":
+    # Usage: python relay_benchmark.py [max_leaves] [num_relays] [tcp|unix]
+    max_leaves = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+    num_relays = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    transport = sys.argv[3] if len(sys.argv) > 3 else 'tcp'
+    
+    leaf_counts = []
+    count = num_relays
+    while count <= max_leaves:
+        leaf_counts.append(count)
+        count *= 4
+    benchmark_relay_fanout(tuple(leaf_counts), num_relays, transport=transport)
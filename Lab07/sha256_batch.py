@@ -0,0 +1,297 @@
+"""
+Lab 07 - Vectorised SHA-256 Nonce Search
+Kryptologia - Patryk Rakowski 2025
+
+Batch evaluation of block header hashes with NumPy. The header of
+BlockMiner.compute_block_hash is merkle_root | previous_hash | timestamp |
+block_number | nonce (88 bytes) and spans two SHA-256 blocks. The first
+block does not depend on the nonce, so its compression result (midstate)
+is computed once per task; the second block is compressed for thousands
+of nonces at once as uint32 arrays.
+"""
+
+import hashlib
+import struct
+import sys
+import time
+from typing import List
+
+import numpy as np
+
+from blockchain_mining import BlockMiner
+
+
+# ================================================================================
+# SHA-256 CONSTANTS AND SCALAR COMPRESSION
+# ================================================================================
+
+K = [
+    0x428a2f98, 0x71374491, 0xb5c0fbcf, 0xe9b5dba5, 0x3956c25b, 0x59f111f1, 0x923f82a4, 0xab1c5ed5,
+    0xd807aa98, 0x12835b01, 0x243185be, 0x550c7dc3, 0x72be5d74, 0x80deb1fe, 0x9bdc06a7, 0xc19bf174,
+    0xe49b69c1, 0xefbe4786, 0x0fc19dc6, 0x240ca1cc, 0x2de92c6f, 0x4a7484aa, 0x5cb0a9dc, 0x76f988da,
+    0x983e5152, 0xa831c66d, 0xb00327c8, 0xbf597fc7, 0xc6e00bf3, 0xd5a79147, 0x06ca6351, 0x14292967,
+    0x27b70a85, 0x2e1b2138, 0x4d2c6dfc, 0x53380d13, 0x650a7354, 0x766a0abb, 0x81c2c92e, 0x92722c85,
+    0xa2bfe8a1, 0xa81a664b, 0xc24b8b70, 0xc76c51a3, 0xd192e819, 0xd6990624, 0xf40e3585, 0x106aa070,
+    0x19a4c116, 0x1e376c08, 0x2748774c, 0x34b0bcb5, 0x391c0cb3, 0x4ed8aa4a, 0x5b9cca4f, 0x682e6ff3,
+    0x748f82ee, 0x78a5636f, 0x84c87814, 0x8cc70208, 0x90befffa, 0xa4506ceb, 0xbef9a3f7, 0xc67178f2,
+]
+
+INITIAL_STATE = [
+    0x6a09e667, 0xbb67ae85, 0x3c6ef372, 0xa54ff53a, 0x510e527f, 0x9b05688c, 0x1f83d9ab, 0x5be0cd19,
+]
+
+MASK = 0xffffffff
+NONCE_SIZE = 8
+
+
+def _rotr(x: int, n: int) -> int:
+    """Rotate 32-bit integer right."""
+    return ((x >> n) | (x << (32 - n))) & MASK
+
+
+def _round(state: List[int], k: int, w: int) -> List[int]:
+    """One SHA-256 round on scalar state [a..h]."""
+    a, b, c, d, e, f, g, h = state
+    t1 = (h + (_rotr(e, 6) ^ _rotr(e, 11) ^ _rotr(e, 25)) + ((e & f) ^ (~e & g & MASK)) + k + w) & MASK
+    t2 = ((_rotr(a, 2) ^ _rotr(a, 13) ^ _rotr(a, 22)) + ((a & b) ^ (a & c) ^ (b & c))) & MASK
+    return [(t1 + t2) & MASK, a, b, c, (d + t1) & MASK, e, f, g]
+
+
+def compress(state: List[int], block: bytes) -> List[int]:
+    """
+    SHA-256 compression function on one 64-byte block.
+    
+    Args:
+        state: Eight 32-bit chaining words
+        block: 64-byte message block
+    
+    Returns:
+        New chaining words
+    """
+    w = list(struct.unpack('>16I', block))
+    for t in range(16, 64):
+        s0 = _rotr(w[t - 15], 7) ^ _rotr(w[t - 15], 18) ^ (w[t - 15] >> 3)
+        s1 = _rotr(w[t - 2], 17) ^ _rotr(w[t - 2], 19) ^ (w[t - 2] >> 10)
+        w.append((w[t - 16] + s0 + w[t - 7] + s1) & MASK)
+    
+    working = list(state)
+    for t in range(64):
+        working = _round(working, K[t], w[t])
+    return [(x + y) & MASK for x, y in zip(state, working)]
+
+
+# ================================================================================
+# VECTORISED NONCE SEARCH
+# ================================================================================
+
+def _rotr_v(x: np.ndarray, n: int) -> np.ndarray:
+    """Rotate uint32 array right."""
+    return (x >> np.uint32(n)) | (x << np.uint32(32 - n))
+
+
+def _add(*terms):
+    """Add 32-bit words mod 2^32; constant terms are summed before touching arrays."""
+    result = sum(term for term in terms if isinstance(term, int)) & MASK
+    for term in terms:
+        if not isinstance(term, int):
+            result = term + result
+    return result
+
+
+def _sigma_v(x, r1: int, r2: int, s: int):
+    """Message schedule sigma of a uint32 array (or constant word)."""
+    if isinstance(x, int):
+        return _rotr(x, r1) ^ _rotr(x, r2) ^ (x >> s)
+    return _rotr_v(x, r1) ^ _rotr_v(x, r2) ^ (x >> np.uint32(s))
+
+
+def _big_sigma_v(x, r1: int, r2: int, r3: int):
+    """Round function Sigma of a uint32 array (or constant word)."""
+    if isinstance(x, int):
+        return _rotr(x, r1) ^ _rotr(x, r2) ^ _rotr(x, r3)
+    return _rotr_v(x, r1) ^ _rotr_v(x, r2) ^ _rotr_v(x, r3)
+
+
+class BatchHeaderHasher:
+    """
+    SHA-256 of a block header for many nonces at once.
+    
+    Everything that does not depend on the nonce is precomputed per header:
+    the midstate of the complete 64-byte blocks, the constant message words
+    of the last block and the SHA-256 rounds before the first nonce word.
+    """
+    
+    def __init__(self, merkle_root: bytes, previous_hash: bytes, timestamp: int, block_number: int):
+        """
+        Precompute midstate for a header.
+        
+        Args:
+            merkle_root: Merkle tree root hash
+            previous_hash: Previous block hash
+            timestamp: Block timestamp
+            block_number: Block number
+        """
+        prefix = (merkle_root + previous_hash +
+                  timestamp.to_bytes(8, byteorder='big') +
+                  block_number.to_bytes(8, byteorder='big'))
+        message_length = len(prefix) + NONCE_SIZE
+        
+        # Midstate over all complete blocks before the nonce
+        full_blocks = len(prefix) // 64
+        self.midstate = list(INITIAL_STATE)
+        for i in range(full_blocks):
+            self.midstate = compress(self.midstate, prefix[i * 64:(i + 1) * 64])
+        
+        # Last block: tail | nonce | 0x80 | zeros | bit length
+        tail = prefix[full_blocks * 64:]
+        if len(tail) % 4 != 0 or len(tail) + NONCE_SIZE + 9 > 64:
+            raise ValueError("Nonce must be word-aligned and fit with padding in the last block")
+        last_block = (tail + b'\x00' * NONCE_SIZE + b'\x80' +
+                      b'\x00' * (55 - message_length % 64) +
+                      (message_length * 8).to_bytes(8, byteorder='big'))
+        self.words = list(struct.unpack('>16I', last_block))
+        self.nonce_word = len(tail) // 4   # Index of the high nonce word (low word follows)
+        
+        # Rounds before the nonce enters the schedule are the same for every nonce
+        self.prefix_state = list(self.midstate)
+        for t in range(self.nonce_word):
+            self.prefix_state = _round(self.prefix_state, K[t], self.words[t])
+    
+    def hash_words(self, nonces: np.ndarray, num_words: int = 8) -> List[np.ndarray]:
+        """
+        Compute the first digest words for an array of nonces.
+        
+        Args:
+            nonces: uint64 array of nonces
+            num_words: Number of 32-bit digest words to return (1-8)
+        
+        Returns:
+            List of uint32 arrays, one per digest word
+        """
+        # Constant message words stay Python ints, so schedule words that
+        # depend only on them are computed once instead of per nonce
+        w = list(self.words)
+        w[self.nonce_word] = (nonces >> np.uint64(32)).astype(np.uint32)
+        w[self.nonce_word + 1] = (nonces & np.uint64(MASK)).astype(np.uint32)
+        
+        for t in range(16, 64):
+            s0 = _sigma_v(w[t - 15], 7, 18, 3)
+            s1 = _sigma_v(w[t - 2], 17, 19, 10)
+            w.append(_add(w[t - 16], s0, w[t - 7], s1))
+        
+        a, b, c, d, e, f, g, h = self.prefix_state
+        for t in range(self.nonce_word, 64):
+            t1 = _add(h, K[t], _big_sigma_v(e, 6, 11, 25), (e & f) ^ (~e & g & MASK), w[t])
+            t2 = _add(_big_sigma_v(a, 2, 13, 22), (a & b) ^ (a & c) ^ (b & c))
+            a, b, c, d, e, f, g, h = _add(t1, t2), a, b, c, _add(d, t1), e, f, g
+        
+        final = [a, b, c, d, e, f, g, h]
+        return [final[i] + np.uint32(self.midstate[i]) for i in range(num_words)]
+    
+    def hash_batch(self, nonces: np.ndarray) -> np.ndarray:
+        """
+        Compute full header hashes for an array of nonces.
+        
+        Args:
+            nonces: uint64 array of nonces
+        
+        Returns:
+            uint8 array of shape (n, 32) with SHA-256 digests
+        """
+        words = np.stack(self.hash_words(nonces), axis=1).astype('>u4')
+        return words.view(np.uint8).reshape(len(nonces), 32)
+    
+    def search(self, start_nonce: int, count: int, difficulty: int) -> np.ndarray:
+        """
+        Find nonces whose header hash has enough leading zero bits.
+        
+        Args:
+            start_nonce: First nonce of the range
+            count: Number of consecutive nonces to evaluate
+            difficulty: Number of leading zero bits required
+        
+        Returns:
+            Indices (relative to start_nonce) of the winning nonces, ascending
+        """
+        nonces = np.arange(start_nonce, start_nonce + count, dtype=np.uint64)
+        num_words = min(8, difficulty // 32 + 1)
+        words = self.hash_words(nonces, num_words)
+        
+        # Leading zero bits: whole zero words, then the remaining bits of the next word
+        mask = np.ones(count, dtype=bool)
+        remaining = difficulty
+        for word in words:
+            bits = min(remaining, 32)
+            if bits == 0:
+                break
+            mask &= (word >> np.uint32(32 - bits)) == 0 if bits < 32 else word == 0
+            remaining -= bits
+        return np.flatnonzero(mask)
+
+
+# ================================================================================
+# BENCHMARK
+# ================================================================================
+
+def benchmark_nonce_search(num_nonces: int = 1 << 20, batch_size: int = 1 << 14, difficulty: int = 16):
+    """
+    Compare scalar hashlib nonce search with the vectorised engine.
+    
+    Args:
+        num_nonces: Number of nonces evaluated by each engine
+        batch_size: Nonces per NumPy batch
+        difficulty: Number of leading zero bits required
+    """
+    miner = BlockMiner(difficulty=difficulty)
+    merkle_root = hashlib.sha256(b"benchmark").digest()
+    previous_hash = b'\x00' * 32
+    timestamp = int(time.time())
+    block_number = 1
+    
+    print(f"\n{'='*80}")
+    print("SHA-256 NONCE SEARCH BENCHMARK")
+    print(f"{'='*80}")
+    print(f"Nonces: {num_nonces:,}, batch size: {batch_size:,}, difficulty: {difficulty} bits")
+    
+    # Correctness against hashlib
+    hasher = BatchHeaderHasher(merkle_root, previous_hash, timestamp, block_number)
+    sample = np.array([0, 1, 2 ** 32 - 1, 2 ** 32, 2 ** 63 + 12345], dtype=np.uint64)
+    digests = hasher.hash_batch(sample)
+    for nonce, digest in zip(sample.tolist(), digests):
+        expected = miner.compute_block_hash(merkle_root, previous_hash, timestamp, block_number, nonce)
+        assert digest.tobytes() == expected, f"Mismatch for nonce {nonce}"
+    print("Vectorised digests match hashlib")
+    
+    # Scalar path
+    scalar_found = []
+    start_time = time.perf_counter()
+    for nonce in range(num_nonces):
+        block_hash = miner.compute_block_hash(merkle_root, previous_hash, timestamp, block_number, nonce)
+        if miner.hash_has_leading_zero_bits(block_hash, difficulty):
+            scalar_found.append(nonce)
+    scalar_time = time.perf_counter() - start_time
+    
+    # Vectorised path (midstate computed once per header)
+    vector_found = []
+    start_time = time.perf_counter()
+    hasher = BatchHeaderHasher(merkle_root, previous_hash, timestamp, block_number)
+    for start in range(0, num_nonces, batch_size):
+        count = min(batch_size, num_nonces - start)
+        vector_found.extend((hasher.search(start, count, difficulty) + start).tolist())
+    vector_time = time.perf_counter() - start_time
+    
+    assert vector_found == scalar_found, "Vectorised search found different nonces"
+    
+    print(f"\n{'Engine':<20} {'Time':>10} {'Hash rate':>16} {'Found':>8}")
+    print(f"{'-'*58}")
+    print(f"{'scalar (hashlib)':<20} {scalar_time:>9.2f}s {num_nonces / scalar_time:>12,.0f} H/s {len(scalar_found):>8}")
+    print(f"{'vectorised (numpy)':<20} {vector_time:>9.2f}s {num_nonces / vector_time:>12,.0f} H/s {len(vector_found):>8}")
+    print(f"\nSpeedup: {scalar_time / vector_time:.2f}x")
+    print(f"{'='*80}")
+
+
+if __name__ == "__main__":
+    # Usage: python sha256_batch.py [num_nonces] [batch_size]
+    num_nonces = int(sys.argv[1]) if len(sys.argv) > 1 else 1 << 20
+    batch_size = int(sys.argv[2]) if len(sys.argv) > 2 else 1 << 14
+    benchmark_nonce_search(num_nonces, batch_size)
@@ -0,0 +1,301 @@
+"""
+Lab 07 - Signed Transactions
+Kryptologia - Patryk Rakowski 2025
+
+Transactions signed with RSA-FDH from Lab03 and a batched, parallel
+signature verifier with a cache of already verified transactions.
+"""
+
+import hashlib
+import os
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+# Add Lab03 to the path so the RSA-FDH implementation can be reused
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'Lab03'))
+
+from lab03 import generate_rsa_keys, sign_message_fdh, verify_signature_fdh
+from blockchain_mining import MerkleTree
+
+
+# Sender of a transfer payload "TX_<id>: SENDER -> RECEIVER [AMOUNT units]"
+SENDER_PATTERN = re.compile(r'(\S+) -> \S+ \[\d+ units\]')
+
+
+def account_id(public_key: Tuple[int, int]) -> str:
+    """
+    Return the account name owned by a public key.
+    
+    The account is the SHA-256 fingerprint of "<e hex>:<n hex>" (first 20 bytes),
+    so only the holder of the matching private key can spend from it.
+    
+    Args:
+        public_key: RSA public key (e, n)
+    
+    Returns:
+        Account name (40 hex characters)
+    """
+    e, n = public_key
+    return hashlib.sha256(f"{e:x}:{n:x}".encode('ascii')).hexdigest()[:40]
+
+
+# ================================================================================
+# SIGNED TRANSACTION
+# ================================================================================
+
+@dataclass
+class SignedTransaction:
+    """
+    Transaction payload signed with RSA-FDH.
+    
+    Signed transactions travel through the network as plain strings
+    (see encode/decode), so the Merkle tree commits to the payload,
+    the signature and the signer's public key at once.
+    """
+    payload: str                # Transaction text, e.g. "A -> B [10 units]"
+    signature: int              # RSA-FDH signature of the payload
+    public_key: Tuple[int, int] # Signer's public key (e, n)
+    
+    @classmethod
+    def create(cls, payload: str, private_key: Tuple[int, int],
+               public_key: Tuple[int, int]) -> 'SignedTransaction':
+        """
+        Sign a transaction payload.
+        
+        Args:
+            payload: Transaction text
+            private_key: Signer's private key (d, n)
+            public_key: Signer's public key (e, n)
+        
+        Returns:
+            Signed transaction
+        """
+        signature, _ = sign_message_fdh(payload, private_key)
+        return cls(payload=payload, signature=signature, public_key=public_key)
+    
+    def encode(self) -> str:
+        """Encode transaction as a string: payload|sig=<hex>|key=<e hex>:<n hex>"""
+        e, n = self.public_key
+        return f"{self.payload}|sig={self.signature:x}|key={e:x}:{n:x}"
+    
+    @classmethod
+    def decode(cls, encoded: str) -> Optional['SignedTransaction']:
+        """
+        Decode a transaction string.
+        
+        Args:
+            encoded: Transaction string
+        
+        Returns:
+            SignedTransaction, or None if the string is not a signed transaction
+        """
+        parts = encoded.rsplit('|', 2)
+        if len(parts) != 3:
+            return None
+        
+        payload, sig_part, key_part = parts
+        if not sig_part.startswith('sig=') or not key_part.startswith('key='):
+            return None
+        
+        try:
+            signature = int(sig_part[4:], 16)
+            e_hex, n_hex = key_part[4:].split(':')
+            public_key = (int(e_hex, 16), int(n_hex, 16))
+        except ValueError:
+            return None
+        
+        return cls(payload=payload, signature=signature, public_key=public_key)
+    
+    def sender_matches_key(self) -> bool:
+        """Check that a transfer is paid from the account of the signing key."""
+        match = SENDER_PATTERN.search(self.payload)
+        return match is None or match.group(1) == account_id(self.public_key)
+    
+    def verify(self) -> bool:
+        """Verify the RSA-FDH signature of the payload and that the signer owns the sender account."""
+        return (self.sender_matches_key() and
+                verify_signature_fdh(self.payload.encode('utf-8'), self.signature, self.public_key))
+
+
+def _verify_chunk(chunk: List[Tuple[bytes, int, Tuple[int, int]]]) -> List[bool]:
+    """Verify a chunk of (message_bytes, signature, public_key) in a worker process."""
+    return [verify_signature_fdh(message, signature, public_key)
+            for message, signature, public_key in chunk]
+
+
+# ================================================================================
+# BATCHED SIGNATURE VERIFIER
+# ================================================================================
+
+class SignatureVerifier:
+    """
+    Verifies transaction signatures in parallel batches.
+    
+    Results are cached by transaction hash (MerkleTree.compute_hash of the
+    encoded transaction), so a transaction admitted to the mempool is not
+    verified again when the block containing it is validated.
+    """
+    
+    def __init__(self, max_workers: Optional[int] = None, batch_size: int = 64,
+                 cache_size: int = 100000, hash_algorithm: str = 'sha256'):
+        """
+        Initialize signature verifier.
+        
+        Args:
+            max_workers: Number of worker processes (None = CPU count, 0 = verify inline)
+            batch_size: Number of signatures sent to a worker at once
+            cache_size: Maximum number of cached verification results
+            hash_algorithm: Hash backend of the transaction hashes (the chain's algorithm)
+        """
+        if max_workers is None:
+            max_workers = os.cpu_count() or 1
+        
+        self.max_workers = max_workers
+        self.batch_size = batch_size
+        self.cache_size = cache_size
+        self.hash_algorithm = hash_algorithm
+        
+        self.cache = OrderedDict()  # {tx_hash: bool}
+        self.cache_lock = threading.Lock()
+        self.pool = ProcessPoolExecutor(max_workers=max_workers) if max_workers > 0 else None
+        
+        # Statistics
+        self.verified_count = 0
+        self.cache_hits = 0
+        self.verify_time = 0.0
+    
+    def verify_transactions(self, transactions: List[str]) -> List[bool]:
+        """
+        Verify a list of encoded transactions.
+        
+        Strings that are not signed transactions, and transfers whose sender
+        is not the account of the signing key, are reported as invalid.
+        
+        Args:
+            transactions: Encoded transactions
+        
+        Returns:
+            List of verification results, in input order
+        """
+        results: List[Optional[bool]] = [None] * len(transactions)
+        pending = []  # [(index, tx_hash, (message, signature, public_key))]
+        
+        for i, encoded in enumerate(transactions):
+            tx_hash = MerkleTree.compute_hash(encoded, self.hash_algorithm)
+            
+            with self.cache_lock:
+                cached = self.cache.get(tx_hash)
+                if cached is not None:
+                    self.cache.move_to_end(tx_hash)
+                    self.cache_hits += 1
+            
+            if cached is not None:
+                results[i] = cached
+                continue
+            
+            tx = SignedTransaction.decode(encoded)
+            if tx is None:
+                results[i] = False
+                continue
+            if not tx.sender_matches_key():
+                results[i] = False
+                self._cache_result(tx_hash, False)
+                continue
+            
+            pending.append((i, tx_hash, (tx.payload.encode('utf-8'), tx.signature, tx.public_key)))
+        
+        if pending:
+            start_time = time.time()
+            items = [item for _, _, item in pending]
+            chunks = [items[i:i + self.batch_size] for i in range(0, len(items), self.batch_size)]
+            
+            if self.pool is not None and len(chunks) > 1:
+                chunk_results = list(self.pool.map(_verify_chunk, chunks))
+            else:
+                chunk_results = [_verify_chunk(chunk) for chunk in chunks]
+            
+            verified = [ok for chunk in chunk_results for ok in chunk]
+            for (i, tx_hash, _), ok in zip(pending, verified):
+                results[i] = ok
+                self._cache_result(tx_hash, ok)
+            
+            self.verified_count += len(pending)
+            self.verify_time += time.time() - start_time
+        
+        return results
+    
+    def _cache_result(self, tx_hash: bytes, ok: bool):
+        """Store verification result, evicting the least recently used entry."""
+        with self.cache_lock:
+            self.cache[tx_hash] = ok
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+    
+    def stats(self) -> Dict:
+        """Return verification statistics."""
+        return {
+            'verified': self.verified_count,
+            'cache_hits': self.cache_hits,
+            'cached': len(self.cache),
+            'verify_time': self.verify_time,
+            'signatures_per_second': self.verified_count / self.verify_time if self.verify_time > 0 else 0.0
+        }
+    
+    def close(self):
+        """Shut down the worker pool."""
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+
+# ================================================================================
+# BENCHMARK
+# ================================================================================
+
+def benchmark_verification(num_transactions: int = 2000, key_bits: int = 2048,
+                           workers_list: Tuple[int, ...] = (0, 1, 2, 4)):
+    """
+    Measure signature verification throughput for different worker counts.
+    
+    Args:
+        num_transactions: Number of signed transactions to verify
+        key_bits: RSA key size
+        workers_list: Worker process counts to compare (0 = inline)
+    """
+    print(f"Generating {key_bits}-bit RSA key...")
+    public_key, private_key, _, _, _ = generate_rsa_keys(key_bits)
+    
+    print(f"Signing {num_transactions:,} transactions...")
+    sender = account_id(public_key)
+    transactions = [
+        SignedTransaction.create(f"TX_{i}: {sender} -> BOB [{i % 1000 + 1} units] nonce={i}",
+                                 private_key, public_key).encode()
+        for i in range(num_transactions)
+    ]
+    
+    print(f"\n{'Workers':<10} {'Time (s)':<12} {'Sig/s':<15} {'Cached re-check (s)':<20}")
+    print("-" * 60)
+    for workers in workers_list:
+        verifier = SignatureVerifier(max_workers=workers)
+        start_time = time.time()
+        results = verifier.verify_transactions(transactions)
+        elapsed = time.time() - start_time
+        
+        # Second pass is served entirely from the cache
+        start_time = time.time()
+        verifier.verify_transactions(transactions)
+        cached_elapsed = time.time() - start_time
+        verifier.close()
+        
+        assert all(results)
+        print(f"{workers:<10} {elapsed:<12.3f} {num_transactions/elapsed:<15,.0f} {cached_elapsed:<20.4f}")
+
+
+if __name__ == "__main__":
+    benchmark_verification()
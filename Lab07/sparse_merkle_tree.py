@@ -0,0 +1,260 @@
+"""
+Lab 07 - Sparse Merkle Tree
+Kryptologia - Patryk Rakowski 2025
+
+Authenticated key-value map over 256-bit keys (e.g. account hashes), built
+on the SHA-256 of MerkleTree. Empty subtrees hash to precomputed defaults,
+so only paths to existing leaves are ever hashed. Leaves are the source of
+truth; internal nodes are kept in a bounded LRU cache and recomputed from
+the leaves below them when evicted.
+"""
+
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple, Union
+
+from blockchain_mining import MerkleTree
+
+
+DEPTH = 256
+
+
+def _compute_default_hashes(depth: int) -> List[bytes]:
+    """Hashes of empty subtrees for heights 0..depth."""
+    defaults = [MerkleTree.compute_hash(b"")]
+    for _ in range(depth):
+        defaults.append(MerkleTree.compute_hash(defaults[-1] + defaults[-1]))
+    return defaults
+
+
+DEFAULT_HASHES = _compute_default_hashes(DEPTH)
+
+
+def account_key(account: str) -> bytes:
+    """Return 256-bit tree key of an account name."""
+    return MerkleTree.compute_hash(account)
+
+
+@dataclass
+class SparseMerkleProof:
+    """
+    Membership or non-membership proof for one key.
+    
+    Only non-default siblings are included; bit h of the bitmap tells
+    whether the sibling at height h is present in the list.
+    """
+    key: bytes                          # 256-bit key
+    value: Optional[bytes]              # Leaf value, None for non-membership
+    bitmap: int                         # Bit h set = sibling at height h is non-default
+    siblings: List[bytes]               # Non-default siblings, leaf to root
+
+
+class SparseMerkleTree:
+    """
+    Sparse Merkle tree of depth 256.
+    """
+    
+    def __init__(self, cache_size: int = 100000):
+        """
+        Initialize empty tree.
+        
+        Args:
+            cache_size: Maximum number of cached internal nodes
+        """
+        self.cache_size = cache_size
+        self.leaves: Dict[int, bytes] = {}     # {key: value}
+        self.sorted_keys: List[int] = []        # Leaf keys in order, for subtree range queries
+        self.cache = OrderedDict()              # {(height, prefix): hash}
+        self.root = DEFAULT_HASHES[DEPTH]
+        
+        # Statistics
+        self.cache_hits = 0
+        self.cache_misses = 0
+    
+    @staticmethod
+    def _leaf_hash(value: bytes) -> bytes:
+        """Hash of a leaf holding a value."""
+        return MerkleTree.compute_hash(b'\x00' + value)
+    
+    @staticmethod
+    def _to_bytes(value: Union[str, bytes]) -> bytes:
+        """Encode value as bytes."""
+        return value.encode('utf-8') if isinstance(value, str) else value
+    
+    # ----------------------------------------------------------------------------
+    # Node access
+    # ----------------------------------------------------------------------------
+    
+    def _cache_put(self, height: int, prefix: int, node: bytes):
+        """Store an internal node, evicting the least recently used one."""
+        if node == DEFAULT_HASHES[height]:
+            self.cache.pop((height, prefix), None)
+            return
+        self.cache[(height, prefix)] = node
+        self.cache.move_to_end((height, prefix))
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+    
+    def _leaf_range(self, height: int, prefix: int) -> Tuple[int, int]:
+        """Return index range of sorted_keys under a subtree."""
+        lo = bisect_left(self.sorted_keys, prefix << height)
+        hi = bisect_left(self.sorted_keys, (prefix + 1) << height, lo)
+        return lo, hi
+    
+    def _get_node(self, height: int, prefix: int) -> bytes:
+        """Return hash of the subtree at given height and prefix."""
+        if height == 0:
+            value = self.leaves.get(prefix)
+            return DEFAULT_HASHES[0] if value is None else self._leaf_hash(value)
+        
+        node = self.cache.get((height, prefix))
+        if node is not None:
+            self.cache.move_to_end((height, prefix))
+            self.cache_hits += 1
+            return node
+        
+        lo, hi = self._leaf_range(height, prefix)
+        if lo == hi:
+            return DEFAULT_HASHES[height]
+        
+        # Evicted (or never cached) node: recompute from the leaves below it
+        self.cache_misses += 1
+        if hi - lo == 1:
+            node = self._single_leaf_subtree(height, self.sorted_keys[lo])
+        else:
+            node = MerkleTree.compute_hash(self._get_node(height - 1, prefix << 1) +
+                                           self._get_node(height - 1, (prefix << 1) | 1))
+        self._cache_put(height, prefix, node)
+        return node
+    
+    def _single_leaf_subtree(self, height: int, key: int) -> bytes:
+        """Hash of a subtree that contains exactly one leaf (all siblings are default)."""
+        node = self._leaf_hash(self.leaves[key])
+        for h in range(height):
+            if (key >> h) & 1:
+                node = MerkleTree.compute_hash(DEFAULT_HASHES[h] + node)
+            else:
+                node = MerkleTree.compute_hash(node + DEFAULT_HASHES[h])
+        return node
+    
+    # ----------------------------------------------------------------------------
+    # Updates
+    # ----------------------------------------------------------------------------
+    
+    def _set_leaf(self, key: int, value: Optional[bytes]):
+        """Insert, replace or (value None) remove a leaf."""
+        if value is None:
+            if key in self.leaves:
+                del self.leaves[key]
+                self.sorted_keys.pop(bisect_left(self.sorted_keys, key))
+        else:
+            if key not in self.leaves:
+                insort(self.sorted_keys, key)
+            self.leaves[key] = value
+    
+    def update(self, key: bytes, value: Optional[Union[str, bytes]]) -> bytes:
+        """
+        Set the value of a key and recompute its path to the root.
+        
+        Args:
+            key: 256-bit key
+            value: New value, None removes the key
+        
+        Returns:
+            New root hash
+        """
+        return self.batch_update({key: value})
+    
+    def batch_update(self, items: Dict[bytes, Optional[Union[str, bytes]]]) -> bytes:
+        """
+        Set many keys and recompute their paths level by level.
+        
+        Paths that meet are recomputed only once above the meeting point,
+        so k keys cost far less than k separate updates.
+        
+        Args:
+            items: {key: value}, None values remove keys
+        
+        Returns:
+            New root hash
+        """
+        dirty = set()
+        for key, value in items.items():
+            key_int = int.from_bytes(key, 'big')
+            self._set_leaf(key_int, None if value is None else self._to_bytes(value))
+            dirty.add(key_int)
+        
+        for height in range(1, DEPTH + 1):
+            parents = {prefix >> 1 for prefix in dirty}
+            for parent in parents:
+                lo, hi = self._leaf_range(height, parent)
+                if lo == hi:
+                    node = DEFAULT_HASHES[height]
+                else:
+                    node = MerkleTree.compute_hash(self._get_node(height - 1, parent << 1) +
+                                                   self._get_node(height - 1, (parent << 1) | 1))
+                self._cache_put(height, parent, node)
+                if height == DEPTH:
+                    self.root = node
+            dirty = parents
+        
+        return self.root
+    
+    def get(self, key: bytes) -> Optional[bytes]:
+        """Return value of a key, or None if absent."""
+        return self.leaves.get(int.from_bytes(key, 'big'))
+    
+    # ----------------------------------------------------------------------------
+    # Proofs
+    # ----------------------------------------------------------------------------
+    
+    def prove(self, key: bytes) -> SparseMerkleProof:
+        """
+        Build a membership (key present) or non-membership (key absent) proof.
+        
+        Args:
+            key: 256-bit key
+        
+        Returns:
+            SparseMerkleProof with at most 256 sibling hashes
+        """
+        key_int = int.from_bytes(key, 'big')
+        bitmap = 0
+        siblings = []
+        
+        for height in range(DEPTH):
+            sibling = self._get_node(height, (key_int >> height) ^ 1)
+            if sibling != DEFAULT_HASHES[height]:
+                bitmap |= 1 << height
+                siblings.append(sibling)
+        
+        return SparseMerkleProof(key=key, value=self.leaves.get(key_int), bitmap=bitmap, siblings=siblings)
+    
+    @staticmethod
+    def verify_proof(root: bytes, proof: SparseMerkleProof) -> bool:
+        """
+        Verify a membership or non-membership proof against a root.
+        
+        Args:
+            root: Trusted root hash
+            proof: Proof from prove()
+        
+        Returns:
+            True if the key maps to proof.value (or is absent if value is None)
+        """
+        key_int = int.from_bytes(proof.key, 'big')
+        node = DEFAULT_HASHES[0] if proof.value is None else SparseMerkleTree._leaf_hash(proof.value)
+        siblings = iter(proof.siblings)
+        
+        try:
+            for height in range(DEPTH):
+                sibling = next(siblings) if (proof.bitmap >> height) & 1 else DEFAULT_HASHES[height]
+                if (key_int >> height) & 1:
+                    node = MerkleTree.compute_hash(sibling + node)
+                else:
+                    node = MerkleTree.compute_hash(node + sibling)
+        except StopIteration:
+            return False
+        
+        return node == root and next(siblings, None) is None
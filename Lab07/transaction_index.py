@@ -0,0 +1,358 @@
+"""
+Lab 07 - Transaction Index
+Kryptologia - Patryk Rakowski 2025
+
+Persistent index from transaction hash (MerkleTree.compute_hash) to
+(block number, leaf index). New entries go to an append-only log and an
+in-memory table; full tables are written as sorted fixed-size segment
+files that are searched with binary search. A Bloom filter in front of
+the index answers most negative lookups without touching the disk.
+"""
+
+import math
+import mmap
+import os
+import struct
+from bisect import bisect_left
+from typing import Dict, List, Optional, Tuple, Union
+
+from blockchain_mining import MerkleTree
+
+
+# Record: tx hash (32 B) | block number (8 B) | leaf index (4 B)
+RECORD_FORMAT = '>32sQI'
+RECORD_SIZE = struct.calcsize(RECORD_FORMAT)
+
+
+# ================================================================================
+# BLOOM FILTER
+# ================================================================================
+
+class BloomFilter:
+    """
+    Bloom filter over 32-byte hashes.
+    
+    Keys are already digests of the chain's hash algorithm, so the k bit positions are derived
+    from the key itself by double hashing instead of rehashing it k times.
+    """
+    
+    def __init__(self, capacity: int, false_positive_rate: float = 0.01):
+        """
+        Initialize Bloom filter.
+        
+        Args:
+            capacity: Expected number of keys
+            false_positive_rate: Target false positive rate at full capacity
+        """
+        self.capacity = max(capacity, 1)
+        self.false_positive_rate = false_positive_rate
+        
+        # m = -n ln p / (ln 2)^2, k = m/n ln 2
+        self.num_bits = max(8, int(-self.capacity * math.log(false_positive_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.num_bits / self.capacity * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+    
+    def _positions(self, key: bytes):
+        """Yield bit positions of a key."""
+        h1 = int.from_bytes(key[0:8], 'big')
+        h2 = int.from_bytes(key[8:16], 'big') | 1
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+    
+    def add(self, key: bytes):
+        """Add a key to the filter."""
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+    
+    def might_contain(self, key: bytes) -> bool:
+        """Return False if the key is definitely absent, True if it may be present."""
+        for position in self._positions(key):
+            if not self.bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+
+# ================================================================================
+# SORTED SEGMENT FILE
+# ================================================================================
+
+class _SegmentKeys:
+    """Sequence view of the hashes in a memory-mapped segment (for bisect)."""
+    
+    def __init__(self, mm: mmap.mmap, count: int):
+        self.mm = mm
+        self.count = count
+    
+    def __len__(self):
+        return self.count
+    
+    def __getitem__(self, i: int) -> bytes:
+        offset = i * RECORD_SIZE
+        return self.mm[offset:offset + 32]
+
+
+class IndexSegment:
+    """
+    Immutable file of records sorted by transaction hash.
+    """
+    
+    def __init__(self, path: str):
+        """
+        Open a segment file.
+        
+        Args:
+            path: Segment file path
+        """
+        self.path = path
+        self.file = open(path, 'rb')
+        self.count = os.path.getsize(path) // RECORD_SIZE
+        self.mm = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if self.count else None
+    
+    @staticmethod
+    def write(path: str, records: List[Tuple[bytes, int, int]]):
+        """
+        Write sorted records to a new segment file.
+        
+        Args:
+            path: Segment file path
+            records: List of (tx_hash, block_number, leaf_index)
+        """
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(b''.join(struct.pack(RECORD_FORMAT, *record) for record in sorted(records)))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    
+    def lookup(self, tx_hash: bytes) -> Optional[Tuple[int, int]]:
+        """Binary search for a transaction hash."""
+        if self.mm is None:
+            return None
+        
+        keys = _SegmentKeys(self.mm, self.count)
+        i = bisect_left(keys, tx_hash)
+        if i < self.count and keys[i] == tx_hash:
+            _, block_number, leaf_index = struct.unpack_from(RECORD_FORMAT, self.mm, i * RECORD_SIZE)
+            return block_number, leaf_index
+        return None
+    
+    def records(self):
+        """Iterate over all records in hash order."""
+        for i in range(self.count):
+            yield struct.unpack_from(RECORD_FORMAT, self.mm, i * RECORD_SIZE)
+    
+    def close(self):
+        """Close the segment file."""
+        if self.mm is not None:
+            self.mm.close()
+        self.file.close()
+
+
+# ================================================================================
+# TRANSACTION INDEX
+# ================================================================================
+
+class TransactionIndex:
+    """
+    Persistent transaction hash -> (block number, leaf index) index.
+    
+    Blocks are added incrementally; each addition is appended to a log
+    file first, so the in-memory table can be rebuilt after a restart.
+    """
+    
+    def __init__(self, directory: str, flush_threshold: int = 100000,
+                 max_segments: int = 8, false_positive_rate: float = 0.01,
+                 hash_algorithm: str = 'sha256'):
+        """
+        Open (or create) an index directory.
+        
+        Args:
+            directory: Directory holding the log and segment files
+            flush_threshold: Number of in-memory entries written out as one segment
+            max_segments: Number of segments that triggers a merge into one
+            false_positive_rate: Bloom filter false positive rate
+            hash_algorithm: Hash backend of the transaction hashes (the chain's algorithm)
+        """
+        self.directory = directory
+        self.flush_threshold = flush_threshold
+        self.max_segments = max_segments
+        self.false_positive_rate = false_positive_rate
+        self.hash_algorithm = hash_algorithm
+        
+        os.makedirs(directory, exist_ok=True)
+        self.log_path = os.path.join(directory, 'index.log')
+        
+        self.memtable: Dict[bytes, Tuple[int, int]] = {}
+        self.segments: List[IndexSegment] = []
+        self.next_segment_id = 0
+        self.bloom = BloomFilter(flush_threshold, false_positive_rate)
+        
+        self._load()
+        self.log_file = open(self.log_path, 'ab')
+    
+    def _load(self):
+        """Open existing segments and replay the log into the memtable."""
+        names = sorted(name for name in os.listdir(self.directory)
+                       if name.startswith('segment_') and name.endswith('.idx'))
+        for name in names:
+            self.segments.append(IndexSegment(os.path.join(self.directory, name)))
+            self.next_segment_id = int(name[8:-4]) + 1
+        
+        if os.path.exists(self.log_path):
+            with open(self.log_path, 'rb') as f:
+                data = f.read()
+            valid_size = len(data) - len(data) % RECORD_SIZE
+            for offset in range(0, valid_size, RECORD_SIZE):
+                tx_hash, block_number, leaf_index = struct.unpack_from(RECORD_FORMAT, data, offset)
+                self.memtable[tx_hash] = (block_number, leaf_index)
+            
+            # A torn record at the end of the log is cut off, so appended records stay aligned
+            if valid_size < len(data):
+                with open(self.log_path, 'r+b') as f:
+                    f.truncate(valid_size)
+        
+        self._rebuild_bloom()
+    
+    def _rebuild_bloom(self):
+        """Rebuild the Bloom filter sized for the current number of entries."""
+        total = len(self.memtable) + sum(segment.count for segment in self.segments)
+        self.bloom = BloomFilter(max(total * 2, self.flush_threshold), self.false_positive_rate)
+        for segment in self.segments:
+            for tx_hash, _, _ in segment.records():
+                self.bloom.add(tx_hash)
+        for tx_hash in self.memtable:
+            self.bloom.add(tx_hash)
+    
+    def add_block(self, block_number: int, transactions: List[Union[str, bytes]]):
+        """
+        Index all transactions of an accepted block.
+        
+        Args:
+            block_number: Number of the block
+            transactions: Transactions in Merkle leaf order
+        """
+        records = [(MerkleTree.compute_hash(tx, self.hash_algorithm), block_number, leaf_index)
+                   for leaf_index, tx in enumerate(transactions)]
+        
+        self.log_file.write(b''.join(struct.pack(RECORD_FORMAT, *record) for record in records))
+        self.log_file.flush()
+        
+        for tx_hash, number, leaf_index in records:
+            self.memtable[tx_hash] = (number, leaf_index)
+            self.bloom.add(tx_hash)
+        
+        if self.bloom.count > self.bloom.capacity:
+            self._rebuild_bloom()
+        
+        if len(self.memtable) >= self.flush_threshold:
+            self.flush()
+    
+    def lookup(self, tx_hash: bytes) -> Optional[Tuple[int, int]]:
+        """
+        Find the block containing a transaction.
+        
+        Args:
+            tx_hash: Transaction hash (MerkleTree.compute_hash)
+        
+        Returns:
+            Tuple of (block number, leaf index), or None if not indexed
+        """
+        if not self.bloom.might_contain(tx_hash):
+            return None
+        
+        location = self.memtable.get(tx_hash)
+        if location is not None:
+            return location
+        
+        # Newest segments first
+        for segment in reversed(self.segments):
+            location = segment.lookup(tx_hash)
+            if location is not None:
+                return location
+        
+        return None
+    
+    def lookup_transaction(self, transaction: Union[str, bytes]) -> Optional[Tuple[int, int]]:
+        """Find the block containing a transaction given its content."""
+        return self.lookup(MerkleTree.compute_hash(transaction, self.hash_algorithm))
+    
+    def flush(self):
+        """Write the memtable as a new sorted segment and truncate the log."""
+        if not self.memtable:
+            return
+        
+        path = os.path.join(self.directory, f'segment_{self.next_segment_id:06d}.idx')
+        IndexSegment.write(path, [(tx_hash, block_number, leaf_index)
+                                  for tx_hash, (block_number, leaf_index) in self.memtable.items()])
+        self.segments.append(IndexSegment(path))
+        self.next_segment_id += 1
+        
+        self.memtable = {}
+        self.log_file.close()
+        self.log_file = open(self.log_path, 'wb')
+        
+        if len(self.segments) > self.max_segments:
+            self.merge_segments()
+    
+    def truncate(self, block_count: int):
+        """
+        Drop entries of blocks from block_count on (e.g. blocks past the recovered chain tip).
+        
+        Args:
+            block_count: Number of blocks to keep
+        """
+        removed = [tx_hash for tx_hash, (block_number, _) in self.memtable.items() if block_number >= block_count]
+        if removed:
+            for tx_hash in removed:
+                del self.memtable[tx_hash]
+            
+            # Rewrite the log with the remaining entries
+            self.log_file.close()
+            tmp_path = self.log_path + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(b''.join(struct.pack(RECORD_FORMAT, tx_hash, block_number, leaf_index)
+                                 for tx_hash, (block_number, leaf_index) in self.memtable.items()))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.log_path)
+            self.log_file = open(self.log_path, 'ab')
+        
+        stale_segments = any(block_number >= block_count
+                             for segment in self.segments for _, block_number, _ in segment.records())
+        if stale_segments:
+            self.merge_segments(block_count)
+        
+        if removed or stale_segments:
+            self._rebuild_bloom()
+    
+    def merge_segments(self, block_count: Optional[int] = None):
+        """
+        Merge all segments into one (newer entries win on duplicates).
+        
+        Args:
+            block_count: Drop entries of blocks from this number on (None = keep all)
+        """
+        merged: Dict[bytes, Tuple[int, int]] = {}
+        for segment in self.segments:
+            for tx_hash, block_number, leaf_index in segment.records():
+                if block_count is None or block_number < block_count:
+                    merged[tx_hash] = (block_number, leaf_index)
+        
+        path = os.path.join(self.directory, f'segment_{self.next_segment_id:06d}.idx')
+        IndexSegment.write(path, [(tx_hash, block_number, leaf_index)
+                                  for tx_hash, (block_number, leaf_index) in merged.items()])
+        self.next_segment_id += 1
+        
+        for segment in self.segments:
+            segment.close()
+            os.remove(segment.path)
+        
+        self.segments = [IndexSegment(path)]
+    
+    def close(self):
+        """Close all files."""
+        self.log_file.close()
+        for segment in self.segments:
+            segment.close()
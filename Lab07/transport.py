@@ -0,0 +1,377 @@
+"""
+Lab 07 - Message Transport
+Kryptologia - Patryk Rakowski 2025
+
+Length-prefixed pickle messages (4-byte big-endian length) shared by the
+broker, mining nodes and wallets. The same framing runs over TCP or, when
+every node is on one machine, over Unix domain sockets, which skip the
+loopback TCP/IP stack. The Unix socket path is derived from the broker port,
+so nodes only need to agree on the transport name.
+
+Block submissions (BLOCK_MINED) are framed with a flag in the length prefix
+and a fixed header (block number, task epoch, block hash) before the pickle,
+so MessageReader can drop stale or duplicate work without decoding it.
+"""
+
+import os
+import pickle
+import socket
+import statistics
+import struct
+import sys
+import tempfile
+import threading
+import time
+from typing import Optional
+
+
+TRANSPORTS = ('tcp', 'unix')
+
+# Submission frame: length | SUBMISSION_FLAG, then header, then pickle
+SUBMISSION_FLAG = 0x80000000
+SUBMISSION_HEADER = struct.Struct('>QI32s')    # block number, task epoch, block hash
+SUBMISSION_NUMBERS = struct.Struct('>QI')      # Numeric prefix of the header (no bytes object created)
+
+# Returned by MessageReader for a submission rejected by its filter (shared, never modified)
+DROPPED_MESSAGE = {'type': 'DROPPED'}
+
+
+def unix_transport_available() -> bool:
+    """Check whether Unix domain sockets are supported (not on Windows)."""
+    return hasattr(socket, 'AF_UNIX')
+
+
+def unix_socket_path(port: int) -> str:
+    """Return Unix socket path of the broker listening on a given port."""
+    return os.path.join(tempfile.gettempdir(), f'zad3_broker_{port}.sock')
+
+
+def create_server_socket(transport: str, host: str, port: int, backlog: int = 128) -> socket.socket:
+    """
+    Create a listening socket.
+    
+    Args:
+        transport: 'tcp' or 'unix'
+        host: TCP listen address
+        port: TCP port (also names the Unix socket)
+        backlog: Listen queue length
+    
+    Returns:
+        Listening socket
+    """
+    if transport == 'unix':
+        path = unix_socket_path(port)
+        if os.path.exists(path):
+            os.remove(path)
+        server_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server_socket.bind(path)
+    elif transport == 'tcp':
+        server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        server_socket.bind((host, port))
+    else:
+        raise ValueError(f"Unknown transport '{transport}' (available: {', '.join(TRANSPORTS)})")
+    server_socket.listen(backlog)
+    return server_socket
+
+
+def configure_socket(sock: socket.socket):
+    """Disable Nagle's algorithm on TCP sockets; small messages go out immediately."""
+    if sock.family in (socket.AF_INET, socket.AF_INET6):
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+
+def connect(transport: str, host: str, port: int) -> socket.socket:
+    """
+    Connect to a broker.
+    
+    Args:
+        transport: 'tcp' or 'unix'
+        host: Broker TCP address
+        port: Broker TCP port (also names the Unix socket)
+    
+    Returns:
+        Connected socket
+    """
+    if transport == 'unix':
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(unix_socket_path(port))
+    elif transport == 'tcp':
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.connect((host, port))
+    else:
+        raise ValueError(f"Unknown transport '{transport}' (available: {', '.join(TRANSPORTS)})")
+    configure_socket(sock)
+    return sock
+
+
+def encode_message(message) -> bytes:
+    """Pickle a message and add the length prefix (done once per broadcast)."""
+    data = pickle.dumps(message, protocol=pickle.HIGHEST_PROTOCOL)
+    return len(data).to_bytes(4, byteorder='big') + data
+
+
+def encode_submission(message, epoch: int) -> bytes:
+    """
+    Frame a BLOCK_MINED message with its fixed header.
+    
+    Args:
+        message: BLOCK_MINED message
+        epoch: Epoch of the task the block was mined for (from NEW_TASK)
+    
+    Returns:
+        Framed message
+    """
+    block = message['block']
+    header = SUBMISSION_HEADER.pack(block.block_number, epoch, block.block_hash)
+    data = pickle.dumps(message, protocol=pickle.HIGHEST_PROTOCOL)
+    return ((len(header) + len(data)) | SUBMISSION_FLAG).to_bytes(4, byteorder='big') + header + data
+
+
+def recv_exact(sock: socket.socket, size: int) -> Optional[bytearray]:
+    """
+    Receive exactly size bytes into one preallocated buffer.
+    
+    Returns:
+        Buffer, or None if the connection was closed
+    """
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        count = sock.recv_into(view[received:], size - received)
+        if count == 0:
+            return None
+        received += count
+    return buffer
+
+
+def read_message(sock: socket.socket):
+    """
+    Receive one length-prefixed pickled message.
+    
+    Returns:
+        Unpickled message, or None if the connection was closed
+    """
+    length_data = recv_exact(sock, 4)
+    if length_data is None:
+        return None
+    length = int.from_bytes(length_data, byteorder='big')
+    data = recv_exact(sock, length & ~SUBMISSION_FLAG)
+    if data is None:
+        return None
+    if length & SUBMISSION_FLAG:
+        return pickle.loads(memoryview(data)[SUBMISSION_HEADER.size:])
+    return pickle.loads(data)
+
+
+class MessageReader:
+    """
+    Reads messages of one connection into reusable buffers. The header of a
+    submission is passed to a filter first; a rejected payload is drained
+    through the scratch buffer without being stored or unpickled.
+    """
+    
+    def __init__(self, sock: socket.socket, submission_filter=None, buffer_size: int = 65536):
+        """
+        Initialize reader.
+        
+        Args:
+            sock: Connected socket
+            submission_filter: Callable(header memoryview) -> bool, False drops the submission
+            buffer_size: Initial payload buffer size (grows for larger messages)
+        """
+        self.sock = sock
+        self.submission_filter = submission_filter
+        self.prefix = memoryview(bytearray(4 + SUBMISSION_HEADER.size))
+        self.length_view = self.prefix[:4]
+        self.header_view = self.prefix[4:]
+        self.buffer = memoryview(bytearray(buffer_size))
+        self.dropped = 0
+    
+    def _recv_into(self, view: memoryview) -> bool:
+        """Fill a view completely; False if the connection was closed."""
+        received = 0
+        size = len(view)
+        while received < size:
+            # The view is sliced only after a short read, so a complete read allocates nothing
+            count = self.sock.recv_into(view[received:] if received else view, size - received)
+            if count == 0:
+                return False
+            received += count
+        return True
+    
+    def read(self):
+        """
+        Receive one message.
+        
+        Returns:
+            Unpickled message, DROPPED_MESSAGE, or None if the connection was closed
+        """
+        if not self._recv_into(self.length_view):
+            return None
+        length = int.from_bytes(self.length_view, byteorder='big')
+        
+        if length & SUBMISSION_FLAG:
+            length = (length & ~SUBMISSION_FLAG) - SUBMISSION_HEADER.size
+            if not self._recv_into(self.header_view):
+                return None
+            if self.submission_filter is not None and not self.submission_filter(self.header_view):
+                # Discard the payload in buffer-sized chunks (no views or copies are created)
+                while length > 0:
+                    count = self.sock.recv_into(self.buffer, min(length, len(self.buffer)))
+                    if count == 0:
+                        return None
+                    length -= count
+                self.dropped += 1
+                return DROPPED_MESSAGE
+        
+        if length > len(self.buffer):
+            self.buffer = memoryview(bytearray(length))
+        payload = self.buffer[:length]
+        if not self._recv_into(payload):
+            return None
+        return pickle.loads(payload)
+
+
+# ================================================================================
+# BENCHMARK
+# ================================================================================
+
+def benchmark_broadcast_latency(transport: str, num_receivers: int = 4, num_messages: int = 500,
+                                num_transactions: int = 100, port: int = 5190):
+    """
+    Measure latency from the start of a broadcast to its arrival at every receiver.
+    
+    Args:
+        transport: 'tcp' or 'unix'
+        num_receivers: Number of connected receivers (miners)
+        num_messages: Number of broadcasts
+        num_transactions: Transactions in each NEW_TASK-like message
+        port: Port (or Unix socket name) used for the test
+    
+    Returns:
+        Tuple of (median, p99) latency in seconds
+    """
+    server_socket = create_server_socket(transport, 'localhost', port)
+    latencies = [[] for _ in range(num_receivers)]
+    
+    def receiver(index):
+        sock = connect(transport, 'localhost', port)
+        while True:
+            message = read_message(sock)
+            if message is None or message['type'] == 'STOP':
+                break
+            latencies[index].append(time.monotonic() - message['sent'])
+            sock.sendall(b'\x01')
+        sock.close()
+    
+    threads = [threading.Thread(target=receiver, args=(i,), daemon=True) for i in range(num_receivers)]
+    for thread in threads:
+        thread.start()
+    connections = []
+    for _ in range(num_receivers):
+        client_socket, _ = server_socket.accept()
+        configure_socket(client_socket)
+        connections.append(client_socket)
+    
+    transactions = [f"TX_{i:016d}: SENDER{i % 10} -> RECEIVER{i % 7} [{i} units]" for i in range(num_transactions)]
+    for _ in range(num_messages):
+        data = encode_message({'type': 'NEW_TASK', 'transactions': transactions,
+                               'previous_hash': b'\x00' * 32, 'sent': time.monotonic()})
+        for client_socket in connections:
+            client_socket.sendall(data)
+        # Wait for every receiver before the next broadcast (measures latency, not throughput)
+        for client_socket in connections:
+            recv_exact(client_socket, 1)
+    
+    stop = encode_message({'type': 'STOP'})
+    for client_socket in connections:
+        client_socket.sendall(stop)
+        client_socket.close()
+    for thread in threads:
+        thread.join()
+    server_socket.close()
+    if transport == 'unix':
+        os.remove(unix_socket_path(port))
+    
+    # Latency of a broadcast is the time until its last receiver got it
+    per_broadcast = sorted(max(values) for values in zip(*latencies))
+    return statistics.median(per_broadcast), per_broadcast[min(len(per_broadcast) - 1, int(0.99 * len(per_broadcast)))]
+
+
+def benchmark_stale_rejection(transaction_counts=(10, 100, 1000), num_messages: int = 2000):
+    """
+    Measure the receiver's cost of rejecting a stale submission: decoding it
+    fully (read_message) vs. the header check of MessageReader.
+    
+    Args:
+        transaction_counts: Transactions per submitted block (payload size)
+        num_messages: Stale submissions per measurement
+    
+    Returns:
+        Dictionary {transactions: (decode us/reject, header check us/reject)}
+    """
+    from blockchain_mining import Block
+    
+    results = {}
+    for num_transactions in transaction_counts:
+        block = Block(merkle_root=os.urandom(32), previous_hash=os.urandom(32), timestamp=int(time.time()),
+                      block_number=1, nonce=0, block_hash=os.urandom(32))
+        message = {'type': 'BLOCK_MINED', 'block': block, 'attempts': 0, 'elapsed': 0.0,
+                   'transactions': [f"TX_{i:016d}: SENDER{i % 10} -> RECEIVER{i % 7} [{i} units]"
+                                    for i in range(num_transactions)]}
+        stream = encode_submission(message, epoch=1) * num_messages
+        
+        timings = []
+        for fast_path in (False, True):
+            receiver, sender = socket.socketpair()
+            thread = threading.Thread(target=sender.sendall, args=(stream,), daemon=True)
+            thread.start()
+            
+            start_time = time.perf_counter()
+            if fast_path:
+                # Current block is 2: every submission for block 1 is stale
+                reader = MessageReader(receiver, lambda header: SUBMISSION_NUMBERS.unpack_from(header)[0] == 2)
+                for _ in range(num_messages):
+                    reader.read()
+            else:
+                for _ in range(num_messages):
+                    if read_message(receiver)['block'].block_number != 2:
+                        continue
+            timings.append((time.perf_counter() - start_time) / num_messages)
+            
+            thread.join()
+            receiver.close()
+            sender.close()
+        results[num_transactions] = tuple(timings)
+    return results
+
+
+if __name__ == "__main__":
+    # Usage: python transport.py [num_receivers] [num_messages]
+    num_receivers = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    num_messages = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    
+    print(f"\n{'='*80}")
+    print("BROADCAST LATENCY BENCHMARK")
+    print(f"{'='*80}")
+    print(f"Receivers: {num_receivers}, broadcasts: {num_messages}")
+    print(f"\n{'Transport':<12} {'p50 (us)':>12} {'p99 (us)':>12}")
+    print(f"{'-'*38}")
+    for transport in TRANSPORTS:
+        if transport == 'unix' and not unix_transport_available():
+            print(f"{transport:<12} {'n/a':>12} {'n/a':>12}")
+            continue
+        median, p99 = benchmark_broadcast_latency(transport, num_receivers, num_messages)
+        print(f"{transport:<12} {median * 1e6:>12.1f} {p99 * 1e6:>12.1f}")
+    print(f"{'='*80}")
+    
+    print(f"\n{'='*80}")
+    print("STALE SUBMISSION REJECTION COST")
+    print(f"{'='*80}")
+    print(f"\n{'Transactions':>12} {'Decode (us)':>12} {'Header (us)':>12} {'Speedup':>9}")
+    print(f"{'-'*48}")
+    for num_transactions, (decode, header) in benchmark_stale_rejection().items():
+        print(f"{num_transactions:>12} {decode * 1e6:>12.1f} {header * 1e6:>12.1f} {decode / header:>8.1f}x")
+    print(f"{'='*80}")
@@ -0,0 +1,244 @@
+"""
+Lab 07 - WOTS+ One-Time Signature
+Kryptologia - Patryk Rakowski 2025
+
+Winternitz one-time signature with bitmasks (WOTS+, Huelsing 2013) on the
+hash backends of MerkleTree. The Winternitz parameter w (power of two,
+2 - 256) trades signature size (fewer, longer chains) against hash count:
+a key has len = len1 + len2 chains of w - 1 steps, where one step is
+F(x) = H(key | x XOR mask[step, chain]).
+
+Secret chain starts are derived from a seed (derive_key), bitmasks and the
+function key from a public seed. WOTSPlus is the one-time signature of the
+Merkle signature scheme (merkle_signature.py). All
+masks are precomputed as one (w - 1, len, n) array, so every chain
+evaluation (keygen, sign, verify) advances all active chains one step at a
+time: one vectorised XOR per step, then a tight loop of hash calls.
+"""
+
+import hashlib
+import hmac
+import math
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from blockchain_mining import MerkleTree, get_hash_backend
+
+
+N = 32                                  # Hash output and chain value size in bytes
+
+
+def derive_key(seed: bytes, key_index: int, chain_index: int) -> bytes:
+    """Secret start of one chain: HMAC-SHA256(seed, key index (4 B) | chain (2 B))."""
+    return hmac.new(seed, key_index.to_bytes(4, 'big') + chain_index.to_bytes(2, 'big'), hashlib.sha256).digest()
+
+
+class WOTSPlus:
+    """
+    WOTS+ parameter set: Winternitz parameter, public seed and hash backend.
+    """
+    
+    def __init__(self, w: int = 16, public_seed: bytes = bytes(N), hash_algorithm: str = 'sha256'):
+        """
+        Initialize parameters and precompute bitmasks.
+        
+        Args:
+            w: Winternitz parameter (power of two from 2 to 256)
+            public_seed: Public seed of the masks and function key (part of the public key)
+            hash_algorithm: Hash backend name (default SHA256)
+        """
+        if w < 2 or w > 256 or w & (w - 1):
+            raise ValueError(f"Winternitz parameter must be a power of two from 2 to 256, got {w}")
+        self.w = w
+        self.public_seed = public_seed
+        self.hash_algorithm = hash_algorithm
+        self.hash_function = get_hash_backend(hash_algorithm)
+        
+        self.log_w = w.bit_length() - 1
+        self.len1 = math.ceil(8 * N / self.log_w)
+        self.len2 = math.floor(math.log2(self.len1 * (w - 1)) / self.log_w) + 1
+        self.length = self.len1 + self.len2
+        
+        self.key = self._prf(b'K')
+        self.masks = self._compute_masks()
+    
+    def _prf(self, label: bytes) -> bytes:
+        """Public pseudo-random value: HMAC-SHA256(public_seed, label)."""
+        return hmac.new(self.public_seed, label, hashlib.sha256).digest()
+    
+    def _compute_masks(self) -> np.ndarray:
+        """Bitmasks of every step of every chain as a (w - 1, len, n) uint8 array."""
+        masks = b''.join(self._prf(b'M' + step.to_bytes(1, 'big') + chain.to_bytes(2, 'big'))
+                         for step in range(self.w - 1) for chain in range(self.length))
+        return np.frombuffer(masks, dtype=np.uint8).reshape(self.w - 1, self.length, N)
+    
+    def digits(self, message) -> np.ndarray:
+        """Return base-w digits of the message digest followed by the checksum digits."""
+        digest = MerkleTree.compute_hash(message, self.hash_algorithm)
+        value = int.from_bytes(digest, 'big') << (self.len1 * self.log_w - 8 * N)
+        mask = self.w - 1
+        message_digits = [(value >> (self.log_w * i)) & mask for i in reversed(range(self.len1))]
+        checksum = sum(mask - digit for digit in message_digits)
+        checksum_digits = [(checksum >> (self.log_w * i)) & mask for i in reversed(range(self.len2))]
+        return np.array(message_digits + checksum_digits, dtype=np.int32)
+    
+    # ----------------------------------------------------------------------------
+    # Chains
+    # ----------------------------------------------------------------------------
+    
+    def chain(self, value: bytes, chain_index: int, start: int, steps: int) -> bytes:
+        """Advance one chain from position start by steps (scalar reference of chains)."""
+        for step in range(start, start + steps):
+            mask = self.masks[step, chain_index].tobytes()
+            masked = (int.from_bytes(value, 'big') ^ int.from_bytes(mask, 'big')).to_bytes(N, 'big')
+            value = self.hash_function(self.key + masked)
+        return value
+    
+    def chains(self, values: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+        """
+        Advance all chains together, chain i from position starts[i] to ends[i].
+        
+        Args:
+            values: (len, n) uint8 array of chain values at their start positions
+            starts: Start position of every chain
+            ends: End position of every chain
+        
+        Returns:
+            (len, n) uint8 array of chain values at their end positions
+        """
+        values = values.copy()
+        hash_function = self.hash_function
+        key = self.key
+        if not len(values) or starts.min() >= ends.max():
+            return values
+        
+        for step in range(int(starts.min()), int(ends.max())):
+            active = np.flatnonzero((starts <= step) & (step < ends))
+            data = (values[active] ^ self.masks[step, active]).tobytes()
+            hashed = b''.join([hash_function(key + data[i:i + N]) for i in range(0, len(data), N)])
+            values[active] = np.frombuffer(hashed, dtype=np.uint8).reshape(-1, N)
+        return values
+    
+    # ----------------------------------------------------------------------------
+    # Keys and signatures
+    # ----------------------------------------------------------------------------
+    
+    def secret_key(self, seed: bytes, key_index: int = 0) -> np.ndarray:
+        """Derive the chain starts of one key from a seed as a (len, n) array."""
+        secret = b''.join(derive_key(seed, key_index, chain) for chain in range(self.length))
+        return np.frombuffer(secret, dtype=np.uint8).reshape(self.length, N)
+    
+    def public_key(self, seed: bytes, key_index: int = 0) -> bytes:
+        """Compute the public key (chain ends, len * n bytes) of a key index."""
+        zeros = np.zeros(self.length, dtype=np.int32)
+        ends = np.full(self.length, self.w - 1, dtype=np.int32)
+        return self.chains(self.secret_key(seed, key_index), zeros, ends).tobytes()
+    
+    def sign(self, message, seed: bytes, key_index: int = 0) -> bytes:
+        """Sign a message (len * n bytes); each key index may sign only once."""
+        zeros = np.zeros(self.length, dtype=np.int32)
+        return self.chains(self.secret_key(seed, key_index), zeros, self.digits(message)).tobytes()
+    
+    def public_key_from_signature(self, message, signature: bytes) -> Optional[bytes]:
+        """Complete the chains of a signature; returns the public key it belongs to (None if malformed)."""
+        if len(signature) != self.length * N:
+            return None
+        values = np.frombuffer(signature, dtype=np.uint8).reshape(self.length, N)
+        ends = np.full(self.length, self.w - 1, dtype=np.int32)
+        return self.chains(values, self.digits(message), ends).tobytes()
+    
+    def verify(self, message, signature: bytes, public_key: bytes) -> bool:
+        """Check a signature against a public key."""
+        return self.public_key_from_signature(message, signature) == public_key
+    
+    def signature_size(self) -> int:
+        """Signature (and public key) size in bytes."""
+        return self.length * N
+
+
+# ================================================================================
+# BENCHMARK
+# ================================================================================
+
+def benchmark_wots_plus(parameters=(4, 16, 256), repetitions: int = 20):
+    """
+    Measure keygen, sign and verify of WOTS+ for several Winternitz parameters
+    and compare batched chain evaluation with chain-by-chain evaluation.
+    
+    Args:
+        parameters: Winternitz parameters to test
+        repetitions: Keys generated (and messages signed and verified) per parameter
+    
+    Returns:
+        Dictionary {w: {operation: seconds per call}}
+    """
+    seed = b'\x42' * N
+    public_seed = b'\x17' * N
+    
+    print(f"\n{'='*80}")
+    print("WOTS+ BENCHMARK")
+    print(f"{'='*80}")
+    print(f"Hash: SHA-256, n = {N} B, {repetitions} keys per parameter")
+    
+    results: Dict[int, Dict[str, float]] = {}
+    rows: List[Tuple] = []
+    for w in parameters:
+        start_time = time.perf_counter()
+        wots = WOTSPlus(w, public_seed)
+        setup_time = time.perf_counter() - start_time
+        
+        timings = {'setup': setup_time, 'keygen': 0.0, 'sign': 0.0, 'verify': 0.0, 'keygen_scalar': 0.0}
+        hashes = {'sign': 0, 'verify': 0}
+        for i in range(repetitions):
+            message = f"Message {i}"
+            
+            start_time = time.perf_counter()
+            public_key = wots.public_key(seed, i)
+            timings['keygen'] += time.perf_counter() - start_time
+            
+            start_time = time.perf_counter()
+            signature = wots.sign(message, seed, i)
+            timings['sign'] += time.perf_counter() - start_time
+            
+            start_time = time.perf_counter()
+            valid = wots.verify(message, signature, public_key)
+            timings['verify'] += time.perf_counter() - start_time
+            assert valid
+            
+            start_time = time.perf_counter()
+            secret = wots.secret_key(seed, i)
+            scalar = b''.join(wots.chain(secret[chain].tobytes(), chain, 0, w - 1) for chain in range(wots.length))
+            timings['keygen_scalar'] += time.perf_counter() - start_time
+            assert scalar == public_key
+            
+            digits = wots.digits(message)
+            hashes['sign'] += int(digits.sum())
+            hashes['verify'] += int((w - 1 - digits).sum())
+        
+        results[w] = {name: value / (1 if name == 'setup' else repetitions) for name, value in timings.items()}
+        rows.append((w, wots.length, wots.signature_size(), wots.length * (w - 1),
+                     hashes['sign'] / repetitions, hashes['verify'] / repetitions))
+    
+    print(f"\n{'w':>5} {'Chains':>7} {'Sig (B)':>8} {'Keygen H':>9} {'Sign H':>8} {'Verify H':>9} "
+          f"{'Keygen (ms)':>12} {'Sign (ms)':>10} {'Verify (ms)':>12} {'Scalar keygen':>14}")
+    print(f"{'-'*104}")
+    for w, length, size, keygen_hashes, sign_hashes, verify_hashes in rows:
+        timing = results[w]
+        print(f"{w:>5} {length:>7} {size:>8,} {keygen_hashes:>9,} {sign_hashes:>8.0f} {verify_hashes:>9.0f} "
+              f"{timing['keygen'] * 1000:>12.3f} {timing['sign'] * 1000:>10.3f} {timing['verify'] * 1000:>12.3f} "
+              f"{timing['keygen_scalar'] * 1000:>11.3f} ms")
+    print(f"\nMask precomputation (once per public seed): "
+          + ", ".join(f"w={w}: {results[w]['setup'] * 1000:.1f} ms" for w in parameters))
+    print(f"{'='*80}")
+    
+    return results
+
+
+if __name__ == "__main__":
+    # Usage: python wots_plus.py [repetitions] [w ...]
+    repetitions = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    parameters = tuple(int(w) for w in sys.argv[2:]) or (4, 16, 256)
+    benchmark_wots_plus(parameters, repetitions)
@@ -3,27 +3,63 @@ Zadanie 11.3 - Broker Node (Intermediary/Network Simulator)
 Generates transaction hashes every 1 second and coordinates mining across 4 nodes.
 """
 import socket
-import pickle
 import threading
 import time
 import random
 import string
+import os
+import sys
+from collections import OrderedDict
 from datetime import datetime
+from blockchain_mining import BlockMiner, ChainParameters, MerkleTree
+from signed_transactions import SignatureVerifier
+from account_state import AccountState, parse_transaction
+from transaction_index import TransactionIndex
+from merkle_mountain_range import MerkleMountainRange
+from block_wal import BlockWAL
+from header_sync import HeaderChain, HeaderSyncClient
+from metrics import MetricsRegistry, MetricsServer
+from propagation_trace import PropagationTracer
+from transport import (SUBMISSION_NUMBERS, MessageReader, connect, configure_socket, create_server_socket,
+                       encode_message, encode_submission, read_message, unix_socket_path)
 
 
 class BrokerNode:
-    def __init__(self, host='localhost', port=5000, difficulty=20):
+    def __init__(self, host='localhost', port=5000, difficulty=20,
+                 require_signed_transactions=False, max_block_transactions=100,
+                 verifier_workers=None, initial_balance=1000, state_dir=None,
+                 snapshot_interval=100, index_dir=None, mmr_path=None, verify_pow=True,
+                 hash_algorithm='sha256', metrics_port=None, trace_report_interval=50,
+                 transport='tcp', upstream_host='localhost', upstream_port=None, relay_id=None,
+                 wal_path=None, wal_batch_records=64, wal_batch_window=0.005):
+        if mmr_path is not None and wal_path is None:
+            # A persisted MMR would survive restarts while the chain tip does not, so its leaf
+            # indices would no longer be block numbers
+            raise ValueError("mmr_path requires wal_path (the chain must be recovered with the MMR)")
+        
         self.host = host
         self.port = port
+        self.transport = transport  # 'tcp' or 'unix' (all nodes on the same host)
         self.difficulty = difficulty
+        self.chain_params = ChainParameters(difficulty=difficulty, hash_algorithm=hash_algorithm)
+        self.block_miner = BlockMiner(difficulty=difficulty, hash_algorithm=hash_algorithm)
+        self.verify_pow = verify_pow  # Disabled only by the statistical simulator
         
         # Blockchain state
         self.current_block_number = 0
         self.previous_hash = b'\x00' * 32  # Genesis block
         
+        # Epoch of the current task (random start, so tasks of an earlier broker run never match)
+        self.task_epoch = random.getrandbits(32)
+        
+        # Hashes of recently processed submissions; duplicates are dropped before decoding
+        self.recent_block_hashes = OrderedDict()
+        self.max_recent_block_hashes = 1024
+        
         # Connected mining nodes
         self.mining_nodes = {}  # {node_id: socket}
         self.nodes_lock = threading.Lock()
+        self.chain_lock = threading.Lock()
         
         # Server socket
         self.server_socket = None
@@ -32,6 +68,134 @@ class BrokerNode:
         # Transaction generation
         self.current_transactions = []
         
+        # Mempool of signed transactions waiting for a block
+        self.require_signed_transactions = require_signed_transactions
+        self.max_block_transactions = max_block_transactions
+        self.mempool = OrderedDict()  # {tx_hash: encoded transaction}
+        self.mempool_lock = threading.Lock()
+        self.verifier = SignatureVerifier(max_workers=verifier_workers, hash_algorithm=hash_algorithm)
+        
+        # Account balances (journal and snapshot are kept in state_dir if given)
+        self.state_dir = state_dir
+        self.snapshot_interval = snapshot_interval
+        if state_dir is not None:
+            os.makedirs(state_dir, exist_ok=True)
+            self.state = AccountState.load(
+                os.path.join(state_dir, 'state_snapshot.json'),
+                os.path.join(state_dir, 'state_journal.log'),
+                default_balance=initial_balance,
+                sync_journal=wal_path is None  # With a WAL, blocks are made durable (off the chain lock) by its group commit
+            )
+        else:
+            self.state = AccountState(default_balance=initial_balance)
+        
+        # Transaction hash -> (block number, leaf index)
+        self.tx_index = TransactionIndex(index_dir, hash_algorithm=hash_algorithm) if index_dir is not None else None
+        self.index_lock = threading.Lock()
+        
+        # Accumulator over accepted block hashes (leaf index = block number)
+        self.mmr = MerkleMountainRange(mmr_path, hash_algorithm)
+        self.mmr_lock = threading.Lock()
+        
+        # Metrics (served over HTTP in Prometheus format when metrics_port is set)
+        self.metrics = MetricsRegistry()
+        self.metrics_port = metrics_port
+        self.metrics_server = None
+        self.blocks_accepted = self.metrics.counter('broker_blocks_accepted_total', 'Accepted blocks')
+        self.blocks_rejected = self.metrics.counter('broker_blocks_rejected_total', 'Rejected block submissions by reason')
+        self.block_interval = self.metrics.histogram('broker_block_interval_seconds', 'Time between accepted blocks',
+                                                     buckets=(0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60, 120))
+        self.validation_time = self.metrics.histogram('broker_block_validation_seconds', 'Block validation time')
+        self.broadcast_latency = self.metrics.histogram('broker_broadcast_seconds', 'Time to send a message to all miners',
+                                                        buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1))
+        self.chain_height = self.metrics.gauge('broker_chain_height', 'Number of accepted blocks')
+        self.mempool_depth = self.metrics.gauge('broker_mempool_size', 'Transactions waiting in the mempool')
+        self.connected_miners = self.metrics.gauge('broker_connected_miners', 'Registered mining nodes')
+        self.miner_reconnects = self.metrics.counter('broker_miner_reconnects_total', 'Registrations of previously seen node ids')
+        self.transactions_admitted = self.metrics.counter('broker_transactions_total', 'Submitted transactions by result')
+        self.seen_node_ids = set()
+        self.last_block_time = None
+        
+        # Block propagation tracing (miner found -> other miners preempted)
+        self.tracer = PropagationTracer(histogram=self.metrics.histogram(
+            'broker_propagation_stage_seconds', 'Block propagation time per stage',
+            buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1)))
+        self.trace_report_interval = trace_report_interval
+        
+        # Relay mode: registered with a parent broker as if it were a miner, passes its
+        # tasks down to the own miners and forwards their blocks up; validation stays at the root
+        self.upstream_host = upstream_host
+        self.upstream_port = upstream_port
+        self.relay_id = relay_id
+        self.upstream_socket = None
+        self.upstream_lock = threading.Lock()
+        self.upstream_task = None
+        self.blocks_forwarded = self.metrics.counter('broker_blocks_forwarded_total', 'Block submissions relayed upstream')
+        self.broadcast_sends = self.metrics.counter('broker_broadcast_sends_total', 'Messages sent by broadcasts')
+        
+        # Headers of accepted blocks, served to rejoining miners and light clients (GETHEADERS)
+        self.header_chain = HeaderChain(self.chain_params)
+        self.headers_lock = threading.Lock()
+        
+        # Write-ahead log of accepted blocks; BLOCK_ACCEPTED goes out only after the group commit
+        self.wal = None
+        self.wal_commit_time = self.metrics.histogram('broker_wal_commit_seconds', 'Time from block acceptance to WAL commit',
+                                                      buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1))
+        if wal_path is not None:
+            self.recover_from_wal(wal_path)
+            self.wal = BlockWAL(wal_path, max_batch_records=wal_batch_records, max_batch_delay=wal_batch_window)
+    
+    def recover_from_wal(self, wal_path):
+        """
+        Replay accepted blocks from the WAL to rebuild the chain tip, balances, MMR and index.
+        Stores behind the WAL get the missing blocks; blocks past the WAL tip are rolled back.
+        """
+        recovered = 0
+        for record in BlockWAL.replay(wal_path):
+            block = record['block']
+            transactions = record['transactions']
+            
+            # Each store may be ahead of the WAL's last fsync or behind it; only missing blocks are applied
+            if block.block_number >= self.state.height:
+                self.state.apply_block(block.block_number, transactions)
+            if block.block_number >= self.mmr.leaf_count:
+                self.mmr.append(block.block_hash)
+            self.header_chain.append_block(block)
+            if self.tx_index is not None and transactions:
+                location = self.tx_index.lookup_transaction(transactions[0])
+                if location is None or location[0] != block.block_number:
+                    self.tx_index.add_block(block.block_number, transactions)
+            
+            self.previous_hash = block.block_hash
+            self.current_block_number = block.block_number + 1
+            recovered += 1
+        
+        # The state journal is written before the WAL commit, so it may hold blocks the WAL lost
+        rolled_back = 0
+        while self.state.height > self.current_block_number:
+            if not self.state.undo_log:
+                raise RuntimeError(f"Account state at height {self.state.height} is ahead of the WAL "
+                                   f"({self.current_block_number} blocks) and cannot be rolled back")
+            self.state.undo_block()
+            rolled_back += 1
+        if self.mmr.leaf_count > self.current_block_number:
+            rolled_back = max(rolled_back, self.mmr.leaf_count - self.current_block_number)
+            self.mmr.truncate(self.current_block_number)
+        if self.tx_index is not None:
+            self.tx_index.truncate(self.current_block_number)
+        if rolled_back:
+            print(f"[BROKER] Rolled back {rolled_back} block(s) past the WAL tip")
+        
+        self.chain_height.set(self.current_block_number)
+        if recovered:
+            print(f"[BROKER] Recovered {recovered} block(s) from WAL, chain tip: block {self.current_block_number - 1} "
+                  f"({self.previous_hash.hex()[:16]}...)")
+    
+    @property
+    def is_relay(self):
+        """True if this broker relays for a parent broker"""
+        return self.upstream_port is not None
+    
     def generate_random_transactions(self, count=5):
         """Generate random transaction strings"""
         transactions = []
@@ -44,12 +208,171 @@ class BrokerNode:
             transactions.append(tx)
         return transactions
     
+    def admit_transactions(self, transactions):
+        """Verify signed transactions in a batch and add the valid ones to the mempool"""
+        results = self.verifier.verify_transactions(transactions)
+        replayed = self.find_replayed(transactions)
+        
+        accepted = 0
+        rejected = []
+        with self.mempool_lock:
+            for tx, ok, is_replayed in zip(transactions, results, replayed):
+                if not ok or is_replayed:
+                    rejected.append(tx)
+                    continue
+                tx_hash = MerkleTree.compute_hash(tx, self.chain_params.hash_algorithm)
+                if tx_hash not in self.mempool:
+                    self.mempool[tx_hash] = tx
+                    accepted += 1
+            self.mempool_depth.set(len(self.mempool))
+        
+        self.transactions_admitted.inc(accepted, result='accepted')
+        self.transactions_admitted.inc(len(rejected), result='rejected')
+        return accepted, rejected
+    
+    def find_replayed(self, transactions):
+        """Flag signed transfers without a nonce or with one their sender's account has already used"""
+        transfers = [parse_transaction(tx) for tx in transactions]
+        with self.chain_lock:  # Taken before (never inside) mempool_lock, as in handle_mined_block
+            return [transfer is not None and
+                    (transfer.nonce is None or transfer.nonce < self.state.get_nonce(transfer.sender))
+                    for transfer in transfers]
+    
+    def select_block_transactions(self):
+        """Pick transactions for the next block from the mempool"""
+        with self.mempool_lock:
+            candidates = list(self.mempool.values())[:self.max_block_transactions]
+            
+            # Drop double-spends against the current balances
+            transactions, rejected = self.state.filter_spendable(candidates)
+            for tx in rejected:
+                self.mempool.pop(MerkleTree.compute_hash(tx, self.chain_params.hash_algorithm), None)
+            self.mempool_depth.set(len(self.mempool))
+        
+        if rejected:
+            print(f"[BROKER] Dropped {len(rejected)} double-spend or replayed transaction(s) from mempool")
+        
+        # Without signed submissions fall back to random demo transactions
+        if not transactions and not self.require_signed_transactions:
+            transactions = self.generate_random_transactions()
+        
+        return transactions
+    
+    def next_block_candidates(self):
+        """Mempool transactions beyond the current task, sent with NEW_TASK for speculative templates"""
+        current = set(self.current_transactions)
+        with self.mempool_lock:
+            return [tx for tx in self.mempool.values() if tx not in current][:self.max_block_transactions]
+    
+    def validate_block(self, block, transactions):
+        """
+        Validate proof-of-work, Merkle root and transaction signatures of a block.
+        Returns (is_valid, reason).
+        """
+        if self.verify_pow and not self.block_miner.verify_block(block):
+            return False, "Invalid proof-of-work"
+        
+        if block.previous_hash != self.previous_hash:
+            return False, "Previous hash does not match chain tip"
+        
+        if MerkleTree.build_merkle_tree(transactions, self.chain_params.hash_algorithm) != block.merkle_root:
+            return False, "Merkle root does not match transactions"
+        
+        # Balance check costs time proportional to the block's own transactions
+        is_spendable, reason = self.state.validate_block(transactions)
+        if not is_spendable:
+            return False, reason
+        
+        # Signatures (and sender ownership) admitted through the mempool are served from the
+        # verifier cache; unsigned transactions never reach the balances (see parse_transaction)
+        if self.require_signed_transactions:
+            signed = list(transactions)
+        else:
+            signed = [tx for tx in transactions if '|sig=' in tx]
+        
+        if signed and not all(self.verifier.verify_transactions(signed)):
+            return False, "Invalid transaction signature"
+        
+        return True, None
+    
+    def locate_transaction(self, tx_hash):
+        """Return TX_LOCATION message for a transaction hash"""
+        location = None
+        if self.tx_index is not None:
+            with self.index_lock:
+                location = self.tx_index.lookup(tx_hash)
+        return {
+            'type': 'TX_LOCATION',
+            'tx_hash': tx_hash,
+            'block_number': location[0] if location else None,
+            'leaf_index': location[1] if location else None
+        }
+    
+    def prove_block(self, block_number):
+        """Return BLOCK_PROOF message proving a block against the current MMR root"""
+        with self.mmr_lock:
+            if not 0 <= block_number < self.mmr.leaf_count:
+                proof = None
+            else:
+                proof = self.mmr.get_proof(block_number)
+            root = self.mmr.get_root()
+        return {
+            'type': 'BLOCK_PROOF',
+            'block_number': block_number,
+            'proof': proof,
+            'mmr_root': root
+        }
+    
+    def get_account(self, account):
+        """Return ACCOUNT message with the balance and next nonce of an account"""
+        with self.chain_lock:
+            balance = self.state.get_balance(account)
+            nonce = self.state.get_nonce(account)
+        return {
+            'type': 'ACCOUNT',
+            'account': account,
+            'balance': balance,
+            'nonce': nonce
+        }
+    
+    def get_headers(self, message):
+        """Return HEADERS message continuing the requester's locator"""
+        with self.headers_lock:
+            return self.header_chain.get_headers(message['locator'], message.get('max_headers', 2000))
+    
+    def handle_transaction_client(self, client_socket, address, message):
+        """Handle a client submitting signed transactions or querying the index"""
+        try:
+            while self.running and message:
+                if message.get('type') == 'SUBMIT_TRANSACTIONS':
+                    accepted, rejected = self.admit_transactions(message['transactions'])
+                    print(f"[BROKER] Mempool: {accepted} accepted, {len(rejected)} rejected "
+                          f"from {address} (size: {len(self.mempool)})")
+                    self.send_message(client_socket, {
+                        'type': 'TRANSACTIONS_ACK',
+                        'accepted': accepted,
+                        'rejected': rejected
+                    })
+                elif message.get('type') == 'GET_TX_LOCATION':
+                    self.send_message(client_socket, self.locate_transaction(message['tx_hash']))
+                elif message.get('type') == 'GET_BLOCK_PROOF':
+                    self.send_message(client_socket, self.prove_block(message['block_number']))
+                elif message.get('type') == 'GET_ACCOUNT':
+                    self.send_message(client_socket, self.get_account(message['account']))
+                elif message.get('type') == 'GETHEADERS':
+                    self.send_message(client_socket, self.get_headers(message))
+                message = self.receive_message(client_socket)
+        finally:
+            client_socket.close()
+    
     def send_message(self, sock, message):
         """Send pickled message with length prefix"""
+        return self.send_data(sock, encode_message(message))
+    
+    def send_data(self, sock, data):
+        """Send an already framed message"""
         try:
-            data = pickle.dumps(message)
-            length = len(data).to_bytes(4, byteorder='big')
-            sock.sendall(length + data)
+            sock.sendall(data)
             return True
         except Exception as e:
             print(f"[BROKER] Error sending message: {e}")
@@ -58,51 +381,44 @@ class BrokerNode:
     def receive_message(self, sock):
         """Receive pickled message with length prefix"""
         try:
-            # Receive length prefix (4 bytes)
-            length_data = b''
-            while len(length_data) < 4:
-                chunk = sock.recv(4 - len(length_data))
-                if not chunk:
-                    return None
-                length_data += chunk
-            
-            message_length = int.from_bytes(length_data, byteorder='big')
-            
-            # Receive message data
-            data = b''
-            while len(data) < message_length:
-                chunk = sock.recv(min(4096, message_length - len(data)))
-                if not chunk:
-                    return None
-                data += chunk
-            
-            return pickle.loads(data)
+            return read_message(sock)
         except Exception as e:
             print(f"[BROKER] Error receiving message: {e}")
             return None
     
     def broadcast_to_miners(self, message, exclude_node_id=None):
         """Broadcast message to all connected mining nodes"""
+        start_time = time.perf_counter()
+        data = encode_message(message)  # Pickled once for all miners
         with self.nodes_lock:
             dead_nodes = []
             for node_id, sock in self.mining_nodes.items():
                 if exclude_node_id is not None and node_id == exclude_node_id:
                     continue
                 
-                if not self.send_message(sock, message):
+                self.broadcast_sends.inc()
+                if not self.send_data(sock, data):
                     dead_nodes.append(node_id)
             
             # Remove disconnected nodes
             for node_id in dead_nodes:
                 print(f"[BROKER] Node {node_id} disconnected, removing from list")
                 del self.mining_nodes[node_id]
+            self.connected_miners.set(len(self.mining_nodes))
+        self.broadcast_latency.observe(time.perf_counter() - start_time)
     
     def handle_mining_node(self, client_socket, address):
         """Handle connection from a mining node"""
         node_id = None
+        reader = MessageReader(client_socket, self.submission_is_current)
         try:
             # Receive initial registration
-            reg_message = self.receive_message(client_socket)
+            reg_message = reader.read()
+            if reg_message and reg_message.get('type') in ('SUBMIT_TRANSACTIONS', 'GET_TX_LOCATION', 'GET_BLOCK_PROOF',
+                                                           'GET_ACCOUNT', 'GETHEADERS'):
+                self.handle_transaction_client(client_socket, address, reg_message)
+                return
+            
             if not reg_message or reg_message.get('type') != 'REGISTER':
                 print(f"[BROKER] Invalid registration from {address}")
                 client_socket.close()
@@ -112,27 +428,41 @@ class BrokerNode:
             
             with self.nodes_lock:
                 self.mining_nodes[node_id] = client_socket
+                self.connected_miners.set(len(self.mining_nodes))
+                if node_id in self.seen_node_ids:
+                    self.miner_reconnects.inc()
+                self.seen_node_ids.add(node_id)
             
             print(f"[BROKER] Node {node_id} registered from {address}")
             
-            # Send initial mining task
-            task_message = {
-                'type': 'NEW_TASK',
-                'transactions': self.current_transactions,
-                'previous_hash': self.previous_hash,
-                'block_number': self.current_block_number,
-                'difficulty': self.difficulty
-            }
-            self.send_message(client_socket, task_message)
+            # Send initial mining task (a relay may not have one from its parent yet)
+            task_message = self.build_task_message()
+            if task_message is not None:
+                self.send_message(client_socket, task_message)
             
             # Listen for mined blocks from this node
             while self.running:
-                message = self.receive_message(client_socket)
+                message = reader.read()  # Stale and duplicate submissions come back as DROPPED
+                received_at = time.monotonic()
                 if not message:
                     break
                 
-                if message['type'] == 'BLOCK_MINED':
-                    self.handle_mined_block(message, node_id)
+                if self.is_relay and message['type'] in ('BLOCK_MINED', 'TRACE_REPORT'):
+                    self.forward_upstream(message, node_id)
+                elif message['type'] == 'BLOCK_MINED':
+                    self.handle_mined_block(message, message.get('miner_id', node_id), received_at)
+                elif message['type'] == 'TRACE_REPORT':
+                    self.tracer.record_miner(message['block_number'], message.get('miner_id', node_id),
+                                             message['received'], message['preempted'])
+                elif message['type'] == 'GETHEADERS':
+                    self.send_message(client_socket, self.get_headers(message))
+                elif message['type'] == 'SUBMIT_TRANSACTIONS':
+                    accepted, rejected = self.admit_transactions(message['transactions'])
+                    self.send_message(client_socket, {
+                        'type': 'TRANSACTIONS_ACK',
+                        'accepted': accepted,
+                        'rejected': rejected
+                    })
         
         except Exception as e:
             print(f"[BROKER] Error handling node {node_id}: {e}")
@@ -140,69 +470,276 @@ class BrokerNode:
             with self.nodes_lock:
                 if node_id and node_id in self.mining_nodes:
                     del self.mining_nodes[node_id]
+                self.connected_miners.set(len(self.mining_nodes))
             client_socket.close()
             print(f"[BROKER] Node {node_id} connection closed")
     
-    def handle_mined_block(self, message, node_id):
+    def build_task_message(self):
+        """Return NEW_TASK message for the current chain tip"""
+        if self.is_relay:
+            return self.upstream_task  # Passed on unchanged from the parent broker
+        return {
+            'type': 'NEW_TASK',
+            'transactions': self.current_transactions,
+            'previous_hash': self.previous_hash,
+            'block_number': self.current_block_number,
+            'difficulty': self.difficulty,
+            'hash_algorithm': self.chain_params.hash_algorithm,
+            'epoch': self.task_epoch,
+            'mempool': self.next_block_candidates()
+        }
+    
+    def submission_is_current(self, header):
+        """Fast path: check the fixed header of a submission before its block is decoded"""
+        block_number, epoch = SUBMISSION_NUMBERS.unpack_from(header)
+        if block_number != self.current_block_number or epoch != self.task_epoch:
+            self.blocks_rejected.inc(reason='stale')
+            return False
+        # Reached only by submissions for the current task; dict lookup needs one 32-byte hashable key
+        if bytes(header[12:44]) in self.recent_block_hashes:
+            self.blocks_rejected.inc(reason='duplicate')
+            return False
+        return True
+    
+    def remember_block_hash(self, block_hash):
+        """Add a processed submission to the LRU of recent block hashes (called under chain_lock)"""
+        self.recent_block_hashes[block_hash] = None
+        self.recent_block_hashes.move_to_end(block_hash)
+        if len(self.recent_block_hashes) > self.max_recent_block_hashes:
+            self.recent_block_hashes.popitem(last=False)
+    
+    def forward_upstream(self, message, node_id):
+        """Relay a block submission or trace report of a local miner to the parent broker"""
+        if message['type'] == 'BLOCK_MINED' and message['block'].block_number != self.current_block_number:
+            # Stale against the last task from the parent, the root would reject it too
+            self.blocks_rejected.inc(reason='stale')
+            print(f"[RELAY {self.relay_id}] Dropped stale block {message['block'].block_number} from Node {node_id}")
+            return
+        
+        # The id of the miner (not of this relay) travels up, so the root names the real winner
+        message.setdefault('miner_id', node_id)
+        if message['type'] == 'BLOCK_MINED':
+            with self.chain_lock:
+                if message['block'].block_hash in self.recent_block_hashes:
+                    self.blocks_rejected.inc(reason='duplicate')
+                    return
+                self.remember_block_hash(message['block'].block_hash)
+            data = encode_submission(message, self.task_epoch)
+        else:
+            data = encode_message(message)
+        with self.upstream_lock:
+            sent = self.send_data(self.upstream_socket, data)
+        if sent and message['type'] == 'BLOCK_MINED':
+            self.blocks_forwarded.inc()
+            print(f"[RELAY {self.relay_id}] Forwarded block {message['block'].block_number} from Node {node_id}")
+    
+    def upstream_listener(self):
+        """Receive tasks and accepted blocks from the parent broker and pass them down"""
+        while self.running:
+            message = self.receive_message(self.upstream_socket)
+            if not message:
+                if self.running:
+                    print(f"[RELAY {self.relay_id}] Connection to parent broker lost")
+                    self.running = False
+                break
+            
+            if message['type'] == 'NEW_TASK':
+                if self.upstream_task is None:
+                    self.start_upstream_header_sync(message)
+                with self.chain_lock:
+                    self.upstream_task = message
+                    self.task_epoch = message.get('epoch', 0)
+                    self.current_transactions = message['transactions']
+                    self.previous_hash = message['previous_hash']
+                    self.current_block_number = message['block_number']
+                    self.chain_height.set(self.current_block_number)
+                self.broadcast_to_miners(message)
+            elif message['type'] in ('BLOCK_ACCEPTED', 'CANCEL_MINING'):
+                if message['type'] == 'BLOCK_ACCEPTED':
+                    block = message['block']
+                    with self.headers_lock:
+                        self.header_chain.append_verified(block)
+                    with self.chain_lock:
+                        # Miners start the next block speculatively; accept their submissions
+                        # before the parent's NEW_TASK (same tip and epoch) arrives
+                        if block.block_number == self.current_block_number and block.previous_hash == self.previous_hash:
+                            self.previous_hash = block.block_hash
+                            self.current_block_number += 1
+                            self.task_epoch = (self.task_epoch + 1) & 0xFFFFFFFF
+                self.broadcast_to_miners(message)
+    
+    def start_upstream_header_sync(self, task_message):
+        """Adopt the parent's chain parameters and download its headers, so the relay serves GETHEADERS too"""
+        self.difficulty = task_message['difficulty']
+        self.chain_params = ChainParameters(difficulty=self.difficulty, hash_algorithm=task_message['hash_algorithm'])
+        with self.headers_lock:
+            self.header_chain = HeaderChain(self.chain_params)
+        
+        def sync():
+            client = HeaderSyncClient(self.header_chain, self.upstream_host, self.upstream_port, self.transport,
+                                      lock=self.headers_lock)
+            try:
+                ok, reason = client.sync()
+            except Exception as e:
+                ok, reason = False, str(e)
+            print(f"[RELAY {self.relay_id}] Header sync: " +
+                  (f"{client.headers_received:,} headers" if ok else f"failed ({reason})"))
+        
+        threading.Thread(target=sync, daemon=True).start()
+    
+    def connect_upstream(self):
+        """Register with the parent broker as a mining node"""
+        self.upstream_socket = connect(self.transport, self.upstream_host, self.upstream_port)
+        self.send_message(self.upstream_socket, {'type': 'REGISTER', 'node_id': self.relay_id})
+        print(f"[RELAY {self.relay_id}] Registered with parent broker at "
+              f"{self.upstream_host}:{self.upstream_port} ({self.transport})")
+    
+    def handle_mined_block(self, message, node_id, received_at=None):
         """Process a mined block from a mining node"""
         block = message['block']
         attempts = message.get('attempts', 0)
         elapsed = message.get('elapsed', 0)
+        transactions = message.get('transactions', self.current_transactions)
         
-        # Check for desynchronization - reject if block number already mined
-        if block.block_number != self.current_block_number:
-            print(f"\n[BROKER] ❌ REJECTED block {block.block_number} from Node {node_id}")
-            print(f"          Reason: Block {block.block_number} already mined (current: {self.current_block_number})")
-            print(f"          Block hash: {block.block_hash.hex()[:16]}...")
-            return
-        
-        # Accept the block
-        print(f"\n{'='*80}")
-        print(f"[BROKER] ✅ BLOCK ACCEPTED from Node {node_id}")
-        print(f"{'='*80}")
-        print(f"  Block Number:    {block.block_number}")
-        print(f"  Block Hash:      {block.block_hash.hex()}")
-        print(f"  Previous Hash:   {block.previous_hash.hex()}")
-        print(f"  Merkle Root:     {block.merkle_root.hex()}")
-        print(f"  Timestamp:       {datetime.fromtimestamp(block.timestamp).strftime('%Y-%m-%d %H:%M:%S')}")
-        print(f"  Nonce:           {block.nonce}")
-        print(f"  Attempts:        {attempts:,}")
-        print(f"  Time:            {elapsed:.2f}s")
-        print(f"  Hash Rate:       {attempts/elapsed:.2f} H/s" if elapsed > 0 else "  Hash Rate:       N/A")
-        print(f"{'='*80}\n")
-        
-        # Update blockchain state
-        self.previous_hash = block.block_hash
-        self.current_block_number += 1
-        
-        # Generate new transactions for next block
-        self.current_transactions = self.generate_random_transactions()
-        
-        # Broadcast block acceptance and new mining task to all nodes
-        acceptance_message = {
-            'type': 'BLOCK_ACCEPTED',
-            'block': block,
-            'winning_node': node_id
-        }
+        with self.chain_lock:
+            # Check for desynchronization - reject if block number already mined
+            # (submissions with a fixed header were already checked by submission_is_current)
+            if block.block_number != self.current_block_number:
+                self.blocks_rejected.inc(reason='stale')
+                print(f"[BROKER] ❌ REJECTED stale block {block.block_number} from Node {node_id} "
+                      f"(current: {self.current_block_number})")
+                return
+            if block.block_hash in self.recent_block_hashes:
+                self.blocks_rejected.inc(reason='duplicate')
+                return
+            self.remember_block_hash(block.block_hash)
+            
+            # Validate proof-of-work, Merkle root and signatures
+            validation_start = time.perf_counter()
+            is_valid, reason = self.validate_block(block, transactions)
+            self.validation_time.observe(time.perf_counter() - validation_start)
+            validated_at = time.monotonic()
+            if not is_valid:
+                self.blocks_rejected.inc(reason='invalid')
+                print(f"\n[BROKER] ❌ REJECTED block {block.block_number} from Node {node_id}")
+                print(f"          Reason: {reason}")
+                print(f"          Block hash: {block.block_hash.hex()[:16]}...")
+                return
+            
+            # Accept the block
+            print(f"\n{'='*80}")
+            print(f"[BROKER] ✅ BLOCK ACCEPTED from Node {node_id}")
+            print(f"{'='*80}")
+            print(f"  Block Number:    {block.block_number}")
+            print(f"  Block Hash:      {block.block_hash.hex()}")
+            print(f"  Previous Hash:   {block.previous_hash.hex()}")
+            print(f"  Merkle Root:     {block.merkle_root.hex()}")
+            print(f"  Timestamp:       {datetime.fromtimestamp(block.timestamp).strftime('%Y-%m-%d %H:%M:%S')}")
+            print(f"  Nonce:           {block.nonce}")
+            print(f"  Transactions:    {len(transactions)}")
+            print(f"  Attempts:        {attempts:,}")
+            print(f"  Time:            {elapsed:.2f}s")
+            print(f"  Hash Rate:       {attempts/elapsed:.2f} H/s" if elapsed > 0 else "  Hash Rate:       N/A")
+            print(f"{'='*80}\n")
+            
+            # Update blockchain state
+            self.previous_hash = block.block_hash
+            self.current_block_number += 1
+            self.task_epoch = (self.task_epoch + 1) & 0xFFFFFFFF
+            
+            now = time.monotonic()
+            if self.last_block_time is not None:
+                self.block_interval.observe(now - self.last_block_time)
+            self.last_block_time = now
+            self.blocks_accepted.inc()
+            self.chain_height.set(self.current_block_number)
+            
+            # Apply transactions to account balances (the journal is rolled back on recovery
+            # if the WAL record is lost; the snapshot is written only after the commit)
+            self.state.apply_block(block.block_number, transactions)
+            snapshot = None
+            if self.state_dir is not None and self.state.height % self.snapshot_interval == 0:
+                snapshot = self.state.begin_snapshot()
+            
+            # Drop included transactions from the mempool
+            with self.mempool_lock:
+                for tx in transactions:
+                    self.mempool.pop(MerkleTree.compute_hash(tx, self.chain_params.hash_algorithm), None)
+                self.mempool_depth.set(len(self.mempool))
+            
+            # Select transactions for next block
+            self.current_transactions = self.select_block_transactions()
+            
+            task_message = self.build_task_message()
+            trace = message.get('trace')
+            if trace is not None:
+                trace = dict(trace, broker_received=received_at, validated=validated_at)
+            
+            def persist():
+                # MMR, index and snapshot never get ahead of the WAL; runs in block order
+                if snapshot is not None:
+                    self.state.write_snapshot(os.path.join(self.state_dir, 'state_snapshot.json'), snapshot)
+                
+                # Extend the block hash accumulator, O(log n)
+                with self.mmr_lock:
+                    self.mmr.append(block.block_hash)
+                    mmr_root = self.mmr.get_root()
+                
+                # Index transactions for inclusion queries
+                if self.tx_index is not None:
+                    with self.index_lock:
+                        self.tx_index.add_block(block.block_number, transactions)
+                
+                acceptance_message = {
+                    'type': 'BLOCK_ACCEPTED',
+                    'block': block,
+                    'winning_node': node_id,
+                    'mmr_root': mmr_root
+                }
+                self.announce_block(acceptance_message, task_message, trace)
+            
+            if self.wal is None:
+                persist()
+            else:
+                # Miners learn about the block only once it is durable; the fsync is shared
+                # with other records of the batch and does not hold the chain lock
+                accepted_at = time.perf_counter()
+                
+                def committed():
+                    self.wal_commit_time.observe(time.perf_counter() - accepted_at)
+                    persist()
+                
+                try:
+                    self.wal.append({'block': block, 'transactions': transactions}, callback=committed)
+                except OSError as e:
+                    print(f"[BROKER] ❌ Block {block.block_number} not announced, WAL failed: {e}")
+    
+    def announce_block(self, acceptance_message, task_message, trace=None):
+        """Broadcast block acceptance and the next mining task to all nodes"""
+        block = acceptance_message['block']
+        with self.headers_lock:
+            self.header_chain.append_block(block)  # Served by GETHEADERS once announced (durable with WAL)
+        if trace is not None:
+            self.tracer.record_block(block.block_number, acceptance_message['winning_node'],
+                                     dict(trace, broadcast_start=time.monotonic()))
         self.broadcast_to_miners(acceptance_message)
+        if trace is not None:
+            self.tracer.record_event(block.block_number, 'broadcast_end', time.monotonic())
         
         # Send new mining task
-        new_task_message = {
-            'type': 'NEW_TASK',
-            'transactions': self.current_transactions,
-            'previous_hash': self.previous_hash,
-            'block_number': self.current_block_number,
-            'difficulty': self.difficulty
-        }
-        self.broadcast_to_miners(new_task_message)
+        self.broadcast_to_miners(task_message)
+        
+        if self.trace_report_interval and task_message['block_number'] % self.trace_report_interval == 0:
+            self.tracer.print_report()
     
     def accept_connections(self):
         """Accept incoming connections from mining nodes"""
-        print(f"[BROKER] Listening for mining nodes on {self.host}:{self.port}")
+        print(f"[BROKER] Listening for mining nodes on {self.host}:{self.port} ({self.transport})")
         while self.running:
             try:
                 self.server_socket.settimeout(1.0)
                 client_socket, address = self.server_socket.accept()
+                configure_socket(client_socket)
                 print(f"[BROKER] New connection from {address}")
                 
                 # Handle each node in a separate thread
@@ -227,41 +764,84 @@ class BrokerNode:
     def start(self):
         """Start the broker node"""
         print("\n" + "="*80)
-        print("BROKER NODE - Distributed PoW Simulation")
+        print("BROKER NODE - Distributed PoW Simulation" + (f" (relay {self.relay_id})" if self.is_relay else ""))
         print("="*80)
-        print(f"Difficulty: {self.difficulty} leading zero bits")
+        if self.is_relay:
+            print(f"Parent broker: {self.upstream_host}:{self.upstream_port}")
+        else:
+            print(f"Difficulty: {self.difficulty} leading zero bits")
+            print(f"Hash algorithm: {self.chain_params.hash_algorithm}")
         print(f"Listening on: {self.host}:{self.port}")
+        print(f"Transport: {self.transport}" + (f" ({unix_socket_path(self.port)})" if self.transport == 'unix' else ""))
+        if self.metrics_port is not None:
+            self.metrics_server = MetricsServer(self.metrics, host=self.host, port=self.metrics_port)
+            print(f"Metrics: http://{self.host}:{self.metrics_server.port}/metrics")
         print("="*80 + "\n")
         
-        # Generate initial transactions
-        self.current_transactions = self.generate_random_transactions()
-        print(f"[BROKER] Initial transactions generated:")
-        for tx in self.current_transactions:
-            print(f"  - {tx}")
-        print()
+        if self.is_relay:
+            # Tasks come from the parent broker
+            self.connect_upstream()
+        else:
+            # Select initial transactions
+            self.current_transactions = self.select_block_transactions()
+            print(f"[BROKER] Initial transactions generated:")
+            for tx in self.current_transactions:
+                print(f"  - {tx}")
+            print()
         
         # Create server socket
-        self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        self.server_socket.bind((self.host, self.port))
-        self.server_socket.listen(5)
+        self.server_socket = create_server_socket(self.transport, self.host, self.port)
         
         self.running = True
         
         # Start accepting connections
         accept_thread = threading.Thread(target=self.accept_connections, daemon=True)
         accept_thread.start()
+        if self.is_relay:
+            threading.Thread(target=self.upstream_listener, daemon=True).start()
         
         try:
-            # Keep main thread alive
+            # Keep main thread alive (until stop() or loss of the parent broker)
             while self.running:
                 time.sleep(1)
         except KeyboardInterrupt:
             print("\n[BROKER] Shutting down...")
-            self.running = False
-            self.server_socket.close()
+            self.tracer.print_report()
+        finally:
+            self.stop()
+    
+    def stop(self):
+        """Stop the broker node and release its resources"""
+        self.running = False
+        if self.server_socket is None:
+            return
+        self.server_socket.close()
+        self.server_socket = None
+        if self.wal is not None:
+            self.wal.close()  # Commits and announces the last accepted blocks
+        if self.upstream_socket is not None:
+            self.upstream_socket.close()
+        with self.nodes_lock:
+            for sock in self.mining_nodes.values():
+                sock.close()
+        if self.transport == 'unix' and os.path.exists(unix_socket_path(self.port)):
+            os.remove(unix_socket_path(self.port))
+        self.verifier.close()
+        self.state.close()
+        if self.tx_index is not None:
+            self.tx_index.close()
+        self.mmr.close()
+        if self.metrics_server is not None:
+            self.metrics_server.close()
 
 
 if __name__ == "__main__":
-    broker = BrokerNode(host='localhost', port=5000, difficulty=20)
+    # Usage: python zad3_broker.py [difficulty] [hash_algorithm] [tcp|unix] [wal_path]
+    difficulty = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    hash_algorithm = sys.argv[2] if len(sys.argv) > 2 else 'sha256'
+    transport = sys.argv[3] if len(sys.argv) > 3 else 'tcp'
+    wal_path = sys.argv[4] if len(sys.argv) > 4 else None  # Chain survives restarts when set
+    
+    broker = BrokerNode(host='localhost', port=5000, difficulty=difficulty, hash_algorithm=hash_algorithm,
+                        metrics_port=9100, transport=transport, wal_path=wal_path)
     broker.start()
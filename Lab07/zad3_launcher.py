@@ -6,19 +6,28 @@ import subprocess
 import time
 import sys
 import os
+from transport import unix_transport_available
 
 
-def launch_distributed_pow(difficulty=20):
+def launch_distributed_pow(difficulty=20, hash_algorithm='sha256', transport='tcp'):
     """
     Launch the distributed PoW simulation system
     
     Args:
         difficulty: Mining difficulty in leading zero bits (default: 20)
+        hash_algorithm: PoW hash backend of the chain (default: sha256)
+        transport: 'tcp' (default) or 'unix' - Unix domain sockets, all nodes on this machine
     """
+    if transport == 'unix' and not unix_transport_available():
+        print("Unix domain sockets are not available on this system, using TCP")
+        transport = 'tcp'
+    
     print("\n" + "="*80)
     print("DISTRIBUTED POW SIMULATION - LAUNCHER")
     print("="*80)
     print(f"Difficulty: {difficulty} leading zero bits")
+    print(f"Hash algorithm: {hash_algorithm}")
+    print(f"Transport: {transport}")
     print("Nodes: 1 Broker + 4 Mining Nodes")
     print("="*80 + "\n")
     
@@ -32,7 +41,10 @@ def launch_distributed_pow(difficulty=20):
         print("Starting broker node...")
         broker_cmd = [
             sys.executable,
-            os.path.join(current_dir, "zad3_broker.py")
+            os.path.join(current_dir, "zad3_broker.py"),
+            str(difficulty),
+            hash_algorithm,
+            transport
         ]
         
         # Use CREATE_NEW_CONSOLE on Windows to open in new window
@@ -63,7 +75,8 @@ def launch_distributed_pow(difficulty=20):
             miner_cmd = [
                 sys.executable,
                 os.path.join(current_dir, "zad3_miner.py"),
-                str(node_id)
+                str(node_id),
+                transport
             ]
             
             if sys.platform == 'win32':
@@ -141,4 +154,10 @@ if __name__ == "__main__":
         except ValueError:
             print(f"Invalid difficulty, using default: {difficulty} bits")
     
-    launch_distributed_pow(difficulty=difficulty)
+    # Hash backend: sha256, sha256d, sha3_256, blake2b_256, blake2s
+    hash_algorithm = sys.argv[2] if len(sys.argv) > 2 else 'sha256'
+    
+    # Transport: tcp or unix (Unix domain sockets, same host)
+    transport = sys.argv[3] if len(sys.argv) > 3 else 'tcp'
+    
+    launch_distributed_pow(difficulty=difficulty, hash_algorithm=hash_algorithm, transport=transport)
@@ -2,36 +2,81 @@
 Zadanie 11.3 - Mining Node
 Connects to broker, receives mining tasks, mines blocks using PoW, and handles cancellation.
 """
-import socket
-import pickle
 import threading
 import time
 import sys
-from blockchain_mining import BlockMiner, Block
+import os
+import logging
+from blockchain_mining import BlockMiner, ChainParameters, MerkleTree
+from block_template import BlockTemplate
+from header_sync import HeaderChain, HeaderSyncClient
+from metrics import MetricsRegistry, MetricsServer
+from transport import connect, encode_message, encode_submission, read_message
+
+# Hot-loop progress goes through logging (DEBUG); set LOG_LEVEL=DEBUG to see it
+logger = logging.getLogger('zad3_miner')
 
 
 class MiningNode:
-    def __init__(self, node_id, broker_host='localhost', broker_port=5000):
+    def __init__(self, node_id, broker_host='localhost', broker_port=5000, metrics_port=None, transport='tcp',
+                 sync_port=None):
         self.node_id = node_id
         self.broker_host = broker_host
         self.broker_port = broker_port
+        self.sync_port = sync_port if sync_port is not None else broker_port  # Root broker when mining under a relay
+        self.transport = transport  # 'tcp' or 'unix' (same host)
         
-        # Mining state
+        # Mining state: the worker takes pending_template; a new one (from NEW_TASK or built
+        # speculatively after BLOCK_ACCEPTED) interrupts the current one through stop_mining
         self.miner = None
-        self.current_task = None
-        self.mining_active = threading.Event()
+        self.template_condition = threading.Condition()
+        self.template = None            # Last template handed to the worker
+        self.pending_template = None    # Template the worker has not picked up yet
+        self.worker_template = None     # Template being hashed (None when idle)
+        self.solved_template = None     # Template of the last block found
         self.stop_mining = threading.Event()
+        self.next_transactions = None   # (transactions, Merkle root) expected in the next block
+        self.switch_started = None      # Monotonic time of the last BLOCK_ACCEPTED, until hashing resumes
         
         # Connection
         self.socket = None
         self.connected = False
+        self.send_lock = threading.Lock()  # Worker and listener threads both send
+        
+        # Propagation tracing: block the worker is mining and pending BLOCK_ACCEPTED receipt
+        self.trace_lock = threading.Lock()
+        self.mining_block_number = None
+        self.pending_trace = None
+        
+        # Header chain, kept across reconnects and caught up with GETHEADERS after each (re)connection
+        self.header_chain = None
+        self.headers_lock = threading.Lock()
+        self.headers_synced = False
         
-    def send_message(self, message):
-        """Send pickled message with length prefix"""
+        # Metrics (served over HTTP in Prometheus format when metrics_port is set)
+        self.metrics = MetricsRegistry()
+        self.metrics_port = metrics_port
+        self.metrics_server = None
+        self.hashes = self.metrics.counter('miner_hashes_total', 'Block header hashes computed')
+        self.hash_rate = self.metrics.gauge('miner_hash_rate', 'Hash rate of the current task in H/s')
+        self.blocks_found = self.metrics.counter('miner_blocks_found_total', 'Blocks found and submitted')
+        self.blocks_won = self.metrics.counter('miner_blocks_accepted_total', 'Own blocks accepted by the broker')
+        self.tasks_cancelled = self.metrics.counter('miner_tasks_cancelled_total', 'Mining tasks interrupted')
+        self.task_duration = self.metrics.histogram('miner_task_seconds', 'Time spent on a task until found or cancelled',
+                                                    buckets=(0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60))
+        self.connections = self.metrics.counter('miner_connections_total', 'Connections made to the broker')
+        self.speculations = self.metrics.counter('miner_speculative_templates_total',
+                                                 'Speculative templates by outcome (confirmed or replaced by NEW_TASK)')
+        self.task_switch = self.metrics.histogram('miner_task_switch_seconds',
+                                                  'Time from BLOCK_ACCEPTED until hashing the next block',
+                                                  buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5))
+        
+    def send_message(self, message, epoch=None):
+        """Send pickled message with length prefix (BLOCK_MINED with the epoch of its task in a fixed header)"""
         try:
-            data = pickle.dumps(message)
-            length = len(data).to_bytes(4, byteorder='big')
-            self.socket.sendall(length + data)
+            data = encode_message(message) if epoch is None else encode_submission(message, epoch)
+            with self.send_lock:
+                self.socket.sendall(data)
             return True
         except Exception as e:
             print(f"[Node {self.node_id}] Error sending message: {e}")
@@ -40,112 +85,99 @@ class MiningNode:
     def receive_message(self):
         """Receive pickled message with length prefix"""
         try:
-            # Receive length prefix (4 bytes)
-            length_data = b''
-            while len(length_data) < 4:
-                chunk = self.socket.recv(4 - len(length_data))
-                if not chunk:
-                    return None
-                length_data += chunk
-            
-            message_length = int.from_bytes(length_data, byteorder='big')
-            
-            # Receive message data
-            data = b''
-            while len(data) < message_length:
-                chunk = self.socket.recv(min(4096, message_length - len(data)))
-                if not chunk:
-                    return None
-                data += chunk
-            
-            return pickle.loads(data)
+            return read_message(self.socket)
         except Exception as e:
             print(f"[Node {self.node_id}] Error receiving message: {e}")
             return None
     
-    def mine_block_interruptible(self, transactions, previous_hash, block_number, difficulty):
+    def mine_block_interruptible(self, template):
         """
-        Mine a block with ability to interrupt
+        Mine a block template with ability to interrupt
         Based on BlockMiner.mine_block() but checks stop_mining flag periodically
         """
-        from blockchain_mining import MerkleTree
-        import hashlib
-        
-        # Compute Merkle root
-        merkle_root = MerkleTree.build_merkle_tree(transactions)
-        timestamp = int(time.time())
+        # Header prefix is fixed per template, only the nonce is hashed (midstate for SHA-256)
+        hash_nonce = template.nonce_hasher()
+        difficulty = template.difficulty
         
         nonce = 0
         attempts = 0
         start_time = time.time()
-        check_interval = 10000  # Check for cancellation every N attempts
+        check_interval = 1000   # Check for cancellation every N attempts (~1 ms, bounds the switch to a new template)
+        reported_attempts = 0   # Attempts already added to the hash counter
         
         while not self.stop_mining.is_set():
             # Compute block hash
-            block_data = merkle_root + previous_hash + timestamp.to_bytes(8, byteorder='big') + \
-                        block_number.to_bytes(8, byteorder='big') + nonce.to_bytes(8, byteorder='big')
-            block_hash = hashlib.sha256(block_data).digest()
+            block_hash = hash_nonce(nonce.to_bytes(8, byteorder='big'))
             
             attempts += 1
             
             # Check if hash meets difficulty
             if BlockMiner.hash_has_leading_zero_bits(block_hash, difficulty):
                 elapsed = time.time() - start_time
-                
-                # Create block
-                block = Block(
-                    merkle_root=merkle_root,
-                    previous_hash=previous_hash,
-                    timestamp=timestamp,
-                    block_number=block_number,
-                    nonce=nonce,
-                    block_hash=block_hash
-                )
-                
-                return block, attempts, elapsed
+                self.hashes.inc(attempts - reported_attempts)
+                return template.build_block(nonce, block_hash), attempts, elapsed
             
             nonce += 1
             
             # Periodically check for cancellation and show progress
             if attempts % check_interval == 0:
+                self.hashes.inc(attempts - reported_attempts)
+                reported_attempts = attempts
                 if self.stop_mining.is_set():
                     return None, attempts, time.time() - start_time
                 
                 elapsed = time.time() - start_time
                 hash_rate = attempts / elapsed if elapsed > 0 else 0
-                print(f"[Node {self.node_id}] Mining... {attempts:,} attempts, {hash_rate:.2f} H/s")
+                self.hash_rate.set(hash_rate)
+                logger.debug("[Node %s] Mining... %d attempts, %.2f H/s", self.node_id, attempts, hash_rate)
         
         # Mining was cancelled
+        self.hashes.inc(attempts - reported_attempts)
         return None, attempts, time.time() - start_time
     
     def mining_worker(self):
         """Worker thread that performs mining"""
         while self.connected:
-            # Wait for a mining task
-            self.mining_active.wait()
-            
-            if not self.connected or self.current_task is None:
-                break
+            # Wait for a mining template
+            with self.template_condition:
+                self.template_condition.wait_for(lambda: self.pending_template is not None or not self.connected)
+                if not self.connected:
+                    break
+                template = self.pending_template
+                self.pending_template = None
+                self.worker_template = template
+                # Reset stop flag
+                self.stop_mining.clear()
             
-            task = self.current_task
-            print(f"\n[Node {self.node_id}] 🔨 Starting mining for block {task['block_number']}")
-            print(f"[Node {self.node_id}]    Difficulty: {task['difficulty']} bits")
-            print(f"[Node {self.node_id}]    Transactions: {len(task['transactions'])}")
+            with self.trace_lock:
+                self.mining_block_number = template.block_number
+                if self.switch_started is not None:
+                    self.task_switch.observe(time.monotonic() - self.switch_started)
+                    self.switch_started = None
             
-            # Reset stop flag
-            self.stop_mining.clear()
+            kind = "speculative template" if template.speculative else "task"
+            print(f"\n[Node {self.node_id}] 🔨 Starting mining for block {template.block_number} ({kind})")
+            print(f"[Node {self.node_id}]    Difficulty: {template.difficulty} bits")
+            print(f"[Node {self.node_id}]    Hash algorithm: {template.hash_algorithm}")
+            print(f"[Node {self.node_id}]    Transactions: {len(template.transactions)}")
             
             # Mine the block
-            result = self.mine_block_interruptible(
-                transactions=task['transactions'],
-                previous_hash=task['previous_hash'],
-                block_number=task['block_number'],
-                difficulty=task['difficulty']
-            )
+            block, attempts, elapsed = self.mine_block_interruptible(template)
+            with self.template_condition:
+                self.worker_template = None
+            stopped_at = time.monotonic()
+            self.task_duration.observe(elapsed)
             
-            block, attempts, elapsed = result
+            # Worker stopped: report preemption if a new block was announced meanwhile
+            with self.trace_lock:
+                self.mining_block_number = None
+                if self.pending_trace is not None:
+                    self.send_trace_report(*self.pending_trace, preempted=stopped_at)
+                    self.pending_trace = None
             
             if block is not None:
+                self.solved_template = template
+                self.blocks_found.inc()
                 # Successfully mined!
                 print(f"\n[Node {self.node_id}] ✅ Block {block.block_number} MINED!")
                 print(f"[Node {self.node_id}]    Hash: {block.block_hash.hex()[:32]}...")
@@ -157,53 +189,137 @@ class MiningNode:
                 message = {
                     'type': 'BLOCK_MINED',
                     'block': block,
+                    'transactions': template.transactions,
                     'attempts': attempts,
-                    'elapsed': elapsed
+                    'elapsed': elapsed,
+                    'trace': {'found': stopped_at, 'sent': time.monotonic()}
                 }
-                self.send_message(message)
+                self.send_message(message, epoch=template.epoch)
             else:
                 # Mining was cancelled
-                print(f"[Node {self.node_id}] ⏸️  Mining cancelled for block {task['block_number']} after {attempts:,} attempts ({elapsed:.2f}s)")
-            
-            # Clear mining state
-            self.mining_active.clear()
+                self.tasks_cancelled.inc()
+                print(f"[Node {self.node_id}] ⏸️  Mining cancelled for block {template.block_number} after {attempts:,} attempts ({elapsed:.2f}s)")
+    
+    def switch_template(self, template):
+        """Hand a template to the worker, interrupting the one it is hashing"""
+        with self.template_condition:
+            self.template = template
+            self.pending_template = template
+            self.stop_mining.set()
+            self.template_condition.notify_all()
+    
+    def stop_current_task(self):
+        """Interrupt the worker without giving it a new template"""
+        with self.template_condition:
+            self.pending_template = None
+            self.stop_mining.set()
     
     def handle_new_task(self, message):
         """Handle new mining task from broker"""
-        # Stop current mining if active
-        if self.mining_active.is_set():
-            print(f"[Node {self.node_id}] Stopping current mining task...")
-            self.stop_mining.set()
-            self.mining_active.clear()
-            time.sleep(0.1)  # Give mining thread time to stop
+        with self.template_condition:
+            template = self.template
+            unfinished = template is not None and template in (self.pending_template, self.worker_template)
+            confirmed = unfinished and template.speculative and template.matches(message)
+            # Speculative block already found and submitted before its NEW_TASK arrived
+            solved = template is not None and template is self.solved_template and template.matches(message)
+            if confirmed:
+                # Same block as predicted: keep hashing, blocks are submitted with the broker's epoch
+                template.epoch = message.get('epoch', 0)
+                template.speculative = False
+        
+        if confirmed or solved:
+            self.speculations.inc(result='confirmed')
+        else:
+            if unfinished and template.speculative:
+                self.speculations.inc(result='replaced')
+            elif unfinished:
+                print(f"[Node {self.node_id}] Stopping current mining task...")
+            self.switch_template(BlockTemplate.from_task(message))
         
-        # Set new task
-        self.current_task = message
+        # Merkle root of the block after this one is ready before it is needed
+        transactions = message.get('mempool', [])
+        self.next_transactions = (transactions,
+                                  MerkleTree.build_merkle_tree(transactions, message.get('hash_algorithm', 'sha256')))
         
-        print(f"\n[Node {self.node_id}] 📩 New mining task received for block {message['block_number']}")
+        if not self.headers_synced:
+            self.headers_synced = True
+            if self.header_chain is None:
+                self.header_chain = HeaderChain(ChainParameters(difficulty=message['difficulty'],
+                                                                hash_algorithm=message.get('hash_algorithm', 'sha256')))
+            threading.Thread(target=self.sync_headers, daemon=True).start()
         
-        # Start mining
-        self.mining_active.set()
+        status = " (speculative template confirmed)" if confirmed else " (already solved)" if solved else ""
+        print(f"\n[Node {self.node_id}] 📩 New mining task received for block {message['block_number']}{status}")
+    
+    def sync_headers(self):
+        """Download and verify headers of the blocks missed while disconnected"""
+        client = HeaderSyncClient(self.header_chain, self.broker_host, self.sync_port, self.transport,
+                                  lock=self.headers_lock)
+        start_time = time.time()
+        try:
+            ok, reason = client.sync()
+        except Exception as e:
+            ok, reason = False, str(e)
+        if ok:
+            print(f"[Node {self.node_id}] Header sync: {client.headers_received:,} new headers in "
+                  f"{time.time() - start_time:.2f}s, chain height {self.header_chain.height}")
+        else:
+            print(f"[Node {self.node_id}] Header sync failed: {reason}")
+    
+    def append_header(self, block):
+        """Extend the header chain with an accepted block that links to its tip"""
+        with self.headers_lock:
+            if self.header_chain is not None:
+                # Blocks that do not link are fetched by the sync after the next reconnection
+                self.header_chain.append_verified(block)
     
-    def handle_block_accepted(self, message):
+    def send_trace_report(self, block_number, received, preempted):
+        """Report when BLOCK_ACCEPTED arrived and when the worker stopped the old task"""
+        self.send_message({
+            'type': 'TRACE_REPORT',
+            'block_number': block_number,
+            'received': received,
+            'preempted': preempted
+        })
+    
+    def handle_block_accepted(self, message, received_at=None):
         """Handle block acceptance notification from broker"""
         block = message['block']
         winning_node = message['winning_node']
         
+        if received_at is not None and winning_node != self.node_id:
+            with self.trace_lock:
+                if self.mining_block_number is not None:
+                    # Reported by the worker once it actually stops
+                    self.pending_trace = (block.block_number, received_at)
+                else:
+                    self.send_trace_report(block.block_number, received_at, None)
+        
+        self.append_header(block)
+        
         if winning_node == self.node_id:
+            self.blocks_won.inc()
             print(f"\n[Node {self.node_id}] 🎉 MY BLOCK WAS ACCEPTED! Block #{block.block_number}")
         else:
             print(f"\n[Node {self.node_id}] 📢 Block {block.block_number} mined by Node {winning_node}")
             print(f"[Node {self.node_id}]    Stopping current mining...")
         
-        # Stop current mining
-        self.stop_mining.set()
-        self.mining_active.clear()
+        # Continue at once on the predicted next block; NEW_TASK replaces it if the broker chose otherwise
+        with self.template_condition:
+            template = self.template
+        with self.trace_lock:
+            self.switch_started = received_at if received_at is not None else time.monotonic()
+        if template is not None and template.extended_by(block) and self.next_transactions is not None:
+            transactions, merkle_root = self.next_transactions
+            self.switch_template(BlockTemplate.speculate(template, block, transactions, merkle_root))
+        else:
+            self.stop_current_task()
     
     def message_listener(self):
         """Listen for messages from broker"""
         while self.connected:
             message = self.receive_message()
+            received_at = time.monotonic()
             if not message:
                 print(f"[Node {self.node_id}] Connection to broker lost")
                 self.connected = False
@@ -214,24 +330,31 @@ class MiningNode:
             if msg_type == 'NEW_TASK':
                 self.handle_new_task(message)
             elif msg_type == 'BLOCK_ACCEPTED':
-                self.handle_block_accepted(message)
+                self.handle_block_accepted(message, received_at)
             elif msg_type == 'CANCEL_MINING':
                 print(f"[Node {self.node_id}] Received cancellation signal")
-                self.stop_mining.set()
-                self.mining_active.clear()
+                self.stop_current_task()
     
     def connect_and_run(self):
         """Connect to broker and start mining"""
-        print(f"\n[Node {self.node_id}] Connecting to broker at {self.broker_host}:{self.broker_port}")
+        print(f"\n[Node {self.node_id}] Connecting to broker at {self.broker_host}:{self.broker_port} ({self.transport})")
         
         try:
             # Connect to broker
-            self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.socket.connect((self.broker_host, self.broker_port))
+            self.socket = connect(self.transport, self.broker_host, self.broker_port)
             self.connected = True
+            self.connections.inc()
+            self.headers_synced = False
+            with self.template_condition:
+                # Templates of the previous connection are stale
+                self.template = self.pending_template = None
             
             print(f"[Node {self.node_id}] Connected to broker")
             
+            if self.metrics_port is not None and self.metrics_server is None:
+                self.metrics_server = MetricsServer(self.metrics, port=self.metrics_port)
+                print(f"[Node {self.node_id}] Metrics: http://localhost:{self.metrics_server.port}/metrics")
+            
             # Register with broker
             registration = {
                 'type': 'REGISTER',
@@ -250,8 +373,14 @@ class MiningNode:
             print(f"[Node {self.node_id}] Error: {e}")
         finally:
             self.connected = False
+            self.stop_current_task()
+            with self.template_condition:
+                self.template_condition.notify_all()  # Wake the idle worker so it exits
             if self.socket:
                 self.socket.close()
+            if self.metrics_server is not None:
+                self.metrics_server.close()
+                self.metrics_server = None
             print(f"[Node {self.node_id}] Disconnected")
 
 
@@ -262,7 +391,16 @@ if __name__ == "__main__":
     else:
         node_id = 1
     
-    miner = MiningNode(node_id=node_id)
+    logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO'), format='%(message)s')
+    
+    # Transport: tcp (default) or unix (broker on the same host)
+    transport = sys.argv[2] if len(sys.argv) > 2 else 'tcp'
+    
+    # Broker port: 5000 (root broker) or the port of a relay broker
+    broker_port = int(sys.argv[3]) if len(sys.argv) > 3 else 5000
+    
+    # Metrics of node N are served on port 9100 + N (broker uses 9100)
+    miner = MiningNode(node_id=node_id, broker_port=broker_port, metrics_port=9100 + node_id, transport=transport)
     
     try:
         miner.connect_and_run()
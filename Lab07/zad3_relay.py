@@ -0,0 +1,21 @@
+"""
+Zadanie 11.3 - Relay Broker
+Broker that registers with a parent broker as a mining node, re-broadcasts its
+tasks to its own miners and forwards their blocks up the tree.
+"""
+import sys
+from zad3_broker import BrokerNode
+
+
+if __name__ == "__main__":
+    # Usage: python zad3_relay.py <relay_id> <port> [parent_port] [tcp|unix]
+    # Relay ids share the id space of mining nodes, e.g. 1001, 1002, ...
+    relay_id = int(sys.argv[1]) if len(sys.argv) > 1 else 1001
+    port = int(sys.argv[2]) if len(sys.argv) > 2 else 5001
+    parent_port = int(sys.argv[3]) if len(sys.argv) > 3 else 5000
+    transport = sys.argv[4] if len(sys.argv) > 4 else 'tcp'
+    
+    # Blocks are validated by the root broker, the relay needs no signature workers
+    relay = BrokerNode(host='localhost', port=port, verifier_workers=0, trace_report_interval=0,
+                       transport=transport, upstream_port=parent_port, relay_id=relay_id)
+    relay.start()
@@ -0,0 +1,98 @@
+"""
+Zadanie 11.3 - Wallet Client
+Signs transactions with RSA-FDH and submits them to the broker mempool in batches.
+"""
+import random
+import string
+import sys
+import time
+from signed_transactions import SignedTransaction, account_id
+from transport import connect, encode_message, read_message
+from lab03 import generate_rsa_keys  # Lab03 path is added by signed_transactions
+
+
+class WalletClient:
+    def __init__(self, name, broker_host='localhost', broker_port=5000, key_bits=1024, transport='tcp'):
+        self.name = name
+        self.broker_host = broker_host
+        self.broker_port = broker_port
+        self.transport = transport
+        
+        # Signing key
+        print(f"[Wallet {self.name}] Generating {key_bits}-bit RSA key...")
+        self.public_key, self.private_key, _, _, _ = generate_rsa_keys(key_bits)
+        self.account = account_id(self.public_key)  # Transfers are paid from the key's account
+        print(f"[Wallet {self.name}] Account: {self.account}")
+        
+        # Connection
+        self.socket = None
+    
+    def send_message(self, message):
+        """Send pickled message with length prefix"""
+        self.socket.sendall(encode_message(message))
+    
+    def receive_message(self):
+        """Receive pickled message with length prefix"""
+        return read_message(self.socket)
+    
+    def fetch_nonce(self):
+        """Ask the broker for the nonce of this account's next transfer"""
+        self.send_message({'type': 'GET_ACCOUNT', 'account': self.account})
+        reply = self.receive_message()
+        if not reply:
+            raise ConnectionError("Connection to broker lost")
+        print(f"[Wallet {self.name}] Balance: {reply['balance']:,}, next nonce: {reply['nonce']}")
+        return reply['nonce']
+    
+    def create_transactions(self, count, first_nonce=0):
+        """Create signed transactions with consecutive nonces from this wallet's account to random receivers"""
+        transactions = []
+        for nonce in range(first_nonce, first_nonce + count):
+            tx_id = ''.join(random.choices(string.ascii_letters + string.digits, k=16))
+            amount = random.randint(1, 1000)
+            receiver = ''.join(random.choices(string.ascii_uppercase, k=8))
+            payload = f"TX_{tx_id}: {self.account} -> {receiver} [{amount} units] nonce={nonce}"
+            tx = SignedTransaction.create(payload, self.private_key, self.public_key)
+            transactions.append(tx.encode())
+        return transactions
+    
+    def submit(self, num_transactions, batch_size=100):
+        """Sign and submit transactions in batches, reporting broker admission rate"""
+        self.socket = connect(self.transport, self.broker_host, self.broker_port)
+        
+        accepted = 0
+        rejected = 0
+        try:
+            first_nonce = self.fetch_nonce()
+            print(f"[Wallet {self.name}] Signing {num_transactions:,} transactions...")
+            transactions = self.create_transactions(num_transactions, first_nonce)
+            
+            start_time = time.time()
+            for i in range(0, len(transactions), batch_size):
+                self.send_message({
+                    'type': 'SUBMIT_TRANSACTIONS',
+                    'transactions': transactions[i:i + batch_size]
+                })
+                ack = self.receive_message()
+                if not ack:
+                    print(f"[Wallet {self.name}] Connection to broker lost")
+                    break
+                accepted += ack['accepted']
+                rejected += len(ack['rejected'])
+        finally:
+            self.socket.close()
+        
+        elapsed = time.time() - start_time
+        print(f"[Wallet {self.name}] Accepted: {accepted:,}, rejected: {rejected:,}")
+        if elapsed > 0:
+            print(f"[Wallet {self.name}] Admission rate: {(accepted + rejected)/elapsed:,.0f} tx/s")
+
+
+if __name__ == "__main__":
+    # Usage: python zad3_wallet.py [name] [num_transactions] [tcp|unix]
+    name = sys.argv[1] if len(sys.argv) > 1 else "ALICE"
+    num_transactions = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    transport = sys.argv[3] if len(sys.argv) > 3 else 'tcp'
+    
+    wallet = WalletClient(name=name, transport=transport)
+    wallet.submit(num_transactions)